@@ -36,15 +36,9 @@ os.makedirs(logs_dir, exist_ok=True)
 
 print(f"📁 Logs directory: {logs_dir}")
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(logs_dir, 'api.log')),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (JSON records written by a background listener thread)
+from services.log_pipeline import setup_logging
+setup_logging(logs_dir, level=logging.INFO)
 
 # Now create the app
 try:
@@ -1,9 +1,27 @@
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 
+from services import validation
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify / request.get_json backed by orjson when it is installed"""
+    
+    def dumps(self, obj, **kwargs):
+        return validation.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return validation.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(validation.dumps(obj), mimetype=self.mimetype)
+
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     
     # Enable CORS
     CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -15,6 +33,20 @@ def create_app():
     from app.routes import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # Request latency metrics and /metrics endpoint
+    from services import metrics
+    metrics.init_app(app)
+    
+    # Opt-in per-request profiles (signed X-Profile header or admin toggle)
+    from services import profiling
+    profiling.init_app(app)
+    
+    # Precomputed views and maintenance jobs (one runner per job across workers)
+    from config.settings import Config
+    if Config.SCHEDULER_ENABLED:
+        from services.precompute import start_background_jobs
+        start_background_jobs()
+    
     print("✅ API routes registered")
     
     return app
\ No newline at end of file
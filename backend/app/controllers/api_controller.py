@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 import logging
 from services.supabase_service import supabase_service
+from services.ingest_service import ingest_service
+from services.validation import validate_reading, loads as json_loads
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
@@ -50,45 +52,44 @@ def get_sensor_data():
 def post_sensor_data():
     """Post new sensor data"""
     try:
-        data = request.get_json()
-        
-        if not data:
+        try:
+            data = json_loads(request.get_data())
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'No data provided'
+                'message': f'Invalid JSON: {e}'
             }), 400
         
-        print(f"📥 Received data: {data}")
-        
-        # Validate required fields
-        required_fields = ['device_id', 'temperature', 'ph', 'tds', 'turbidity', 'latitude', 'longitude']
-        missing_fields = [field for field in required_fields if field not in data]
-        
-        if missing_fields:
+        # Validate types, ranges and finiteness in one pass
+        reading_data, errors = validate_reading(data)
+        if errors:
             return jsonify({
                 'status': 'error',
-                'message': f'Missing required fields: {missing_fields}',
-                'received_data': data
+                'message': 'Invalid sensor payload',
+                'details': errors
             }), 400
         
-        # Prepare data for Supabase
-        reading_data = {
-            'device_id': str(data['device_id']),
-            'temperature': float(data['temperature']),
-            'ph': float(data['ph']),
-            'tds': int(float(data['tds'])),
-            'turbidity': float(data['turbidity']),
-            'latitude': float(data['latitude']),
-            'longitude': float(data['longitude'])
-        }
+        # Store, score and update in-memory views
+        reading = ingest_service.ingest(
+            [reading_data],
+            request.content_length or 0,
+            explicit_key=request.headers.get('Idempotency-Key')
+        )[0]
+        quality = reading['quality']
         
-        # Create reading in Supabase
-        reading = supabase_service.create_reading(reading_data)
-        
-        # Determine water quality
-        quality = supabase_service.determine_water_quality(reading_data)
-        
-        print(f"✅ Data saved. Quality: {quality}")
+        if reading.get('duplicate'):
+            return jsonify({
+                'status': 'success',
+                'message': 'Duplicate reading ignored',
+                'duplicate': True,
+                'reading_id': reading['id'],
+                'quality': quality
+            }), 200
+        
+        logger.info(
+            f"✅ Data saved. Quality: {quality}",
+            extra={'device_id': reading_data['device_id'], 'reading_id': reading['id'], 'quality': quality}
+        )
         
         return jsonify({
             'status': 'success',
@@ -3,6 +3,9 @@ Simple ML Integrator
 """
 
 import logging
+import time
+
+from services.metrics import ML_SCORING_DURATION
 
 logger = logging.getLogger(__name__)
 
@@ -38,10 +41,14 @@ class MLIntegrator:
     
     def assess_quality(self, sensor_data):
         """Assess quality using ML or fallback"""
+        start = time.perf_counter()
         if self.available:
-            return self._ml_assessment(sensor_data)
+            result = self._ml_assessment(sensor_data)
         else:
-            return self._fallback_assessment(sensor_data)
+            result = self._fallback_assessment(sensor_data)
+        ML_SCORING_DURATION.labels(result.get('ml_model_used', 'unknown'))\
+                           .observe(time.perf_counter() - start)
+        return result
     
     def _ml_assessment(self, sensor_data):
         """ML-based assessment"""
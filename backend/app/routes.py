@@ -1,11 +1,93 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from datetime import datetime, timedelta, timezone
 import logging
-from services.supabase_service import supabase_service  # Import Supabase service
+import time
+from config.settings import Config
+from services.supabase_service import supabase_service, parse_fields, select_list, InvalidFields  # Import Supabase service
+from services.response_formats import readings_response, compress_response
+from services.export_service import export_readings, export_formats, EXPORT_MIMETYPES
+from services.recent_readings import recent_readings
+from services.ingest_service import ingest_service
+from services.idempotency import idempotency_guard
+from services.timestamps import utc_now, to_iso, reading_time
+from services.validation import validate_reading, validate_batch, loads as json_loads
+from services.binary_protocol import decode_frame, is_frame, FrameError
+from services.rate_limit import ingest_limiter, load_shedder
+from services.calibration import calibration_drift
+from services.scheduler import scheduler
+from services.fleet_snapshot import fleet_snapshot
+from services.id_cursor import IdCursor
+from services.spatial_index import device_locations
+from services.surface import (
+    surface_service, parse_bbox, parse_surface_fields, layer_rows, InvalidSurfaceRequest,
+    MIMETYPE as SURFACE_MIMETYPE
+)
+from services.precompute import (
+    build_statistics, build_latest, build_heatmap, build_alerts, build_devices,
+    build_dashboard, build_changes, DASHBOARD_SECTIONS
+)
 
 api_bp = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
 
+# Priority lanes for the load shedder; other GET routes are 'high'
+CRITICAL_ENDPOINTS = {
+    'api.health_check',
+    'api.receive_sensor_data',
+    'api.receive_sensor_data_batch',
+}
+LOW_PRIORITY_ENDPOINTS = {
+    'api.get_historical_data',
+    'api.export_all_readings',
+    'api.get_heatmap_data',
+    'api.get_surface',
+    'api.get_duplicate_stats',
+    'api.get_calibration_queue',
+    'api.test_endpoint',
+}
+
+
+@api_bp.before_request
+def shed_load():
+    """Reject low-priority reads first while Supabase is slow"""
+    if request.method != 'GET' or request.endpoint in CRITICAL_ENDPOINTS:
+        load_shedder.begin('critical')
+        return None
+    lane = 'low' if request.endpoint in LOW_PRIORITY_ENDPOINTS else 'high'
+    load_shedder.begin(lane)
+    if load_shedder.should_shed(lane):
+        response = jsonify({
+            'error': 'Service overloaded, try again later',
+            'lane': lane
+        })
+        response.headers['Retry-After'] = str(load_shedder.retry_after())
+        return response, 503
+    return None
+
+
+@api_bp.teardown_request
+def end_lane(exc):
+    load_shedder.end()
+
+
+def _with_quality(readings, fields):
+    """Add quality where wanted and keep only the requested ``fields``"""
+    if fields is None or 'quality' in fields:
+        for reading in readings:
+            reading['quality'] = supabase_service.determine_water_quality(reading)
+    if fields is None:
+        return readings
+    return [{field: reading.get(field) for field in fields} for reading in readings]
+
+
+def _rate_limited(retry_after: float):
+    response = jsonify({
+        'error': 'Rate limit exceeded',
+        'retry_after': round(retry_after, 3)
+    })
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response, 429
+
 
 # ============================================================================
 # HEALTH & STATUS ENDPOINTS
@@ -27,7 +109,9 @@ def health_check():
             'stats': {
                 'total_readings': stats['total_readings'],
                 'unique_devices': stats['unique_devices']
-            }
+            },
+            'jobs': scheduler.jobs(),
+            'fleet_snapshot': fleet_snapshot.counters()
         }), 200
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
@@ -57,41 +141,56 @@ def receive_sensor_data():
         "latitude": 35.1892,
         "longitude": -0.6417
     }
+    
+    or a binary frame (Content-Type: application/x-wq-frame, see
+    services/binary_protocol.py); frames with several readings are
+    handled like /sensor/data/batch.
     """
     try:
-        data = request.get_json()
-        
-        if not data or 'device_id' not in data:
-            return jsonify({'error': 'device_id is required'}), 400
-        
-        # Validate required fields
-        required_fields = ['device_id', 'temperature', 'ph', 'tds', 'turbidity', 'latitude', 'longitude']
-        missing_fields = [field for field in required_fields if field not in data]
-        
-        if missing_fields:
+        try:
+            data = _parse_body(single=True)
+        except FrameError as e:
+            return jsonify({'error': f'Invalid frame: {e}'}), 400
+        except ValueError as e:
+            return jsonify({'error': f'Invalid JSON: {e}'}), 400
+        
+        if isinstance(data, list):
+            return _store_batch(data)
+        
+        # Validate types, ranges and finiteness in one pass
+        reading_data, errors = validate_reading(data)
+        if errors:
             return jsonify({
-                'error': f'Missing required fields: {missing_fields}',
-                'received': data
+                'error': 'Invalid sensor payload',
+                'details': errors
             }), 400
         
-        # Prepare data for Supabase
-        reading_data = {
-            'device_id': str(data['device_id']),
-            'temperature': float(data['temperature']),
-            'ph': float(data['ph']),
-            'tds': int(float(data['tds'])),
-            'turbidity': float(data['turbidity']),
-            'latitude': float(data['latitude']),
-            'longitude': float(data['longitude'])
-        }
+        _, throttled, retry_after = ingest_limiter.admit([reading_data])
+        if throttled:
+            return _rate_limited(retry_after)
         
-        # Create reading in Supabase
-        reading = supabase_service.create_reading(reading_data)
+        # Store, score and update in-memory views (retries are recognised)
+        reading = ingest_service.ingest(
+            [reading_data],
+            request.content_length or 0,
+            explicit_key=request.headers.get('Idempotency-Key')
+        )[0]
+        quality = reading['quality']
         
-        # Determine water quality
-        quality = supabase_service.determine_water_quality(reading_data)
-        
-        logger.info(f"✅ Data received from {data['device_id']} (Quality: {quality})")
+        if reading.get('duplicate'):
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'id': reading['id'],
+                'message': 'Duplicate reading ignored',
+                'quality': quality,
+                'timestamp': reading['created_at']
+            }), 200
+        
+        logger.info(
+            f"✅ Data received from {reading_data['device_id']} (Quality: {quality})",
+            extra={'device_id': reading_data['device_id'], 'reading_id': reading['id'], 'quality': quality}
+        )
         
         return jsonify({
             'success': True,
@@ -99,6 +198,7 @@ def receive_sensor_data():
             'message': 'Data saved successfully in Supabase',
             'quality': quality,
             'timestamp': reading['created_at'],
+            'measured_at': reading.get('measured_at'),
             'data': reading
         }), 201
         
@@ -107,6 +207,101 @@ def receive_sensor_data():
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/sensor/data/batch', methods=['POST'])
+def receive_sensor_data_batch():
+    """
+    Receive many readings in one request
+    
+    Expected JSON: a list of sensor payloads, or {"readings": [...]},
+    or a binary frame. Valid readings are stored with a single insert;
+    invalid ones are reported by index (207 when only some were accepted).
+    """
+    try:
+        try:
+            data = _parse_body(single=False)
+        except FrameError as e:
+            return jsonify({'error': f'Invalid frame: {e}'}), 400
+        except ValueError as e:
+            return jsonify({'error': f'Invalid JSON: {e}'}), 400
+        
+        return _store_batch(data)
+        
+    except Exception as e:
+        logger.error(f"❌ Error receiving batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _parse_body(single: bool):
+    """Decode a JSON or binary frame request body
+    
+    Frames decode to a list of payloads; with ``single`` a one-reading
+    frame is unwrapped so it takes the single-reading path.
+    """
+    if is_frame(request.mimetype):
+        payloads = decode_frame(request.get_data())
+        if not payloads:
+            raise FrameError("frame contains no readings")
+        return payloads[0] if single and len(payloads) == 1 else payloads
+    return json_loads(request.get_data())
+
+
+def _store_batch(data):
+    """Validate and store a list of payloads, reporting rejects by index"""
+    try:
+        valid, rejected = validate_batch(data)
+        if not valid:
+            return jsonify({
+                'error': 'No valid readings in batch',
+                'rejected': rejected
+            }), 400
+        
+        # Throttled readings are reported by their position in the request
+        admitted, throttled, retry_after = ingest_limiter.admit(valid)
+        if throttled:
+            if not admitted:
+                return _rate_limited(retry_after)
+            rejected_at = {entry['index'] for entry in rejected}
+            positions = [i for i in range(len(valid) + len(rejected)) if i not in rejected_at]
+            for index in throttled:
+                rejected.append({'index': positions[index], 'errors': [{
+                    'field': 'device_id',
+                    'error': 'rate_limited',
+                    'message': f'rate limit exceeded, retry after {retry_after:.1f}s'
+                }]})
+            rejected.sort(key=lambda entry: entry['index'])
+            valid = [valid[i] for i in admitted]
+        
+        stored = ingest_service.ingest(valid, request.content_length or 0)
+        
+        duplicates = sum(1 for reading in stored if reading.get('duplicate'))
+        
+        logger.info(f"✅ Batch of {len(stored)} readings stored "
+                    f"({duplicates} duplicates, {len(rejected)} rejected)")
+        
+        return jsonify({
+            'success': True,
+            'count': len(stored),
+            'duplicates': duplicates,
+            'ids': [reading['id'] for reading in stored],
+            'qualities': [reading['quality'] for reading in stored],
+            'rejected': rejected
+        }), 207 if rejected else 201
+        
+    except Exception as e:
+        logger.error(f"❌ Error receiving batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@api_bp.route('/ingest/duplicates', methods=['GET'])
+def get_duplicate_stats():
+    """Per-device duplicate rates seen by this worker since it started"""
+    devices = idempotency_guard.device_stats()
+    return jsonify({
+        'count': len(devices),
+        'devices': devices
+    }), 200
+
+
 # ============================================================================
 # READINGS ENDPOINTS
 # ============================================================================
@@ -119,32 +314,38 @@ def get_readings():
     Query parameters:
     - limit: Number of readings to return (default: 10)
     - device_id: Filter by device_id (optional)
+    - fields: Comma-separated columns to return (optional, default: all)
+    - format: json, msgpack, arrow or csv (optional, or use the Accept header)
     """
     try:
         limit = request.args.get('limit', 10, type=int)
         device_id = request.args.get('device_id', None)
         offset = request.args.get('offset', 0, type=int)
+        fields = parse_fields(request.args.get('fields'))
         
         # Get readings from Supabase
-        readings = supabase_service.get_readings(limit=limit, offset=offset)
+        readings = supabase_service.get_readings(
+            limit=limit, offset=offset,
+            columns=select_list(fields, required=('device_id',) if device_id else ())
+        )
         
         # Filter by device if specified
         if device_id:
             readings = [r for r in readings if r['device_id'] == device_id]
         
         # Add quality analysis
-        for reading in readings:
-            reading['quality'] = supabase_service.determine_water_quality(reading)
+        readings = _with_quality(readings, fields)
         
         logger.info(f"Retrieved {len(readings)} readings")
         
-        return jsonify({
+        return readings_response(request, {
             'count': len(readings),
             'limit': limit,
-            'offset': offset,
-            'readings': readings
-        }), 200
+            'offset': offset
+        }, readings)
         
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"❌ Error retrieving readings: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -157,50 +358,128 @@ def get_historical_data():
     
     Query parameters:
     - days: Number of days to retrieve (default: 7)
+    - fields: Comma-separated columns to return (optional, default: all)
+    - format: json, msgpack, arrow or csv (optional, or use the Accept header)
     """
     try:
         days = request.args.get('days', 7, type=int)
+        fields = parse_fields(request.args.get('fields'))
         
         # Calculate date range
-        end_date = datetime.utcnow()
+        end_date = utc_now()
         start_date = end_date - timedelta(days=days)
         
-        # Get all readings (we'll filter by date in code for simplicity)
-        # In production, you'd want to add date filtering to Supabase query
-        readings = supabase_service.get_readings(limit=1000)  # Get more readings
+        # Filter on measurement time in the database, so late uploads land
+        # on the day they were measured
+        filtered_readings = supabase_service.get_readings_between(
+            to_iso(start_date), to_iso(end_date), limit=1000,
+            columns=select_list(fields, required=('measured_at', 'created_at'))
+        )
+        date_keys = [(reading_time(reading) or '')[:10] for reading in filtered_readings]  # YYYY-MM-DD
+        filtered_readings = _with_quality(filtered_readings, fields)
         
-        # Filter by date
-        filtered_readings = []
-        for reading in readings:
-            if 'created_at' in reading:
-                reading_date = datetime.fromisoformat(reading['created_at'].replace('Z', '+00:00'))
-                if start_date <= reading_date <= end_date:
-                    # Add quality
-                    reading['quality'] = supabase_service.determine_water_quality(reading)
-                    filtered_readings.append(reading)
-        
-        # Group by date
+        # Group by measurement date
         data_by_date = {}
-        for reading in filtered_readings:
-            if 'created_at' in reading:
-                date_key = reading['created_at'][:10]  # Extract YYYY-MM-DD
-                if date_key not in data_by_date:
-                    data_by_date[date_key] = []
-                data_by_date[date_key].append(reading)
+        for date_key, reading in zip(date_keys, filtered_readings):
+            if date_key not in data_by_date:
+                data_by_date[date_key] = []
+            data_by_date[date_key].append(reading)
         
         logger.info(f"Retrieved {len(filtered_readings)} historical readings")
         
-        return jsonify({
+        # Columnar formats carry the flat list; JSON keeps the per-date grouping
+        return readings_response(request, {
+            'days': days,
+            'count': len(filtered_readings)
+        }, filtered_readings, json_payload={
             'days': days,
             'count': len(filtered_readings),
             'data': data_by_date
-        }), 200
+        })
         
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"❌ Error retrieving historical data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/readings/changes', methods=['GET'])
+def get_reading_changes():
+    """
+    Readings, alerts and device updates since the client's cursor
+    
+    Query parameters:
+    - since: Cursor from /dashboard or a previous call (opaque); without it only
+      the current cursor is returned, with resync_required
+    
+    Returns a new cursor. When the client is more than
+    CHANGES_MAX_READINGS readings behind, resync_required is true and the
+    client should reload everything with /dashboard.
+    """
+    try:
+        since = request.args.get('since')
+        if since is None:
+            return jsonify({
+                'cursor': str(supabase_service.get_max_reading_id()),
+                'resync_required': True,
+                'count': 0, 'readings': [], 'alerts': [], 'devices': []
+            }), 200
+        try:
+            cursor = IdCursor.decode(since)
+        except ValueError:
+            return jsonify({'error': f"Invalid cursor '{since}'"}), 400
+        
+        return jsonify(build_changes(cursor, Config.CHANGES_MAX_READINGS)), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Error retrieving changes: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ============================================================================
+# EXPORT ENDPOINT
+# ============================================================================
+
+@api_bp.route('/export', methods=['GET'])
+def export_all_readings():
+    """
+    Stream the full readings history
+    
+    Query parameters:
+    - format: ndjson, csv or parquet (default: ndjson)
+    - device_id: Filter by device_id (optional)
+    - start / end: ISO timestamps bounding measured_at (optional)
+    - cursor: Resume after this reading id (optional)
+    
+    The body is sent with chunked transfer encoding, one database page at
+    a time, in ascending id order.
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in export_formats():
+        return jsonify({
+            'error': f"Unsupported export format '{fmt}'",
+            'available': export_formats()
+        }), 400
+    
+    cursor = request.args.get('cursor', None, type=int)
+    
+    stream = export_readings(
+        supabase_service,
+        fmt,
+        device_id=request.args.get('device_id'),
+        start=request.args.get('start'),
+        end=request.args.get('end'),
+        cursor=cursor
+    )
+    
+    logger.info(f"Starting {fmt} export (cursor={cursor})")
+    
+    response = Response(stream_with_context(stream), mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="readings.{fmt}"'
+    return response
+
+
 # ============================================================================
 # STATISTICS ENDPOINTS
 # ============================================================================
@@ -209,7 +488,7 @@ def get_historical_data():
 def get_statistics():
     """Get basic statistics about stored readings"""
     try:
-        stats = supabase_service.get_statistics()
+        stats = scheduler.result('statistics') or build_statistics()
         
         return jsonify(stats), 200
         
@@ -223,6 +502,39 @@ def get_statistics():
         }), 500
 
 
+# ============================================================================
+# DASHBOARD ENDPOINT
+# ============================================================================
+
+@api_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """
+    Readings, statistics, alerts, heatmap and devices in one response
+    
+    Query parameters:
+    - include: Comma-separated sections (default: all of
+      readings, statistics, alerts, heatmap, devices)
+    - limit: Number of readings in the readings section (default: 50)
+    """
+    try:
+        include = request.args.get('include')
+        sections = list(DASHBOARD_SECTIONS)
+        if include:
+            sections = [name.strip() for name in include.split(',') if name.strip()]
+            unknown = [name for name in sections if name not in DASHBOARD_SECTIONS]
+            if unknown or not sections:
+                return jsonify({
+                    'error': f"Unknown sections {unknown}. Allowed: {list(DASHBOARD_SECTIONS)}"
+                }), 400
+        limit = request.args.get('limit', 50, type=int)
+        
+        return jsonify(build_dashboard(sections, limit=limit)), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Error building dashboard: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ============================================================================
 # HEATMAP DATA ENDPOINT
 # ============================================================================
@@ -238,27 +550,9 @@ def get_heatmap_data():
     try:
         days = request.args.get('days', 7, type=int)
         
-        # Get latest readings for each device
-        latest_readings = supabase_service.get_latest_readings()
-        
-        # Create heatmap data points
-        heatmap_data = []
-        for reading in latest_readings:
-            if reading.get('latitude') and reading.get('longitude'):
-                quality = supabase_service.determine_water_quality(reading)
-                
-                heatmap_data.append({
-                    'lat': reading['latitude'],
-                    'lng': reading['longitude'],
-                    'value': 1.0 if quality == 'good' else 0.5 if quality == 'warning' else 0.1,
-                    'quality': quality,
-                    'device_id': reading['device_id'],
-                    'temperature': reading.get('temperature'),
-                    'ph': reading.get('ph'),
-                    'tds': reading.get('tds'),
-                    'turbidity': reading.get('turbidity'),
-                    'timestamp': reading.get('created_at')
-                })
+        heatmap_data = scheduler.result('heatmap')
+        if heatmap_data is None:
+            heatmap_data = build_heatmap(build_latest())
         
         logger.info(f"Retrieved {len(heatmap_data)} heatmap points")
         
@@ -273,6 +567,54 @@ def get_heatmap_data():
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/surface', methods=['GET'])
+def get_surface():
+    """
+    Get an interpolated quality/sensor grid over a bounding box
+    
+    Query parameters:
+    - bbox: min_lng,min_lat,max_lng,max_lat (required)
+    - zoom: Map zoom level, sets the cell size (default: 10)
+    - fields: Comma-separated subset of quality,temperature,ph,tds,turbidity (default: all)
+    - format: 'binary' (default, see services/surface.py) or 'json'
+    """
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+        fields = parse_surface_fields(request.args.get('fields'))
+        zoom = request.args.get('zoom', 10, type=int)
+        fmt = request.args.get('format', 'binary')
+        if fmt not in ('binary', 'json'):
+            return jsonify({'error': "format must be 'binary' or 'json'"}), 400
+        
+        result = surface_service.surface(bbox, zoom, fields)
+        
+        if fmt == 'json':
+            response = jsonify({
+                'bbox': list(result['bbox']),
+                'zoom': result['zoom'],
+                'cell_degrees': result['cell'],
+                'width': result['width'],
+                'height': result['height'],
+                'devices': result['devices'],
+                'generated_at': to_iso(datetime.fromtimestamp(result['generated_at'], timezone.utc)),
+                'layers': layer_rows(result)
+            })
+        else:
+            response = Response(result['body'], mimetype=SURFACE_MIMETYPE)
+        
+        # Same grid for the whole time bucket: let browsers and proxies reuse it
+        response.set_etag(f"{result['etag']}-{fmt}")
+        response.headers['Cache-Control'] = f"public, max-age={max(0, int(result['expires_at'] - time.time()))}"
+        response = response.make_conditional(request)
+        return compress_response(response, request)
+        
+    except InvalidSurfaceRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error building surface: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ============================================================================
 # ALERTS ENDPOINTS
 # ============================================================================
@@ -281,36 +623,9 @@ def get_heatmap_data():
 def get_alerts():
     """Get current alerts based on quality flags"""
     try:
-        # Get all readings
-        readings = supabase_service.get_readings(limit=100)
-        
-        alerts = []
-        
-        for reading in readings:
-            quality = supabase_service.determine_water_quality(reading)
-            
-            if quality == 'danger':
-                alerts.append({
-                    'id': f"alert_{reading['id']}",
-                    'severity': 'critical',
-                    'message': f"Critical water quality issue at {reading['device_id']}",
-                    'timestamp': reading.get('created_at'),
-                    'resolved': False,
-                    'reading_id': reading['id'],
-                    'device_id': reading['device_id'],
-                    'quality': quality
-                })
-            elif quality == 'warning':
-                alerts.append({
-                    'id': f"alert_{reading['id']}_suspect",
-                    'severity': 'warning',
-                    'message': f"Suspect water quality at {reading['device_id']}",
-                    'timestamp': reading.get('created_at'),
-                    'resolved': False,
-                    'reading_id': reading['id'],
-                    'device_id': reading['device_id'],
-                    'quality': quality
-                })
+        alerts = scheduler.result('alerts')
+        if alerts is None:
+            alerts = build_alerts(supabase_service.get_readings(limit=100))
         
         logger.info(f"Retrieved {len(alerts)} alerts")
         
@@ -352,26 +667,8 @@ def update_alert_status(alert_id):
 def get_devices():
     """Get list of all devices"""
     try:
-        stats = supabase_service.get_statistics()
-        
-        devices = []
-        for device_id in stats['device_list']:
-            # Get latest reading for this device
-            readings = supabase_service.get_readings(limit=1)
-            latest = None
-            for reading in readings:
-                if reading['device_id'] == device_id:
-                    latest = reading
-                    break
-            
-            devices.append({
-                'id': device_id,
-                'name': f"Device {device_id}",
-                'status': 'active',
-                'last_seen': latest['created_at'] if latest else None,
-                'latitude': latest['latitude'] if latest else None,
-                'longitude': latest['longitude'] if latest else None
-            })
+        # One entry per device, from its latest reading (shared snapshot when current)
+        devices = build_devices(build_latest())
         
         logger.info(f"Retrieved {len(devices)} devices")
         
@@ -385,6 +682,41 @@ def get_devices():
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/devices/nearby', methods=['GET'])
+def get_nearby_devices():
+    """Devices near a point: within radius_km, the k nearest, or both"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        radius_km = request.args.get('radius_km', type=float)
+        k = request.args.get('k', type=int)
+
+        if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({'error': 'lat and lng are required, in degrees'}), 400
+        if radius_km is not None and not radius_km > 0:
+            return jsonify({'error': 'radius_km must be positive'}), 400
+        if k is None:
+            # Radius only: everything inside it, up to the cap
+            k = 10 if radius_km is None else Config.NEARBY_MAX_K
+        if not 1 <= k <= Config.NEARBY_MAX_K:
+            return jsonify({'error': f'k must be between 1 and {Config.NEARBY_MAX_K}'}), 400
+
+        devices = device_locations.nearby(lat, lng, radius_km=radius_km, k=k)
+
+        return jsonify({
+            'lat': lat,
+            'lng': lng,
+            'radius_km': radius_km,
+            'k': k,
+            'count': len(devices),
+            'devices': devices
+        }), 200
+
+    except Exception as e:
+        logger.error(f"❌ Error finding nearby devices: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @api_bp.route('/devices/<device_id>', methods=['PATCH'])
 def update_device(device_id):
     """Update device information"""
@@ -406,27 +738,62 @@ def update_device(device_id):
         return jsonify({'error': str(e)}), 500
 
 
+# ============================================================================
+# CALIBRATION ENDPOINTS
+# ============================================================================
+
+@api_bp.route('/calibration/queue', methods=['GET'])
+def get_calibration_queue():
+    """
+    Devices whose probes look out of calibration, worst first
+    
+    Served from the scheduler's 'calibration' job; the analysis scans the
+    whole rollup window and is never run inside a request.
+    
+    Query parameters:
+    - limit: Maximum devices to return (default: 50)
+    """
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        
+        result = scheduler.result('calibration') or calibration_drift.latest()
+        if result is None:
+            response = jsonify({'error': 'Calibration queue not computed yet, try again later'})
+            response.headers['Retry-After'] = '60'
+            return response, 503
+        
+        return jsonify(dict(result, queue=result['queue'][:limit])), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Error building calibration queue: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ============================================================================
 # DEVICE-SPECIFIC ENDPOINTS
 # ============================================================================
 
+
 @api_bp.route('/device/<device_id>/latest', methods=['GET'])
 def get_latest_reading(device_id):
     """Get latest reading from specific device"""
     try:
-        # Get all readings and filter
-        readings = supabase_service.get_readings(limit=100)
-        
-        device_readings = [r for r in readings if r['device_id'] == device_id]
+        # Same answer from every worker while the shared snapshot is current
+        latest = fleet_snapshot.latest_for(device_id)
+        if latest is not None:
+            return jsonify(latest), 200
+        
+        # Otherwise the in-memory ring buffer (warmed from Supabase on a miss)
+        device_readings = recent_readings.get_recent(
+            device_id, 1,
+            loader=supabase_service.get_device_readings,
+            quality_fn=supabase_service.determine_water_quality
+        )
         
         if not device_readings:
             return jsonify({'error': f'No readings for device {device_id}'}), 404
         
-        # Get latest
-        latest = max(device_readings, key=lambda x: x.get('created_at', ''))
-        latest['quality'] = supabase_service.determine_water_quality(latest)
-        
-        return jsonify(latest), 200
+        return jsonify(device_readings[0]), 200
         
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
@@ -435,20 +802,32 @@ def get_latest_reading(device_id):
 
 @api_bp.route('/device/<device_id>/readings', methods=['GET'])
 def get_device_readings(device_id):
-    """Get readings for specific device"""
+    """
+    Get readings for specific device
+    
+    Query parameters:
+    - limit: Number of readings to return (default: 50)
+    - fields: Comma-separated columns to return (optional, default: all)
+    """
     try:
         limit = request.args.get('limit', 50, type=int)
-        
-        # Get all readings and filter
-        readings = supabase_service.get_readings(limit=1000)
-        device_readings = [r for r in readings if r['device_id'] == device_id]
-        
-        # Apply limit
-        device_readings = device_readings[:limit]
-        
-        # Add quality
-        for reading in device_readings:
-            reading['quality'] = supabase_service.determine_water_quality(reading)
+        fields = parse_fields(request.args.get('fields'))
+        
+        if limit <= recent_readings.capacity:
+            # Recent window fits in the ring buffer, already scored
+            device_readings = recent_readings.get_recent(
+                device_id, limit,
+                loader=supabase_service.get_device_readings,
+                quality_fn=supabase_service.determine_water_quality
+            )
+            if fields is not None:
+                device_readings = [{field: reading.get(field) for field in fields}
+                                   for reading in device_readings]
+        else:
+            device_readings = supabase_service.get_device_readings(
+                device_id, limit=limit, columns=select_list(fields)
+            )
+            device_readings = _with_quality(device_readings, fields)
         
         return jsonify({
             'device_id': device_id,
@@ -456,6 +835,8 @@ def get_device_readings(device_id):
             'readings': device_readings
         }), 200
         
+    except InvalidFields as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,3 @@
+"""
+Benchmarks - reproducible performance measurements against a local fake
+"""
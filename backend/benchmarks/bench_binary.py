@@ -0,0 +1,88 @@
+"""
+Binary Frame Micro-benchmark
+
+Compares JSON and binary frames (services/binary_protocol.py) for the same
+readings: bytes on the wire and server CPU to decode and validate them.
+No Flask or database involved. Usage (from backend/):
+
+    python -m benchmarks.bench_binary --n 50000 --per-frame 1 10 100
+"""
+
+import argparse
+import json
+import time
+
+from services import validation
+from services.binary_protocol import encode_frame, decode_frame
+
+DEVICE_ID = 'sensor-01'
+LATITUDE = 35.1892
+LONGITUDE = -0.6417
+# Recent enough to pass the clock-skew check
+START = int(time.time()) - 86400
+
+
+def make_readings(count: int):
+    return [{
+        'seq': i + 1,
+        'measured_at': START + 60 * i,
+        'temperature': 21.5 + (i % 7) * 0.25,
+        'ph': 7.2 + (i % 5) * 0.01,
+        'tds': 180 + i % 40,
+        'turbidity': 1.5 + (i % 3) * 0.1,
+    } for i in range(count)]
+
+
+def json_body(readings) -> bytes:
+    payloads = [{'device_id': DEVICE_ID, 'latitude': LATITUDE, 'longitude': LONGITUDE, **r} for r in readings]
+    return json.dumps(payloads[0] if len(payloads) == 1 else payloads).encode('utf-8')
+
+
+def decode_json(body: bytes):
+    data = validation.loads(body)
+    if isinstance(data, dict):
+        data = [data]
+    valid, rejected = validation.validate_batch(data)
+    assert not rejected, rejected
+    return valid
+
+
+def decode_binary(body: bytes):
+    valid, rejected = validation.validate_batch(decode_frame(body))
+    assert not rejected, rejected
+    return valid
+
+
+def measure(func, body: bytes, n: int) -> float:
+    start = time.process_time()
+    for _ in range(n):
+        func(body)
+    return (time.process_time() - start) / n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON vs binary frame micro-benchmark")
+    parser.add_argument('--n', type=int, default=50000, help="Reading decodes per measurement")
+    parser.add_argument('--per-frame', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args(argv)
+
+    print(f"orjson available: {validation.orjson is not None}")
+    print(f"{'per frame':>9} | {'json B/rd':>9} {'frame B/rd':>10} {'ratio':>6} | "
+          f"{'json µs/rd':>10} {'frame µs/rd':>11}")
+    for per_frame in args.per_frame:
+        readings = make_readings(per_frame)
+        as_json = json_body(readings)
+        as_frame = encode_frame(DEVICE_ID, LATITUDE, LONGITUDE, readings)
+        assert len(decode_json(as_json)) == len(decode_binary(as_frame)) == per_frame
+
+        frames = max(1, args.n // per_frame)
+        json_cost = measure(decode_json, as_json, frames) / per_frame
+        frame_cost = measure(decode_binary, as_frame, frames) / per_frame
+        print(f"{per_frame:>9} | {len(as_json) / per_frame:>9.1f} {len(as_frame) / per_frame:>10.1f} "
+              f"{len(as_json) / len(as_frame):>5.1f}x | "
+              f"{json_cost * 1e6:>10.2f} {frame_cost * 1e6:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Calibration Drift Benchmark
+
+Builds a synthetic window of hourly rollups (default 10k devices × 90 days
+= 21.6M rows) directly as column arrays, injects drifting, stepping and
+stuck probes into a few devices, and times ``services.calibration.analyze``.
+Loading from Supabase is not included. Usage (from backend/):
+
+    python -m benchmarks.bench_drift --devices 10000 --days 90
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.calibration import analyze
+from services.timestamps import utc_now, to_iso
+
+
+def synthetic_frame(devices: int, days: int, seed: int, faulty: int):
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+    end = np.datetime64(to_iso(utc_now())[:13], 'h') + 1
+    start = end - hours
+
+    device = np.repeat(np.arange(devices, dtype=np.int64), hours)
+    hour_index = np.tile(np.arange(hours), devices)
+    frame = {
+        'device': device,
+        'hour': start + hour_index.astype('timedelta64[h]'),
+        'reading_count': np.full(devices * hours, 60.0),
+        'device_ids': np.array([f'sim-{i:05d}' for i in range(devices)], dtype=object),
+    }
+
+    # Devices scattered in ~0.5° around Oran; a shared diurnal and seasonal signal
+    latitude = 35.19 + rng.normal(0, 0.25, devices)
+    longitude = -0.64 + rng.normal(0, 0.25, devices)
+    frame['latitude'] = latitude[device]
+    frame['longitude'] = longitude[device]
+    shared = np.sin(2 * np.pi * hour_index / 24) * 0.05 + hour_index / hours * 0.1
+    frame['ph'] = (rng.uniform(6.9, 7.6, devices)[device] + shared
+                   + rng.normal(0, 0.05, devices * hours))
+    frame['tds'] = (rng.uniform(150, 400, devices)[device] + shared * 100
+                    + rng.normal(0, 8, devices * hours))
+
+    ph = frame['ph'].reshape(devices, hours)
+    tds = frame['tds'].reshape(devices, hours)
+    t = np.arange(hours) / 24.0
+    injected = {}
+    for i in range(faulty):
+        kind = ('drift', 'step', 'stuck')[i % 3]
+        if kind == 'drift':
+            ph[i] += 0.02 * t  # 1.8 pH units over 90 days
+        elif kind == 'step':
+            tds[i, hours // 2:] += 150
+        else:
+            ph[i, -5 * 24:] = ph[i, -5 * 24]
+        injected[frame['device_ids'][i]] = kind
+    return frame, injected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibration drift analytics benchmark")
+    parser.add_argument('--devices', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--faulty', type=int, default=30, help="Devices with injected faults")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    frame, injected = synthetic_frame(args.devices, args.days, args.seed, args.faulty)
+    built = time.perf_counter() - started
+
+    result = analyze(frame, window_days=args.days)
+    queued = {entry['device_id']: entry for entry in result['queue']}
+    found = sum(1 for device_id in injected if device_id in queued)
+
+    print(f"rows            : {result['rows_analyzed']:,} ({args.devices:,} devices × {args.days} days)")
+    print(f"synthetic build : {built:.2f}s")
+    print(f"analyze         : {result['compute_seconds']:.2f}s")
+    print(f"queued          : {result['count']} devices")
+    print(f"injected found  : {found}/{len(injected)}")
+    false_positives = [d for d in queued if d not in injected]
+    print(f"false positives : {len(false_positives)}")
+    for entry in result['queue'][:5]:
+        print(f"  #{entry['rank']} {entry['device_id']} score={entry['score']} "
+              f"{entry['reasons']} (injected: {injected.get(entry['device_id'], '-')})")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
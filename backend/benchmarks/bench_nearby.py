@@ -0,0 +1,100 @@
+"""
+Nearby Devices Benchmark
+
+Loads a synthetic fleet (default 100k devices scattered over Algeria)
+into ``services.spatial_index.DeviceLocationIndex`` and times the build,
+k-nearest and radius queries, an incremental update that moves and adds
+1% of the devices, and queries against the resulting delta. Results are
+checked against a brute-force haversine scan. Usage (from backend/):
+
+    python -m benchmarks.bench_nearby --devices 100000 --queries 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.spatial_index import DeviceLocationIndex, haversine_km, BallTree
+
+
+def synthetic_fleet(devices: int, seed: int):
+    rng = np.random.default_rng(seed)
+    ids = np.array([f'sim-{i:06d}'.encode() for i in range(devices)], dtype='S64')
+    lat = rng.uniform(19.0, 37.0, devices)
+    lng = rng.uniform(-8.5, 12.0, devices)
+    quality = rng.integers(1, 4, devices).astype(np.uint8)
+    measured_at = np.full(devices, b'2026-01-01T00:00:00+00:00', dtype='S32')
+    return ids, lat, lng, quality, measured_at
+
+
+def time_queries(index, points, **kwargs):
+    started = time.perf_counter()
+    latencies = []
+    for lat, lng in points:
+        begin = time.perf_counter()
+        index.nearby(lat, lng, **kwargs)
+        latencies.append(time.perf_counter() - begin)
+    latencies = np.array(latencies) * 1000
+    return (time.perf_counter() - started, float(np.percentile(latencies, 50)),
+            float(np.percentile(latencies, 99)))
+
+
+def check(index, fleet, points, k):
+    """Count queries whose k nearest differ from a brute-force scan"""
+    ids, lat, lng = fleet[0], np.radians(fleet[1]), np.radians(fleet[2])
+    mismatches = 0
+    for plat, plng in points:
+        distances = haversine_km(np.radians(plat), np.radians(plng), lat, lng)
+        expected = {ids[i].decode() for i in np.argsort(distances)[:k]}
+        found = {d['device_id'] for d in index.nearby(plat, plng, k=k)}
+        mismatches += expected != found
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nearby devices spatial index benchmark")
+    parser.add_argument('--devices', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--radius-km', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed + 1)
+    points = np.column_stack([rng.uniform(19.0, 37.0, args.queries), rng.uniform(-8.5, 12.0, args.queries)])
+    fleet = synthetic_fleet(args.devices, args.seed)
+
+    index = DeviceLocationIndex(refresh_seconds=float('inf'), rebuild_fraction=0.05)
+    index._refreshed_at = time.monotonic()  # positions are pushed with update() below
+    started = time.perf_counter()
+    index.update(*fleet)
+    print(f"backend         : {'BallTree (haversine)' if BallTree is not None else 'brute force (no scikit-learn)'}")
+    print(f"build           : {time.perf_counter() - started:.3f}s for {args.devices:,} devices")
+
+    _, p50, p99 = time_queries(index, points, k=args.k)
+    print(f"k={args.k:<13}: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+    _, p50, p99 = time_queries(index, points, radius_km=args.radius_km, k=1000)
+    print(f"radius {args.radius_km:<8}km: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+    # Move 1% of devices and add 1% more: goes to the delta, no rebuild
+    moved = rng.choice(args.devices, args.devices // 100, replace=False)
+    ids, lat, lng, quality, measured_at = (a.copy() for a in fleet)
+    lat[moved] += rng.normal(0, 0.05, len(moved))
+    added = synthetic_fleet(args.devices // 100, args.seed + 2)
+    added[0][:] = [f'new-{i:06d}'.encode() for i in range(len(added[0]))]
+    fleet = tuple(np.concatenate([a, b]) for a, b in zip((ids, lat, lng, quality, measured_at), added))
+    started = time.perf_counter()
+    index.update(*fleet)
+    stats = index.stats()
+    print(f"update          : {time.perf_counter() - started:.3f}s, delta {stats['delta']}, "
+          f"builds {stats['builds']}")
+
+    _, p50, p99 = time_queries(index, points, k=args.k)
+    print(f"k={args.k:<13}: p50 {p50:.3f} ms, p99 {p99:.3f} ms (with delta)")
+    print(f"brute-force check: {check(index, fleet, points[:200], args.k)} mismatches in 200 queries")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
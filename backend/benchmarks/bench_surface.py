@@ -0,0 +1,78 @@
+"""
+Map Surface Benchmark
+
+Times ``services.surface`` grids over a synthetic fleet scattered over
+Algeria, for a country-wide bbox (zoom 5) and a city bbox (zoom 11), at
+each fleet size. ``build`` is a cold grid (neighbour search, weighting
+and encoding); ``cached`` is the same request again within the time
+bucket. Usage (from backend/):
+
+    python -m benchmarks.bench_surface --devices 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.surface import SurfaceService, KDTree, FIELDS
+
+VIEWS = {
+    'country z5': ((-8.5, 19.0, 12.0, 37.0), 5),
+    'city z11': ((2.9, 36.6, 3.3, 36.85), 11),
+}
+
+
+def synthetic_points(devices: int, seed: int):
+    rng = np.random.default_rng(seed)
+    # Half spread over the country, half clustered around Algiers
+    spread = devices // 2
+    lat = np.concatenate([rng.uniform(19.0, 37.0, spread), rng.normal(36.72, 0.08, devices - spread)])
+    lng = np.concatenate([rng.uniform(-8.5, 12.0, spread), rng.normal(3.05, 0.1, devices - spread)])
+    return {
+        'latitude': lat,
+        'longitude': lng,
+        'quality': rng.choice([1.0, 0.5, 0.1], devices),
+        'temperature': rng.normal(22, 3, devices),
+        'ph': rng.normal(7.2, 0.4, devices),
+        'tds': rng.normal(350, 80, devices),
+        'turbidity': np.abs(rng.normal(2, 1, devices)),
+    }
+
+
+def time_view(service, bbox, zoom, repeats):
+    cold = []
+    for _ in range(repeats):
+        service._cache.clear()
+        started = time.perf_counter()
+        result = service.surface(bbox, zoom, FIELDS)
+        cold.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    service.surface(bbox, zoom, FIELDS)
+    cached = time.perf_counter() - started
+    return result, float(np.median(cold)) * 1000, cached * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interpolated map surface benchmark")
+    parser.add_argument('--devices', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    print(f"backend: {'KDTree' if KDTree is not None else 'brute force (no scikit-learn)'}")
+    for devices in args.devices:
+        service = SurfaceService(bucket_seconds=3600, cache_size=8)
+        points = synthetic_points(devices, args.seed)
+        # Pin the points to the current bucket instead of reading the database
+        service._points = (service.bucket(), points)
+        for name, (bbox, zoom) in VIEWS.items():
+            result, cold_ms, cached_ms = time_view(service, bbox, zoom, args.repeats)
+            print(f"{devices:>7,} devices  {name:<11}: {result['width']}x{result['height']} cells, "
+                  f"{result['devices']:>7,} used, build {cold_ms:7.1f} ms, cached {cached_ms:.3f} ms, "
+                  f"{len(result['body']) / 1024:.0f} KiB")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Validation Micro-benchmark
+
+Compares the per-request CPU cost of the original ingest parsing
+(``json`` + required-field list comprehension + ``float()``/``int()``
+conversion + ``json`` re-serialization) with the compiled validator and
+orjson. No Flask or database involved. Usage (from backend/):
+
+    python -m benchmarks.bench_validation --n 200000
+"""
+
+import argparse
+import json
+import time
+
+from services import validation
+
+PAYLOAD = json.dumps({
+    'device_id': 'sensor-01',
+    'temperature': 22.5,
+    'ph': 7.5,
+    'tds': 180,
+    'turbidity': 2.0,
+    'latitude': 35.1892,
+    'longitude': -0.6417,
+}).encode('utf-8')
+
+STORED_EXTRA = {'id': 123456, 'created_at': '2024-01-01T12:00:00.000000+00:00', 'quality': 'good'}
+
+
+def legacy_path(body: bytes) -> bytes:
+    data = json.loads(body)
+    required_fields = ['device_id', 'temperature', 'ph', 'tds', 'turbidity', 'latitude', 'longitude']
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        raise ValueError(missing_fields)
+    reading_data = {
+        'device_id': str(data['device_id']),
+        'temperature': float(data['temperature']),
+        'ph': float(data['ph']),
+        'tds': int(float(data['tds'])),
+        'turbidity': float(data['turbidity']),
+        'latitude': float(data['latitude']),
+        'longitude': float(data['longitude'])
+    }
+    return json.dumps({'success': True, 'data': {**reading_data, **STORED_EXTRA}}, sort_keys=True).encode('utf-8')
+
+
+def compiled_path(body: bytes) -> bytes:
+    reading, errors = validation.validate_reading(validation.loads(body))
+    if errors:
+        raise ValueError(errors)
+    return validation.dumps({'success': True, 'data': {**reading, **STORED_EXTRA}})
+
+
+def measure(func, n: int) -> float:
+    start = time.process_time()
+    for _ in range(n):
+        func(PAYLOAD)
+    return (time.process_time() - start) / n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest parsing micro-benchmark")
+    parser.add_argument('--n', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    legacy = measure(legacy_path, args.n)
+    compiled = measure(compiled_path, args.n)
+
+    print(f"orjson available: {validation.orjson is not None}")
+    print(f"legacy   : {legacy * 1e6:8.2f} µs CPU per request")
+    print(f"compiled : {compiled * 1e6:8.2f} µs CPU per request")
+    print(f"saved    : {(legacy - compiled) * 1e6:8.2f} µs ({(1 - compiled / legacy) * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Fake PostgREST - in-process stand-in for the Supabase client
+
+Implements the subset of the supabase-py query builder that
+``SupabaseService`` uses (``table``, ``select`` with ``count="exact"``,
+``insert``, ``upsert``, ``delete``, ``eq``/``gt``/``gte``/``lt``/``lte``/
+``in_``, ``order``, ``range``, ``limit``, ``execute``) over plain Python
+lists, so the API can be benchmarked without network access. Rows are kept
+in insertion order and queries ordered by a column that is still in
+insertion order (``id``, ``created_at``, ``measured_at``) are answered by
+slicing instead of sorting. Like a hosted Supabase project,
+reads return at most ``max_rows`` rows (1000 by default) unless limited
+further.
+"""
+
+import operator
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_OPS = {
+    'eq': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeTable:
+    """Rows of one table plus which columns are still in ascending order"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: List[Dict[str, Any]] = []
+        self.next_id = 1
+        self.sorted_columns = {'id', 'created_at', 'measured_at'}
+
+    def append(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(row)
+        if 'id' not in row:
+            row['id'] = self.next_id
+        self.next_id = max(self.next_id, row['id']) + 1
+        if 'created_at' not in row:
+            row['created_at'] = datetime.utcnow().isoformat()
+
+        if self.rows:
+            last = self.rows[-1]
+            for column in list(self.sorted_columns):
+                if row.get(column) is None or last.get(column) is None or row[column] < last[column]:
+                    self.sorted_columns.discard(column)
+        self.rows.append(row)
+        return row
+
+    def upsert(self, row: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
+        for existing in self.rows:
+            if all(existing.get(key) == row.get(key) for key in keys):
+                existing.update(row)
+                return existing
+        return self.append(row)
+
+
+class FakeQuery:
+    def __init__(self, table: FakeTable, max_rows: Optional[int] = None):
+        self._table = table
+        self._max_rows = max_rows
+        self._columns: Optional[List[str]] = None
+        self._count = None
+        self._insert = None
+        self._upsert_keys = None
+        self._delete = False
+        self._filters = []
+        self._order = None
+        self._offset = 0
+        self._limit = None
+
+    # ---- builder -----------------------------------------------------------
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(',')]
+        self._count = count
+        return self
+
+    def insert(self, data):
+        self._insert = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict: str = 'id'):
+        self._insert = data if isinstance(data, list) else [data]
+        self._upsert_keys = [c.strip() for c in on_conflict.split(',')]
+        return self
+
+    def delete(self):
+        self._delete = True
+        return self
+
+    def _filter(self, op: str, column: str, value):
+        self._filters.append((column, _OPS[op], value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter('eq', column, value)
+
+    def gt(self, column, value):
+        return self._filter('gt', column, value)
+
+    def gte(self, column, value):
+        return self._filter('gte', column, value)
+
+    def lt(self, column, value):
+        return self._filter('lt', column, value)
+
+    def lte(self, column, value):
+        return self._filter('lte', column, value)
+
+    def in_(self, column, values):
+        allowed = set(values)
+        self._filters.append((column, lambda a, b: a in b, allowed))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset = start
+        self._limit = max(0, end - start + 1)
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    # ---- execution ---------------------------------------------------------
+
+    def _matches(self, row) -> bool:
+        for column, op, value in self._filters:
+            current = row.get(column)
+            if current is None or not op(current, value):
+                return False
+        return True
+
+    def _project(self, rows):
+        if self._columns is None:
+            return [dict(row) for row in rows]
+        return [{column: row.get(column) for column in self._columns} for row in rows]
+
+    def _effective_limit(self) -> Optional[int]:
+        if self._max_rows is None:
+            return self._limit
+        if self._limit is None:
+            return self._max_rows
+        return min(self._limit, self._max_rows)
+
+    def _window(self, rows):
+        limit = self._effective_limit()
+        end = None if limit is None else self._offset + limit
+        return rows[self._offset:end]
+
+    def execute(self) -> FakeResponse:
+        table = self._table
+
+        if self._upsert_keys is not None:
+            return FakeResponse([dict(table.upsert(row, self._upsert_keys)) for row in self._insert])
+
+        if self._insert is not None:
+            return FakeResponse([dict(table.append(row)) for row in self._insert])
+
+        if self._delete:
+            kept = [row for row in table.rows if not self._matches(row)]
+            removed = len(table.rows) - len(kept)
+            table.rows = kept
+            return FakeResponse([], count=removed)
+
+        rows = table.rows
+        ordered_by_slice = (
+            self._order is not None
+            and self._order[0] in table.sorted_columns
+            and not self._filters
+        )
+
+        if ordered_by_slice:
+            column, desc = self._order
+            total = len(rows)
+            if desc:
+                limit = self._effective_limit()
+                end = None if limit is None else self._offset + limit
+                start_index = total - 1 - self._offset
+                stop_index = -1 if end is None else max(-1, total - 1 - end)
+                selected = [rows[i] for i in range(start_index, stop_index, -1)]
+            else:
+                selected = self._window(rows)
+        else:
+            matched = [row for row in rows if self._matches(row)] if self._filters else list(rows)
+            if self._order is not None:
+                column, desc = self._order
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            selected = self._window(matched)
+
+        count = None
+        if self._count == 'exact':
+            count = len(rows) if not self._filters else sum(1 for row in rows if self._matches(row))
+
+        return FakeResponse(self._project(selected), count=count)
+
+
+class FakeSupabaseClient:
+    """Drop-in for ``supabase.Client`` in benchmarks and local testing"""
+
+    def __init__(self, max_rows: Optional[int] = 1000):
+        self.max_rows = max_rows
+        self._tables: Dict[str, FakeTable] = {}
+
+    def table(self, name: str) -> FakeQuery:
+        if name not in self._tables:
+            self._tables[name] = FakeTable(name)
+        return FakeQuery(self._tables[name], self.max_rows)
+
+    def bulk_load(self, name: str, rows: List[Dict[str, Any]]):
+        """Append rows without going through the query builder"""
+        if name not in self._tables:
+            self._tables[name] = FakeTable(name)
+        table = self._tables[name]
+        for row in rows:
+            table.append(row)
+
+    def row_count(self, name: str) -> int:
+        return len(self._tables[name].rows) if name in self._tables else 0
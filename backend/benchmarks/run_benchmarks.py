@@ -0,0 +1,235 @@
+"""
+Benchmark Suite - Standalone Script
+
+Runs the Flask API against the in-process PostgREST fake and records
+ingest throughput, read endpoint latency and MLIntegrator scoring
+throughput as JSON. Usage (from backend/):
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --sizes 1000,100000 --output before.json
+    python -m benchmarks.run_benchmarks --output after.json --compare before.json
+
+The fake answers queries from memory, so the numbers isolate the cost of
+the API's own request handling and Python-side processing; they are not a
+measure of Supabase latency.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Read endpoints must do their own work on every request: no background
+# precomputes racing the timed requests, and no fleet snapshot left over
+# from another run. Set before anything imports config.settings.
+os.environ['SCHEDULER_ENABLED'] = 'false'
+os.environ['FLEET_SNAPSHOT_PATH'] = os.path.join(tempfile.mkdtemp(prefix='wq-bench-'), 'fleet_snapshot')
+
+from benchmarks.fake_postgrest import FakeSupabaseClient
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+READ_ENDPOINTS = ['/api/readings?limit=50', '/api/statistics', '/api/heatmap', '/api/alerts']
+
+
+def synthetic_rows(count: int, devices: int = 100, seed: int = 42):
+    """``count`` readings spread evenly over the last 30 days, oldest first"""
+    rng = random.Random(seed)
+    end = datetime.utcnow() - timedelta(minutes=1)
+    step = timedelta(days=30) / max(count, 1)
+    start = end - step * count
+    for i in range(count):
+        device = i % devices
+        yield {
+            'id': i + 1,
+            'device_id': f'sensor-{device:04d}',
+            'temperature': round(rng.gauss(21, 4), 2),
+            'ph': round(rng.gauss(7.4, 0.6), 2),
+            'tds': int(rng.gauss(260, 120)),
+            'turbidity': round(abs(rng.gauss(3, 2.5)), 2),
+            'latitude': 35.0 + device * 0.001,
+            'longitude': -0.6 - device * 0.001,
+            'measured_at': (start + step * i).isoformat(),
+            'created_at': (start + step * i).isoformat(),
+        }
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def bench_ingest(client, count: int):
+    rng = random.Random(7)
+    samples = []
+    for i in range(count):
+        payload = {
+            'device_id': f'sensor-{i % 100:04d}',
+            'temperature': round(rng.uniform(10, 30), 2),
+            'ph': round(rng.uniform(6, 9), 2),
+            'tds': rng.randint(50, 800),
+            'turbidity': round(rng.uniform(0, 10), 2),
+            'latitude': 35.19,
+            'longitude': -0.64,
+        }
+        start = time.perf_counter()
+        response = client.post('/api/sensor/data', json=payload)
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 201:
+            raise RuntimeError(f"Ingest failed: {response.status_code} {response.get_data(as_text=True)[:200]}")
+    result = summarize(samples)
+    result['throughput_per_s'] = round(count / sum(samples), 1)
+    return result
+
+
+def bench_endpoint(client, path: str, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} failed: {response.status_code}")
+    return summarize(samples)
+
+
+def bench_ml_scoring(count: int):
+    from app.controllers.ml_integrator import MLIntegrator
+
+    integrator = MLIntegrator()
+    rng = random.Random(11)
+    samples = [{
+        'temperature': rng.uniform(5, 40),
+        'ph': rng.uniform(5, 10),
+        'tds': rng.uniform(20, 1200),
+        'turbidity': rng.uniform(0, 30),
+    } for _ in range(count)]
+
+    results = {}
+    for path, available in (('ml', True), ('fallback', False)):
+        integrator.available = available
+        start = time.perf_counter()
+        for sample in samples:
+            integrator.assess_quality(sample)
+        elapsed = time.perf_counter() - start
+        results[path] = {
+            'n': count,
+            'throughput_per_s': round(count / elapsed, 1),
+            'mean_us': round(elapsed / count * 1e6, 3),
+        }
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run(sizes, ingest_count: int, repeat: int, ml_count: int):
+    from services.supabase_service import supabase_service
+    from services.recent_readings import recent_readings
+    from app import create_app
+
+    app = create_app()
+    client = app.test_client()
+
+    results = {'sizes': {}}
+    for size in sizes:
+        logger.warning(f"📊 Seeding {size} rows...")
+        fake = FakeSupabaseClient()
+        fake.bulk_load(supabase_service.table_name, synthetic_rows(size))
+        supabase_service.client = fake
+        recent_readings._buffers.clear()
+
+        size_results = {}
+        for path in READ_ENDPOINTS:
+            size_results[path] = bench_endpoint(client, path, repeat)
+        size_results['POST /api/sensor/data'] = bench_ingest(client, ingest_count)
+        results['sizes'][str(size)] = size_results
+        logger.warning(f"✅ {size} rows done")
+
+    results['ml_scoring'] = bench_ml_scoring(ml_count)
+    return results
+
+
+def compare(current, previous):
+    """Print p50 / throughput ratios against an earlier run"""
+    print(f"{'benchmark':60} {'before':>10} {'after':>10} {'ratio':>7}")
+    for size, endpoints in current['results']['sizes'].items():
+        before_endpoints = previous['results']['sizes'].get(size, {})
+        for name, stats in endpoints.items():
+            before = before_endpoints.get(name)
+            if not before:
+                continue
+            ratio = stats['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('nan')
+            print(f"{size + ' ' + name:60} {before['p50_ms']:>10.3f} {stats['p50_ms']:>10.3f} {ratio:>7.2f}")
+    for path, stats in current['results']['ml_scoring'].items():
+        before = previous['results'].get('ml_scoring', {}).get(path)
+        if before:
+            ratio = stats['throughput_per_s'] / before['throughput_per_s']
+            print(f"{'ml_scoring ' + path + ' (per s)':60} {before['throughput_per_s']:>10.0f} "
+                  f"{stats['throughput_per_s']:>10.0f} {ratio:>7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Water Quality API benchmarks")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated table sizes to seed")
+    parser.add_argument('--ingest', type=int, default=500, help="POSTs per size")
+    parser.add_argument('--repeat', type=int, default=20, help="Requests per read endpoint")
+    parser.add_argument('--ml', type=int, default=20000, help="Samples per scoring path")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    results = run(sizes, args.ingest, args.repeat, args.ml)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {'sizes': sizes, 'ingest': args.ingest, 'repeat': args.repeat, 'ml': args.ml},
+        },
+        'results': results,
+    }
+
+    output = args.output
+    if not output:
+        results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        output = os.path.join(results_dir, datetime.utcnow().strftime('%Y%m%dT%H%M%S') + '.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Compact Readings - Standalone Script
+
+Applies the retention policy: folds raw readings older than the raw
+retention window into hourly aggregates, deletes them, and purges
+aggregates past the hourly window (see services/retention.py). Usage:
+
+    python compact_readings.py --dry-run
+    python compact_readings.py --raw-days 30 --hourly-days 730
+    python compact_readings.py --max-batches 50 --pause 0.2
+    python compact_readings.py --rollup-only
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from config.settings import Config
+from services.retention import CompactionJob
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Roll up and purge old water quality readings")
+    parser.add_argument('--raw-days', type=int, default=Config.RETENTION_RAW_DAYS,
+                        help="Keep raw readings this many days")
+    parser.add_argument('--hourly-days', type=int, default=Config.RETENTION_HOURLY_DAYS,
+                        help="Keep hourly aggregates this many days")
+    parser.add_argument('--batch-size', type=int, default=Config.COMPACTION_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, help="Stop after this many batches")
+    parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+    parser.add_argument('--rollup-only', action='store_true',
+                        help="Only fold readings stored since the last pass into hourly rollups")
+    return parser.parse_args(argv)
+
+
+def log_progress(report):
+    eligible = report['raw_eligible'] or 1
+    logger.info(f"⏳ Batch {report['batches']}: {report['raw_compacted']}/{report['raw_eligible']} "
+                f"raw readings ({report['raw_compacted'] / eligible:.0%}), "
+                f"{report['rollups_written']} rollups, {report['elapsed_seconds']}s")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from services.supabase_service import supabase_service
+
+    job = CompactionJob(supabase_service, raw_days=args.raw_days,
+                        hourly_days=args.hourly_days, batch_size=args.batch_size)
+    if args.rollup_only:
+        report = job.rollup_new(max_batches=args.max_batches)
+        print(json.dumps(report, indent=2))
+        return 0
+
+    report = job.run(dry_run=args.dry_run, max_batches=args.max_batches,
+                     progress=log_progress, pause_seconds=args.pause)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
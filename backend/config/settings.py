@@ -3,6 +3,7 @@ Water Quality Backend - Configuration
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,10 +22,162 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{DATABASE_PATH}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Readings storage: 'none' (one table) or 'monthly' (routed monthly tables,
+    # migrations/006_monthly_partitions.sql). SUPABASE_URL=sqlite:///path uses a
+    # local SQLite stand-in instead of Supabase.
+    READINGS_PARTITIONING = os.getenv('READINGS_PARTITIONING', 'none')
+    PARTITION_REGISTRY_REFRESH_SECONDS = float(os.getenv('PARTITION_REGISTRY_REFRESH_SECONDS', 60))
+    # Keep reading water_quality_readings itself until partition_readings.py has emptied it
+    PARTITION_INCLUDE_LEGACY = os.getenv('PARTITION_INCLUDE_LEGACY', 'true').lower() == 'true'
+    
     # ============ API ============
     API_HOST = os.getenv('API_HOST', '0.0.0.0')
     API_PORT = int(os.getenv('API_PORT', 5000))
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
+    # /readings/changes: behind by more than this many readings, the client must resync
+    CHANGES_MAX_READINGS = int(os.getenv('CHANGES_MAX_READINGS', 500))
+    
+    # ============ RESPONSE ENCODING ============
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+    RESPONSE_GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 6))
+    RESPONSE_BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', 5))
+    
+    # ============ EXPORT ============
+    EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 1000))
+    
+    # ============ RECENT READINGS BUFFER ============
+    RECENT_BUFFER_CAPACITY = int(os.getenv('RECENT_BUFFER_CAPACITY', 256))
+    RECENT_BUFFER_MAX_DEVICES = int(os.getenv('RECENT_BUFFER_MAX_DEVICES', 10000))
+    # Re-read a warm buffer from the database after this long, so readings stored by
+    # other workers and the ingest gateway show up (0 = never)
+    RECENT_BUFFER_REFRESH_SECONDS = float(os.getenv('RECENT_BUFFER_REFRESH_SECONDS', 10))
+    
+    # ============ FLEET SNAPSHOT ============
+    # Latest reading per device in one mmap shared by all workers on a host
+    FLEET_SNAPSHOT_PATH = os.getenv(
+        'FLEET_SNAPSHOT_PATH',
+        '/dev/shm/water_quality_fleet' if os.path.isdir('/dev/shm')
+        else os.path.join(tempfile.gettempdir(), 'water_quality_fleet')
+    )
+    FLEET_SNAPSHOT_MAX_DEVICES = int(os.getenv('FLEET_SNAPSHOT_MAX_DEVICES', 100000))
+    # Readers fall back to Supabase when the writer has not refreshed for this long
+    FLEET_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv('FLEET_SNAPSHOT_MAX_AGE_SECONDS', 120))
+    # Replace the running reading count with an exact count this often (retention purges)
+    FLEET_SNAPSHOT_RECOUNT_SECONDS = float(os.getenv('FLEET_SNAPSHOT_RECOUNT_SECONDS', 600))
+    
+    # ============ NEARBY DEVICES ============
+    # Ball tree over device positions (services/spatial_index.py)
+    NEARBY_INDEX_REFRESH_SECONDS = float(os.getenv('NEARBY_INDEX_REFRESH_SECONDS', 10))
+    # Rebuild the tree once this fraction of devices were added or moved since the last build
+    NEARBY_REBUILD_FRACTION = float(os.getenv('NEARBY_REBUILD_FRACTION', 0.05))
+    NEARBY_MAX_K = int(os.getenv('NEARBY_MAX_K', 1000))
+    
+    # ============ MAP SURFACE ============
+    # Interpolated grids for /api/surface (services/surface.py)
+    SURFACE_BUCKET_SECONDS = int(os.getenv('SURFACE_BUCKET_SECONDS', 60))
+    # Grid cell edge in screen pixels at the requested zoom, and the cell cap per grid
+    SURFACE_CELL_PIXELS = int(os.getenv('SURFACE_CELL_PIXELS', 8))
+    SURFACE_MAX_CELLS = int(os.getenv('SURFACE_MAX_CELLS', 65536))
+    # Inverse-distance weighting over the nearest devices, weight 1 / d^power
+    SURFACE_NEIGHBOURS = int(os.getenv('SURFACE_NEIGHBOURS', 8))
+    SURFACE_POWER = float(os.getenv('SURFACE_POWER', 2.0))
+    # Cells farther than this from every device are left empty
+    SURFACE_MAX_DISTANCE_KM = float(os.getenv('SURFACE_MAX_DISTANCE_KM', 25.0))
+    SURFACE_CACHE_SIZE = int(os.getenv('SURFACE_CACHE_SIZE', 64))
+    
+    # ============ LOGGING ============
+    LOG_DEVICE_SAMPLE_EVERY = int(os.getenv('LOG_DEVICE_SAMPLE_EVERY', 1))
+    LOG_DEVICE_MAX_PER_MINUTE = int(os.getenv('LOG_DEVICE_MAX_PER_MINUTE', 60))
+    
+    # ============ PROFILING ============
+    # Key for X-Profile / X-Profile-Admin signatures; empty disables both
+    PROFILING_SECRET = os.getenv('PROFILING_SECRET', '')
+    # Fraction of all requests profiled when no admin toggle is active
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+    # 'cprofile' (.prof files) or 'sample' (stack sampling, .folded files)
+    PROFILING_MODE = os.getenv('PROFILING_MODE', 'cprofile')
+    PROFILING_SAMPLE_INTERVAL_SECONDS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_SECONDS', 0.005))
+    # The logs/ directory app.py creates
+    PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs', 'profiles'
+    ))
+    PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', 200))
+    
+    # ============ INGEST ============
+    INGEST_MAX_BATCH = int(os.getenv('INGEST_MAX_BATCH', 500))
+    DEVICE_ID_MAX_LENGTH = 100
+    IDEMPOTENCY_KEY_MAX_LENGTH = 128
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 100000))
+    IDEMPOTENCY_TTL_SECONDS = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 86400))
+    
+    # Token buckets per worker process: per device (one token per request) and global (one per reading)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    DEVICE_RATE_PER_SECOND = float(os.getenv('DEVICE_RATE_PER_SECOND', 1.0))
+    DEVICE_BURST = float(os.getenv('DEVICE_BURST', 60))
+    GLOBAL_INGEST_RATE_PER_SECOND = float(os.getenv('GLOBAL_INGEST_RATE_PER_SECOND', 500))
+    GLOBAL_INGEST_BURST = float(os.getenv('GLOBAL_INGEST_BURST', 2000))
+    RATE_LIMIT_MAX_DEVICES = int(os.getenv('RATE_LIMIT_MAX_DEVICES', 100000))
+    
+    # Shed low-priority reads above the budget, all dashboard reads above twice it
+    LOAD_SHED_LATENCY_BUDGET_SECONDS = float(os.getenv('LOAD_SHED_LATENCY_BUDGET_SECONDS', 0.5))
+    
+    # Socket / MQTT ingest gateway (ingest_gateway.py)
+    INGEST_GATEWAY_HOST = os.getenv('INGEST_GATEWAY_HOST', '0.0.0.0')
+    INGEST_GATEWAY_TCP_PORT = int(os.getenv('INGEST_GATEWAY_TCP_PORT', 5010))
+    INGEST_GATEWAY_UDP_PORT = int(os.getenv('INGEST_GATEWAY_UDP_PORT', 5011))
+    INGEST_GATEWAY_BATCH_SIZE = int(os.getenv('INGEST_GATEWAY_BATCH_SIZE', 200))
+    INGEST_GATEWAY_FLUSH_SECONDS = float(os.getenv('INGEST_GATEWAY_FLUSH_SECONDS', 0.5))
+    INGEST_GATEWAY_MAX_MESSAGE_BYTES = int(os.getenv('INGEST_GATEWAY_MAX_MESSAGE_BYTES', 65536))
+    MQTT_BROKER_URL = os.getenv('MQTT_BROKER_URL', '')
+    MQTT_TOPIC = os.getenv('MQTT_TOPIC', 'sensors/+/data')
+    
+    # Clock-skew bounds for device-supplied measured_at
+    MEASURED_AT_MAX_FUTURE_SECONDS = int(os.getenv('MEASURED_AT_MAX_FUTURE_SECONDS', 300))
+    MEASURED_AT_MAX_AGE_SECONDS = int(os.getenv('MEASURED_AT_MAX_AGE_SECONDS', 30 * 86400))
+    
+    # Hard physical limits; payloads outside these are rejected outright
+    PAYLOAD_LIMITS = {
+        'temperature': (-10.0, 100.0),
+        'ph': (0.0, 14.0),
+        'tds': (0.0, 100000.0),
+        'turbidity': (0.0, 4000.0),
+    }
+    
+    # ============ RETENTION ============
+    # Raw readings older than this are folded into hourly rollups and deleted
+    RETENTION_RAW_DAYS = int(os.getenv('RETENTION_RAW_DAYS', 30))
+    RETENTION_HOURLY_DAYS = int(os.getenv('RETENTION_HOURLY_DAYS', 730))
+    COMPACTION_BATCH_SIZE = int(os.getenv('COMPACTION_BATCH_SIZE', 1000))
+    # Incremental rollups skip rows younger than this (ids commit out of order)
+    ROLLUP_SETTLE_SECONDS = int(os.getenv('ROLLUP_SETTLE_SECONDS', 120))
+    
+    # ============ BACKGROUND JOBS ============
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    # Lock and result files shared by the workers on one host
+    SCHEDULER_STATE_DIR = os.getenv('SCHEDULER_STATE_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'water_quality_jobs'))
+    SCHEDULER_TICK_SECONDS = float(os.getenv('SCHEDULER_TICK_SECONDS', 1.0))
+    # Statistics, latest readings, heatmap and alerts; 0 disables a job
+    PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv('PRECOMPUTE_INTERVAL_SECONDS', 30))
+    ROLLUP_INTERVAL_SECONDS = float(os.getenv('ROLLUP_INTERVAL_SECONDS', 300))
+    COMPACTION_INTERVAL_SECONDS = float(os.getenv('COMPACTION_INTERVAL_SECONDS', 0))
+    CALIBRATION_INTERVAL_SECONDS = float(os.getenv('CALIBRATION_INTERVAL_SECONDS', 21600))
+    
+    # ============ CALIBRATION DRIFT ============
+    CALIBRATION_WINDOW_DAYS = int(os.getenv('CALIBRATION_WINDOW_DAYS', 90))
+    CALIBRATION_MIN_DAYS = int(os.getenv('CALIBRATION_MIN_DAYS', 14))
+    CALIBRATION_RECENT_DAYS = int(os.getenv('CALIBRATION_RECENT_DAYS', 7))
+    CALIBRATION_STEP_WINDOW_DAYS = int(os.getenv('CALIBRATION_STEP_WINDOW_DAYS', 3))
+    # Recent within-day variance below this fraction of the device's own history
+    CALIBRATION_COLLAPSE_RATIO = float(os.getenv('CALIBRATION_COLLAPSE_RATIO', 0.1))
+    # Devices in the same grid cell are each other's neighbours
+    CALIBRATION_NEIGHBOUR_CELL_DEG = float(os.getenv('CALIBRATION_NEIGHBOUR_CELL_DEG', 0.1))
+    CALIBRATION_MIN_NEIGHBOURS = int(os.getenv('CALIBRATION_MIN_NEIGHBOURS', 3))
+    # Drift or step size (sensor units) that warrants recalibration
+    CALIBRATION_TOLERANCE = {
+        'ph': 0.3,
+        'tds': 50.0,
+    }
     
     # ============ SENSOR THRESHOLDS ============
     SENSOR_THRESHOLDS = {
@@ -47,6 +200,15 @@ class Config:
         'SUSPECT': 'IMPUTE_AND_LOG',
         'FAIL': 'REQUEST_CALIBRATION'
     }
+    
+    # IMPUTE_AND_LOG: online replacement of suspect values (services/imputation.py)
+    IMPUTATION_ENABLED = os.getenv('IMPUTATION_ENABLED', 'true').lower() == 'true'
+    IMPUTATION_METHOD = os.getenv('IMPUTATION_METHOD', 'ewma')  # ewma or last_good
+    IMPUTATION_ALPHA = float(os.getenv('IMPUTATION_ALPHA', 0.1))
+    IMPUTATION_Z_THRESHOLD = float(os.getenv('IMPUTATION_Z_THRESHOLD', 4.0))
+    IMPUTATION_WARMUP = int(os.getenv('IMPUTATION_WARMUP', 10))
+    IMPUTATION_MAX_CONSECUTIVE = int(os.getenv('IMPUTATION_MAX_CONSECUTIVE', 5))
+    IMPUTATION_MAX_DEVICES = int(os.getenv('IMPUTATION_MAX_DEVICES', 100000))
 
 
 class DevelopmentConfig(Config):
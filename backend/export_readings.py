@@ -0,0 +1,69 @@
+"""
+Export Readings - Standalone Script
+
+Streams the readings table to a file (or stdout) without loading it into
+memory. Usage:
+
+    python export_readings.py --format parquet --output readings.parquet
+    python export_readings.py --device-id sensor-01 --start 2024-01-01 > sensor-01.ndjson
+    python export_readings.py --format csv --cursor 125000 --output rest.csv
+"""
+
+import argparse
+import contextlib
+import logging
+import sys
+
+from services.export_service import export_readings, export_formats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export water quality readings")
+    parser.add_argument('--format', default='ndjson', choices=['ndjson', 'csv', 'parquet'])
+    parser.add_argument('--device-id', help="Only export this device")
+    parser.add_argument('--start', help="ISO timestamp, inclusive lower bound on measured_at")
+    parser.add_argument('--end', help="ISO timestamp, exclusive upper bound on measured_at")
+    parser.add_argument('--cursor', type=int, help="Resume after this reading id")
+    parser.add_argument('--output', help="Output file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.format not in export_formats():
+        logger.error(f"❌ Format '{args.format}' is not available (install pyarrow for Parquet)")
+        return 1
+
+    # The service prints connection status; keep stdout clean for the export
+    with contextlib.redirect_stdout(sys.stderr):
+        from services.supabase_service import supabase_service
+
+    stream = export_readings(
+        supabase_service,
+        args.format,
+        device_id=args.device_id,
+        start=args.start,
+        end=args.end,
+        cursor=args.cursor
+    )
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in stream:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+    logger.info(f"✅ Exported {written} bytes as {args.format}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+Ingest Gateway - Standalone Script
+
+Lightweight ingest path for high-frequency devices that skips HTTP. Runs
+as its own process next to the Flask API and feeds the same validation and
+persistence pipeline (validate_reading → ingest_service). It keeps no
+in-memory views of its own: stored readings reach the API workers through
+the database, and each flush touches the scheduler's ingest signal so
+their ingest-triggered precomputes run early.
+
+Transports:
+
+- TCP (INGEST_GATEWAY_TCP_PORT). A connection is newline-delimited JSON
+  (one payload or a list per line) unless its first byte is 0x00, in which
+  case every message is a 4-byte big-endian length followed by a JSON
+  document or a binary frame (services/binary_protocol.py). Readings are
+  batched per connection and every flush is acknowledged in the same
+  framing with {"stored", "duplicates"}; rejected messages get an
+  immediate {"error", "details"} reply.
+- UDP (INGEST_GATEWAY_UDP_PORT). One JSON document or binary frame per
+  datagram, no replies.
+- MQTT (optional, needs paho-mqtt). Subscribes to MQTT_TOPIC on
+  MQTT_BROKER_URL; each message is a JSON document or binary frame.
+
+Usage:
+
+    python ingest_gateway.py
+    python ingest_gateway.py --tcp-port 5010 --udp-port 0 --metrics-port 9102
+    python ingest_gateway.py --mqtt mqtt://localhost:1883 --topic 'sensors/+/data'
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socketserver
+import struct
+import sys
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from config.settings import Config
+from services.binary_protocol import MAGIC, decode_frame
+from services.ingest_service import ingest_service
+from services.log_pipeline import setup_logging
+from services.rate_limit import ingest_limiter
+from services.metrics import registry, CONTENT_TYPE
+from services.validation import validate_reading, loads as json_loads, dumps as json_dumps
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+logger = logging.getLogger('ingest_gateway')
+
+LENGTH = struct.Struct('>I')
+
+GATEWAY_MESSAGES = registry.counter(
+    'ingest_gateway_messages_total',
+    'Messages received by the ingest gateway',
+    ('transport', 'outcome')
+)
+GATEWAY_FLUSHES = registry.histogram(
+    'ingest_gateway_flush_size',
+    'Readings per gateway flush',
+    ('transport',),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+
+def decode_message(data: bytes):
+    """JSON document or binary frame → list of raw payload dicts"""
+    if data[:2] == MAGIC:
+        return decode_frame(data)
+    document = json_loads(data)
+    if isinstance(document, dict) and 'readings' in document:
+        document = document['readings']
+    if isinstance(document, list):
+        return document
+    return [document]
+
+
+class Batcher:
+    """Validated readings waiting to be stored with one ingest call"""
+
+    def __init__(self, transport: str, max_batch: int, flush_seconds: float, on_flush=None):
+        self.transport = transport
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        self._readings = []
+        self._bytes = 0
+        self._started = None
+
+    def add(self, data: bytes):
+        """Decode, validate and queue one message; returns the rejects"""
+        try:
+            payloads = decode_message(data)
+        except ValueError as e:
+            GATEWAY_MESSAGES.labels(self.transport, 'malformed').inc()
+            return [{'index': None, 'errors': [{'field': '', 'error': 'decode', 'message': str(e)}]}]
+
+        rejected = []
+        valid = []
+        for index, payload in enumerate(payloads):
+            reading, errors = validate_reading(payload)
+            if errors:
+                rejected.append({'index': index, 'errors': errors})
+            else:
+                valid.append((index, reading))
+
+        admitted, throttled, retry_after = ingest_limiter.admit([reading for _, reading in valid])
+        for position in throttled:
+            rejected.append({'index': valid[position][0], 'errors': [{
+                'field': 'device_id',
+                'error': 'rate_limited',
+                'message': f'rate limit exceeded, retry after {retry_after:.1f}s'
+            }]})
+        valid = [valid[position][1] for position in admitted]
+        rejected.sort(key=lambda entry: entry['index'])
+        GATEWAY_MESSAGES.labels(self.transport, 'rejected' if rejected else 'accepted').inc()
+
+        if valid:
+            with self._lock:
+                if not self._readings:
+                    self._started = time.monotonic()
+                self._readings.extend(valid)
+                self._bytes += len(data)
+                full = len(self._readings) >= self.max_batch
+            if full:
+                self.flush()
+        return rejected
+
+    def due(self) -> bool:
+        started = self._started
+        return started is not None and time.monotonic() - started >= self.flush_seconds
+
+    def flush(self):
+        with self._lock:
+            readings, payload_bytes = self._readings, self._bytes
+            self._readings, self._bytes, self._started = [], 0, None
+        if not readings:
+            return
+
+        GATEWAY_FLUSHES.labels(self.transport).observe(len(readings))
+        for start in range(0, len(readings), Config.INGEST_MAX_BATCH):
+            chunk = readings[start:start + Config.INGEST_MAX_BATCH]
+            try:
+                stored = ingest_service.ingest(chunk, payload_bytes * len(chunk) // len(readings))
+                summary = {
+                    'stored': len(stored),
+                    'duplicates': sum(1 for reading in stored if reading.get('duplicate')),
+                }
+            except Exception as e:
+                # Readings are dropped; devices retry and idempotency keys make that safe
+                logger.error(f"❌ Gateway flush failed ({self.transport}): {str(e)}")
+                GATEWAY_MESSAGES.labels(self.transport, 'store_failed').inc()
+                summary = {'error': str(e), 'dropped': len(chunk)}
+            if self.on_flush:
+                self.on_flush(summary)
+
+
+class Flusher(threading.Thread):
+    """Flushes batchers whose oldest reading has waited flush_seconds"""
+
+    def __init__(self, interval: float):
+        super().__init__(name='gateway-flusher', daemon=True)
+        self.interval = interval
+        self.batchers = weakref.WeakSet()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for batcher in list(self.batchers):
+                if batcher.due():
+                    batcher.flush()
+
+    def stop(self):
+        self.stopped.set()
+        for batcher in list(self.batchers):
+            batcher.flush()
+
+
+class TCPHandler(socketserver.StreamRequestHandler):
+    """One device connection: newline-delimited or length-prefixed messages"""
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.length_prefixed = False
+        self.batcher = Batcher('tcp', self.server.batch_size, self.server.flush_seconds, on_flush=self.reply)
+        self.server.flusher.batchers.add(self.batcher)
+
+    def reply(self, document):
+        body = json_dumps(document)
+        frame = LENGTH.pack(len(body)) + body if self.length_prefixed else body + b'\n'
+        try:
+            with self.write_lock:
+                self.wfile.write(frame)
+        except OSError:
+            pass  # Client went away; nothing to acknowledge to
+
+    def read_message(self):
+        limit = self.server.max_message_bytes
+        if self.length_prefixed:
+            header = self.rfile.read(LENGTH.size)
+            if len(header) < LENGTH.size:
+                return None
+            (length,) = LENGTH.unpack(header)
+            if length > limit:
+                raise ValueError(f"message of {length} bytes exceeds {limit}")
+            data = self.rfile.read(length)
+            return data if len(data) == length else None
+
+        line = self.rfile.readline(limit + 1)
+        if not line:
+            return None
+        if len(line) > limit and not line.endswith(b'\n'):
+            raise ValueError(f"line exceeds {limit} bytes")
+        return line
+
+    def handle(self):
+        self.length_prefixed = self.rfile.peek(1)[:1] == b'\x00'
+        try:
+            while True:
+                message = self.read_message()
+                if message is None:
+                    break
+                if not message.strip():
+                    continue
+                rejected = self.batcher.add(message)
+                if rejected:
+                    self.reply({'error': 'Invalid sensor payload', 'details': rejected})
+        except ValueError as e:
+            GATEWAY_MESSAGES.labels('tcp', 'oversized').inc()
+            self.reply({'error': str(e)})
+        except OSError as e:
+            logger.debug(f"TCP connection from {self.client_address[0]} closed: {e}")
+        finally:
+            self.batcher.flush()
+
+
+class UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data = self.request[0]
+        if len(data) > self.server.max_message_bytes:
+            GATEWAY_MESSAGES.labels('udp', 'oversized').inc()
+            return
+        self.server.batcher.add(data)
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class UDPServer(socketserver.UDPServer):
+    allow_reuse_address = True
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_mqtt(url: str, topic: str, batcher: Batcher):
+    parsed = urlparse(url)
+    client = mqtt.Client(client_id=f"ingest-gateway-{os.getpid()}")
+    if parsed.username:
+        client.username_pw_set(parsed.username, parsed.password)
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe(topic, qos=1)
+        logger.info(f"📡 MQTT subscribed to {topic} on {parsed.hostname}")
+
+    def on_message(client, userdata, message):
+        batcher.add(message.payload)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(parsed.hostname or 'localhost', parsed.port or 1883)
+    client.loop_start()
+    return client
+
+
+def serve(server, name):
+    thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Socket / MQTT ingest gateway")
+    parser.add_argument('--host', default=Config.INGEST_GATEWAY_HOST)
+    parser.add_argument('--tcp-port', type=int, default=Config.INGEST_GATEWAY_TCP_PORT, help="0 disables TCP")
+    parser.add_argument('--udp-port', type=int, default=Config.INGEST_GATEWAY_UDP_PORT, help="0 disables UDP")
+    parser.add_argument('--mqtt', default=Config.MQTT_BROKER_URL, help="Broker URL, e.g. mqtt://localhost:1883")
+    parser.add_argument('--topic', default=Config.MQTT_TOPIC)
+    parser.add_argument('--batch-size', type=int, default=Config.INGEST_GATEWAY_BATCH_SIZE)
+    parser.add_argument('--flush-seconds', type=float, default=Config.INGEST_GATEWAY_FLUSH_SECONDS)
+    parser.add_argument('--metrics-port', type=int, default=0, help="Serve /metrics on this port")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    os.makedirs(logs_dir, exist_ok=True)
+    setup_logging(logs_dir, level=logging.INFO, filename='ingest_gateway.log')
+
+    if args.mqtt and mqtt is None:
+        logger.error("❌ --mqtt needs paho-mqtt (pip install paho-mqtt)")
+        return 1
+
+    # Nothing reads from this process; the API workers refresh from the database
+    # and their schedulers pick up ingest.signal
+    ingest_service.local_views = False
+
+    flusher = Flusher(interval=max(0.01, args.flush_seconds / 4))
+    flusher.start()
+    servers = []
+
+    if args.tcp_port:
+        tcp = TCPServer((args.host, args.tcp_port), TCPHandler)
+        tcp.batch_size = args.batch_size
+        tcp.flush_seconds = args.flush_seconds
+        tcp.max_message_bytes = Config.INGEST_GATEWAY_MAX_MESSAGE_BYTES
+        tcp.flusher = flusher
+        servers.append(tcp)
+        serve(tcp, 'gateway-tcp')
+        logger.info(f"🚀 TCP ingest on {args.host}:{tcp.server_address[1]}")
+
+    if args.udp_port:
+        udp = UDPServer((args.host, args.udp_port), UDPHandler)
+        udp.batcher = Batcher('udp', args.batch_size, args.flush_seconds)
+        udp.max_message_bytes = Config.INGEST_GATEWAY_MAX_MESSAGE_BYTES
+        flusher.batchers.add(udp.batcher)
+        servers.append(udp)
+        serve(udp, 'gateway-udp')
+        logger.info(f"🚀 UDP ingest on {args.host}:{udp.server_address[1]}")
+
+    mqtt_client = None
+    mqtt_batcher = None
+    if args.mqtt:
+        mqtt_batcher = Batcher('mqtt', args.batch_size, args.flush_seconds)
+        flusher.batchers.add(mqtt_batcher)
+        mqtt_client = start_mqtt(args.mqtt, args.topic, mqtt_batcher)
+
+    if args.metrics_port:
+        metrics_server = ThreadingHTTPServer((args.host, args.metrics_port), MetricsHandler)
+        servers.append(metrics_server)
+        serve(metrics_server, 'gateway-metrics')
+        logger.info(f"📊 Metrics on http://{args.host}:{args.metrics_port}/metrics")
+
+    if not servers and mqtt_client is None:
+        logger.error("❌ Nothing to listen on; enable TCP, UDP or MQTT")
+        return 1
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+
+    logger.info("🛑 Shutting down ingest gateway")
+    if mqtt_client is not None:
+        mqtt_client.loop_stop()
+        mqtt_client.disconnect()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    flusher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
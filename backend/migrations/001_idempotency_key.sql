@@ -0,0 +1,8 @@
+-- Idempotent ingest: retried uploads carry the same key and are rejected
+-- by the unique index instead of becoming extra rows.
+ALTER TABLE water_quality_readings
+    ADD COLUMN IF NOT EXISTS idempotency_key text;
+
+-- NULL keys (readings without seq / measured_at / explicit key) never conflict
+CREATE UNIQUE INDEX IF NOT EXISTS water_quality_readings_idempotency_key_idx
+    ON water_quality_readings (idempotency_key);
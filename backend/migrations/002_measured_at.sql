@@ -0,0 +1,20 @@
+-- Device measurement time, separate from the server receive time
+-- (created_at). Store-and-forward devices upload late and out of order,
+-- so time-based reads order and filter on measured_at.
+ALTER TABLE water_quality_readings
+    ADD COLUMN IF NOT EXISTS measured_at timestamptz;
+
+-- Existing rows were never sent a device time; fall back to receive time
+UPDATE water_quality_readings
+    SET measured_at = created_at
+    WHERE measured_at IS NULL;
+
+ALTER TABLE water_quality_readings
+    ALTER COLUMN measured_at SET DEFAULT now(),
+    ALTER COLUMN measured_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS water_quality_readings_measured_at_idx
+    ON water_quality_readings (measured_at DESC);
+
+CREATE INDEX IF NOT EXISTS water_quality_readings_device_measured_at_idx
+    ON water_quality_readings (device_id, measured_at DESC);
@@ -0,0 +1,32 @@
+-- Hourly aggregates kept after raw readings age out (see services/retention.py).
+-- The compaction job upserts one row per (device_id, bucket) and then
+-- deletes the raw rows it folded in.
+CREATE TABLE IF NOT EXISTS water_quality_hourly (
+    id bigserial PRIMARY KEY,
+    device_id text NOT NULL,
+    bucket timestamptz NOT NULL,
+    reading_count integer NOT NULL,
+    temperature_avg double precision,
+    temperature_min double precision,
+    temperature_max double precision,
+    ph_avg double precision,
+    ph_min double precision,
+    ph_max double precision,
+    tds_avg double precision,
+    tds_min double precision,
+    tds_max double precision,
+    turbidity_avg double precision,
+    turbidity_min double precision,
+    turbidity_max double precision,
+    latitude double precision,
+    longitude double precision,
+    -- Highest raw id folded in; reruns after a crash skip rows at or below it
+    max_reading_id bigint NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS water_quality_hourly_device_bucket_idx
+    ON water_quality_hourly (device_id, bucket);
+
+CREATE INDEX IF NOT EXISTS water_quality_hourly_bucket_idx
+    ON water_quality_hourly (bucket);
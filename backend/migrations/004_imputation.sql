@@ -0,0 +1,5 @@
+-- IMPUTE_AND_LOG: suspect sensor values are replaced at ingest. The stored
+-- sensor columns hold the imputed values; these keep what was measured.
+ALTER TABLE water_quality_readings
+    ADD COLUMN IF NOT EXISTS imputed text[],      -- names of replaced fields
+    ADD COLUMN IF NOT EXISTS raw_values jsonb;    -- {field: measured value}
@@ -0,0 +1,7 @@
+-- Watermark for the incremental hourly rollup (CompactionJob.rollup_new):
+-- raw readings with id <= last_reading_id are already folded into
+-- water_quality_hourly.
+CREATE TABLE IF NOT EXISTS water_quality_rollup_state (
+    name text PRIMARY KEY,
+    last_reading_id bigint NOT NULL
+);
@@ -0,0 +1,59 @@
+-- Monthly reading partitions for READINGS_PARTITIONING=monthly (see
+-- services/partitioning.py). Each month gets its own table,
+-- water_quality_readings_YYYY_MM, with the columns, indexes and id
+-- sequence of water_quality_readings, so ids stay globally unique and
+-- increasing. The service routes writes by measured_at and only queries
+-- the months a read overlaps. partition_readings.py moves existing rows.
+--
+-- Idempotency: LIKE ... INCLUDING INDEXES gives each partition its own
+-- unique index on idempotency_key, so the database only rejects a
+-- repeated key within one table. A reading sent without measured_at is
+-- routed by receive time, and its retry can land in the next month; any
+-- retry can match a row still in the legacy table. The service looks
+-- those keys up before inserting (SupabaseService._stored_keys):
+-- readings without measured_at in every table that can hold readings
+-- received within IDEMPOTENCY_TTL_SECONDS, the others in the legacy
+-- table. Retries of time-less readings later than that are stored again.
+
+-- Registry of existing partitions; the service reads it to route queries
+CREATE TABLE IF NOT EXISTS water_quality_partitions (
+    month_start date PRIMARY KEY,
+    name text NOT NULL UNIQUE,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Create (if needed) and register the partition for the month containing
+-- month_start. Called over PostgREST as rpc('ensure_readings_partition').
+CREATE OR REPLACE FUNCTION ensure_readings_partition(month_start date)
+RETURNS text
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    first_day date := date_trunc('month', month_start)::date;
+    partition_name text := format('water_quality_readings_%s', to_char(first_day, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE water_quality_readings INCLUDING DEFAULTS INCLUDING INDEXES INCLUDING CONSTRAINTS)',
+            partition_name
+        );
+        -- Lets the planner skip a partition outright when a filter excludes its month
+        EXECUTE format(
+            'ALTER TABLE %I ADD CONSTRAINT %I CHECK (measured_at >= %L AND measured_at < %L)',
+            partition_name, partition_name || '_month_check',
+            first_day, (first_day + interval '1 month')::date
+        );
+        EXECUTE format('GRANT SELECT, INSERT, UPDATE, DELETE ON %I TO anon, authenticated, service_role',
+                       partition_name);
+        -- Make the new table visible to PostgREST
+        NOTIFY pgrst, 'reload schema';
+    END IF;
+
+    INSERT INTO water_quality_partitions (month_start, name)
+    VALUES (first_day, partition_name)
+    ON CONFLICT (month_start) DO NOTHING;
+
+    RETURN partition_name;
+END;
+$$;
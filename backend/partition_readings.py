@@ -0,0 +1,53 @@
+"""
+Partition Readings - Standalone Script
+
+Moves rows from the single ``water_quality_readings`` table into the
+monthly partitions (migrations/006_monthly_partitions.sql), in bounded
+batches that can be interrupted and rerun (see services/partitioning.py).
+Once it reports ``complete``, set ``PARTITION_INCLUDE_LEGACY=false``.
+Usage:
+
+    python partition_readings.py --dry-run
+    python partition_readings.py --batch-size 500 --max-batches 100 --pause 0.2
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from config.settings import Config
+from services.partitioning import PartitionMigration
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Move water quality readings into monthly partitions")
+    parser.add_argument('--batch-size', type=int, default=Config.COMPACTION_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, help="Stop after this many batches")
+    parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument('--dry-run', action='store_true', help="Report where rows would go without moving them")
+    return parser.parse_args(argv)
+
+
+def log_progress(report):
+    logger.info(f"⏳ Batch {report['batches']}: {report['moved']} readings, "
+                f"{len(report['by_partition'])} partitions, {report['elapsed_seconds']}s")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from services.supabase_service import supabase_service
+
+    migration = PartitionMigration(supabase_service, batch_size=args.batch_size)
+    report = migration.run(dry_run=args.dry_run, max_batches=args.max_batches,
+                           progress=log_progress, pause_seconds=args.pause)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Binary Protocol - compact fixed-layout frames for constrained devices
+
+A frame carries one device's readings (one or many) and is sent to
+``/api/sensor/data`` with ``Content-Type: application/x-wq-frame``.
+All integers are little-endian.
+
+Header (15 bytes + device id)::
+
+    magic        2s   b'WQ'
+    version      u8   1
+    flags        u8   bit 0: records carry a sequence number
+    id_length    u8   length of the UTF-8 device id that follows
+    device_id    ...  id_length bytes
+    latitude     i32  microdegrees
+    longitude    i32  microdegrees
+    count        u16  number of records
+
+Record (20 bytes)::
+
+    measured_at  u32  epoch seconds (0 = use receive time)
+    seq          u32  per-device sequence number (ignored unless flag 0)
+    temperature  i16  centi-degrees C
+    ph           u16  milli-pH
+    tds          u32  ppm
+    turbidity    u32  centi-NTU
+
+A single reading is 44 bytes for a 9-character device id, against ~185
+bytes of JSON. Decoded frames are plain payload dicts and go through the
+same ``validate_reading`` checks as JSON.
+"""
+
+import struct
+from typing import Any, Dict, List, Optional
+
+MIMETYPE = 'application/x-wq-frame'
+
+MAGIC = b'WQ'
+VERSION = 1
+FLAG_SEQ = 0x01
+
+_PREFIX = struct.Struct('<2sBBB')
+_POSITION = struct.Struct('<iiH')
+RECORD = struct.Struct('<IIhHII')
+
+MAX_RECORDS = 0xFFFF
+
+
+class FrameError(ValueError):
+    """Raised when a frame is truncated or malformed"""
+
+
+def encode_frame(device_id: str, latitude: float, longitude: float,
+                 readings: List[Dict[str, Any]]) -> bytes:
+    """
+    Reference encoder (what device firmware should produce)
+
+    Each reading needs temperature, ph, tds and turbidity; ``measured_at``
+    (epoch seconds) and ``seq`` are optional. Raises ``struct.error`` if a
+    value does not fit its field.
+    """
+    encoded_id = device_id.encode('utf-8')
+    if not 0 < len(encoded_id) <= 0xFF:
+        raise FrameError("device_id must be 1-255 bytes")
+    if len(readings) > MAX_RECORDS:
+        raise FrameError(f"at most {MAX_RECORDS} readings per frame")
+
+    flags = FLAG_SEQ if any(r.get('seq') is not None for r in readings) else 0
+    parts = [
+        _PREFIX.pack(MAGIC, VERSION, flags, len(encoded_id)),
+        encoded_id,
+        _POSITION.pack(round(latitude * 1e6), round(longitude * 1e6), len(readings)),
+    ]
+    for reading in readings:
+        parts.append(RECORD.pack(
+            int(reading.get('measured_at') or 0),
+            int(reading.get('seq') or 0),
+            round(reading['temperature'] * 100),
+            round(reading['ph'] * 1000),
+            int(reading['tds']),
+            round(reading['turbidity'] * 100),
+        ))
+    return b''.join(parts)
+
+
+def decode_frame(data: bytes) -> List[Dict[str, Any]]:
+    """Decode a frame into payload dicts ready for ``validate_reading``"""
+    view = memoryview(data)
+    if len(view) < _PREFIX.size:
+        raise FrameError("frame is shorter than its header")
+
+    magic, version, flags, id_length = _PREFIX.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise FrameError("bad magic bytes")
+    if version != VERSION:
+        raise FrameError(f"unsupported frame version {version}")
+
+    offset = _PREFIX.size
+    body_start = offset + id_length + _POSITION.size
+    if len(view) < body_start:
+        raise FrameError("frame is shorter than its header")
+    try:
+        device_id = bytes(view[offset:offset + id_length]).decode('utf-8')
+    except UnicodeDecodeError:
+        raise FrameError("device_id is not valid UTF-8")
+    lat_micro, lng_micro, count = _POSITION.unpack_from(view, offset + id_length)
+
+    if len(view) != body_start + count * RECORD.size:
+        raise FrameError(f"expected {count} records of {RECORD.size} bytes")
+
+    latitude = lat_micro / 1e6
+    longitude = lng_micro / 1e6
+    has_seq = bool(flags & FLAG_SEQ)
+
+    payloads = []
+    for measured_at, seq, temperature, ph, tds, turbidity in RECORD.iter_unpack(view[body_start:]):
+        payload = {
+            'device_id': device_id,
+            'temperature': temperature / 100,
+            'ph': ph / 1000,
+            'tds': tds,
+            'turbidity': turbidity / 100,
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+        if measured_at:
+            payload['measured_at'] = measured_at
+        if has_seq:
+            payload['seq'] = seq
+        payloads.append(payload)
+    return payloads
+
+
+def is_frame(mimetype: Optional[str]) -> bool:
+    return mimetype == MIMETYPE
@@ -0,0 +1,290 @@
+"""
+Calibration Drift - fleet-wide analytics behind REQUEST_CALIBRATION
+
+``Config.QUALITY_ACTIONS`` maps FAIL to ``REQUEST_CALIBRATION``, but a
+probe that drifts slowly never fails a single-reading check. This job
+looks at every device's pH and TDS over the last
+``CALIBRATION_WINDOW_DAYS`` of hourly rollups (``water_quality_hourly``)
+in one vectorized pass, with no per-device queries:
+
+- drift: least-squares slope of the device's daily mean (relative to its
+  own median level) minus the median of its neighbours (devices in the same ``CALIBRATION_NEIGHBOUR_CELL_DEG``
+  grid cell, or the whole fleet when the cell has too few), so weather and
+  seasonal changes shared by neighbours cancel out
+- step: the largest jump between the mean residual of the
+  ``CALIBRATION_STEP_WINDOW_DAYS`` before and after any day
+- variance collapse: recent within-day variance compared with the device's
+  own history (a stuck or fouled probe goes flat)
+
+Each metric is scaled so that 1.0 is the threshold (``CALIBRATION_TOLERANCE``
+for drift and step, ``CALIBRATION_COLLAPSE_RATIO`` for variance). A device's
+score is its worst metric and the calibration queue lists devices scoring
+>= 1, worst first.
+
+Everything is ``np.bincount`` over a flat (device, day) index plus
+row-wise matrix operations. ``analyze`` takes a few seconds for 10k
+devices × 90 days (21.6M hourly rows); see benchmarks/bench_drift.py.
+That figure excludes ``load``, which pages the same rows out of
+PostgREST (about 21,600 requests of 1000 rows) and dominates a full run,
+so the job only runs on the scheduler, never inside a request.
+"""
+
+import logging
+import threading
+import time
+import warnings
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config.settings import Config
+from services.supabase_service import supabase_service
+from services.timestamps import to_iso, utc_now
+
+logger = logging.getLogger(__name__)
+
+SENSORS = ('ph', 'tds')
+METRICS = ('drift', 'step', 'variance_collapse')
+ROLLUP_COLUMNS = 'device_id,bucket,reading_count,ph_avg,tds_avg,latitude,longitude'
+
+# Hourly values needed in a day before its within-day variance counts
+MIN_HOURS_FOR_VARIANCE = 4
+
+
+def frame_from_pages(pages: Iterable[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Column arrays from pages of hourly rollups; device ids become int codes"""
+    codes: Dict[str, int] = {}
+    parts = {name: [] for name in ('device', 'hour', 'reading_count', 'ph', 'tds', 'latitude', 'longitude')}
+    for page in pages:
+        parts['device'].append(np.fromiter(
+            (codes.setdefault(row['device_id'], len(codes)) for row in page), dtype=np.int64, count=len(page)))
+        # Buckets are UTC ISO strings; the first 13 characters are YYYY-MM-DDTHH
+        parts['hour'].append(np.array([row['bucket'] for row in page]).astype('U13').astype('datetime64[h]'))
+        parts['reading_count'].append(np.array([row.get('reading_count') for row in page], dtype=float))
+        parts['ph'].append(np.array([row.get('ph_avg') for row in page], dtype=float))
+        parts['tds'].append(np.array([row.get('tds_avg') for row in page], dtype=float))
+        parts['latitude'].append(np.array([row.get('latitude') for row in page], dtype=float))
+        parts['longitude'].append(np.array([row.get('longitude') for row in page], dtype=float))
+
+    frame = {
+        name: np.concatenate(arrays) if arrays else np.array([], dtype='datetime64[h]' if name == 'hour' else float)
+        for name, arrays in parts.items()
+    }
+    frame['device'] = frame['device'].astype(np.int64)
+    frame['device_ids'] = np.array(list(codes), dtype=object)
+    return frame
+
+
+def _nanmedian(values: np.ndarray, axis: int) -> np.ndarray:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(values, axis=axis)
+
+
+def _nanmax(values: np.ndarray, axis: int) -> np.ndarray:
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmax(values, axis=axis)
+
+
+def _neighbour_baseline(daily: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """Per-device baseline: median of the device's cell, else of the fleet"""
+    fleet = _nanmedian(daily, axis=0)
+    baseline = np.broadcast_to(fleet, daily.shape).copy()
+
+    counts = np.bincount(cells)
+    order = np.argsort(cells, kind='stable')
+    for members in np.split(order, np.cumsum(counts)[:-1]):
+        if len(members) >= Config.CALIBRATION_MIN_NEIGHBOURS:
+            local = _nanmedian(daily[members], axis=0)
+            baseline[members] = np.where(np.isnan(local), fleet, local)
+    return baseline
+
+
+def _drift(residual: np.ndarray, valid: np.ndarray) -> Dict[str, np.ndarray]:
+    """Least-squares slope per row (per day) and the change it implies"""
+    days = residual.shape[1]
+    t = np.arange(days, dtype=float)
+    r = np.where(valid, residual, 0.0)
+    n = valid.sum(axis=1).astype(float)
+    st = valid @ t
+    stt = valid @ (t * t)
+    sr = r.sum(axis=1)
+    srt = r @ t
+    denom = n * stt - st * st
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where((n >= Config.CALIBRATION_MIN_DAYS) & (denom > 0), (n * srt - st * sr) / denom, np.nan)
+
+    first = np.argmax(valid, axis=1)
+    last = days - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return {'per_day': slope, 'total': np.abs(slope) * (last - first + 1)}
+
+
+def _step(residual: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Largest change in mean residual between adjacent windows"""
+    w = Config.CALIBRATION_STEP_WINDOW_DAYS
+    days = residual.shape[1]
+    if days < 2 * w:
+        return np.full(residual.shape[0], np.nan)
+
+    zeros = np.zeros((residual.shape[0], 1))
+    sums = np.hstack([zeros, np.cumsum(np.where(valid, residual, 0.0), axis=1)])
+    counts = np.hstack([zeros, np.cumsum(valid, axis=1)])
+    t = np.arange(w, days - w + 1)
+    before_n = counts[:, t] - counts[:, t - w]
+    after_n = counts[:, t + w] - counts[:, t]
+    enough = (before_n >= 2) & (after_n >= 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        before = (sums[:, t] - sums[:, t - w]) / before_n
+        after = (sums[:, t + w] - sums[:, t]) / after_n
+        jumps = np.where(enough, np.abs(after - before), np.nan)
+    return _nanmax(jumps, axis=1)
+
+
+def _variance_ratio(variance: np.ndarray, floor: float) -> np.ndarray:
+    """Recent within-day variance / historical within-day variance"""
+    recent_days = Config.CALIBRATION_RECENT_DAYS
+    recent = _nanmedian(variance[:, -recent_days:], axis=1)
+    history = _nanmedian(variance[:, :-recent_days], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(history > floor, recent / history, np.nan)
+
+
+def analyze(frame: Dict[str, Any], now=None, window_days: Optional[int] = None) -> Dict[str, Any]:
+    """Score every device in ``frame`` and build the ranked calibration queue"""
+    started = time.perf_counter()
+    days = window_days or Config.CALIBRATION_WINDOW_DAYS
+    end = np.datetime64(to_iso(now or utc_now())[:13], 'h') + 1
+    start = end - days * 24
+
+    keep = (frame['hour'] >= start) & (frame['hour'] < end)
+    device = frame['device'][keep]
+    device_ids = frame['device_ids']
+    n_devices = len(device_ids)
+    day = (frame['hour'][keep] - start).astype(np.int64) // 24
+    flat = device * days + day
+    size = n_devices * days
+
+    # Mean position per device, for neighbour cells
+    has_position = ~np.isnan(frame['latitude'][keep]) & ~np.isnan(frame['longitude'][keep])
+    position_n = np.bincount(device[has_position], minlength=n_devices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        latitude = np.bincount(device[has_position], weights=frame['latitude'][keep][has_position],
+                               minlength=n_devices) / position_n
+        longitude = np.bincount(device[has_position], weights=frame['longitude'][keep][has_position],
+                                minlength=n_devices) / position_n
+    cell_size = Config.CALIBRATION_NEIGHBOUR_CELL_DEG
+    grid = np.stack([np.floor(np.nan_to_num(latitude, nan=1e6) / cell_size),
+                     np.floor(np.nan_to_num(longitude, nan=1e6) / cell_size)], axis=1)
+    _, cells = np.unique(grid, axis=0, return_inverse=True)
+    cells = cells.reshape(-1)
+
+    weights = np.nan_to_num(frame['reading_count'][keep], nan=1.0)
+    scores = {}
+    metrics = {}
+    days_with_data = np.zeros(n_devices, dtype=np.int64)
+
+    for sensor in SENSORS:
+        tolerance = Config.CALIBRATION_TOLERANCE[sensor]
+        values = frame[sensor][keep]
+        ok = ~np.isnan(values)
+        index, v, w = flat[ok], values[ok], weights[ok]
+
+        # Reading-weighted daily mean, and the spread of hourly means within each day
+        weight_sum = np.bincount(index, weights=w, minlength=size)
+        hours = np.bincount(index, minlength=size)
+        s1 = np.bincount(index, weights=v, minlength=size)
+        s2 = np.bincount(index, weights=v * v, minlength=size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily = (np.bincount(index, weights=v * w, minlength=size) / weight_sum).reshape(n_devices, days)
+            variance = np.where(hours >= MIN_HOURS_FOR_VARIANCE,
+                                np.maximum(s2 / hours - (s1 / hours) ** 2, 0.0), np.nan).reshape(n_devices, days)
+
+        valid = ~np.isnan(daily)
+        days_with_data = np.maximum(days_with_data, valid.sum(axis=1))
+        # Devices sit at different levels; compare changes, not absolute values
+        centred = daily - _nanmedian(daily, axis=1)[:, None]
+        residual = centred - _neighbour_baseline(centred, cells)
+
+        drift = _drift(residual, valid)
+        step = _step(residual, valid)
+        ratio = _variance_ratio(variance, floor=(tolerance * 0.01) ** 2)
+
+        scores[f'{sensor}_drift'] = drift['total'] / tolerance
+        scores[f'{sensor}_step'] = step / tolerance
+        scores[f'{sensor}_variance_collapse'] = np.clip(
+            (1 - ratio) / (1 - Config.CALIBRATION_COLLAPSE_RATIO), 0.0, None)
+        metrics[f'{sensor}_drift_per_day'] = drift['per_day']
+        metrics[f'{sensor}_drift'] = drift['total']
+        metrics[f'{sensor}_step'] = step
+        metrics[f'{sensor}_variance_ratio'] = ratio
+
+    names = list(scores)
+    matrix = np.stack([scores[name] for name in names], axis=1)
+    overall = np.nan_to_num(_nanmax(matrix, axis=1), nan=0.0)
+    flagged = np.flatnonzero(overall >= 1.0)
+    flagged = flagged[np.argsort(-overall[flagged], kind='stable')]
+
+    def _value(array, i):
+        value = array[i]
+        return None if np.isnan(value) else round(float(value), 4)
+
+    queue = []
+    for rank, i in enumerate(flagged, start=1):
+        queue.append({
+            'rank': rank,
+            'device_id': device_ids[i],
+            'score': round(float(overall[i]), 3),
+            'reasons': [name for name, column in zip(names, matrix[i]) if column >= 1.0],
+            'action': Config.QUALITY_ACTIONS['FAIL'],
+            'days_with_data': int(days_with_data[i]),
+            'latitude': _value(latitude, i),
+            'longitude': _value(longitude, i),
+            'metrics': {name: _value(array, i) for name, array in metrics.items()},
+        })
+
+    return {
+        'generated_at': to_iso(utc_now()),
+        'window_start': str(start) + ':00:00+00:00',
+        'window_days': days,
+        'rows_analyzed': int(keep.sum()),
+        'devices_analyzed': n_devices,
+        'compute_seconds': round(time.perf_counter() - started, 3),
+        'count': len(queue),
+        'queue': queue,
+    }
+
+
+class CalibrationDriftJob:
+    """Loads the rollup window, runs ``analyze`` and keeps the last result"""
+
+    def __init__(self, service):
+        self.service = service
+        self._result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def load(self, now=None) -> Dict[str, Any]:
+        start = (now or utc_now()) - timedelta(days=Config.CALIBRATION_WINDOW_DAYS)
+        pages = self.service.iter_hourly_rollups(start=to_iso(start), columns=ROLLUP_COLUMNS)
+        return frame_from_pages(pages)
+
+    def run(self, now=None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        frame = self.load(now)
+        loaded = time.perf_counter()
+        result = analyze(frame, now)
+        result['load_seconds'] = round(loaded - started, 3)
+        with self._lock:
+            self._result = result
+        logger.info(f"✅ Calibration drift: {result['count']} of {result['devices_analyzed']} devices queued "
+                    f"(load {result['load_seconds']}s, compute {result['compute_seconds']}s)")
+        return result
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._result
+
+
+# Singleton instance
+calibration_drift = CalibrationDriftJob(supabase_service)
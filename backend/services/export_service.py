@@ -0,0 +1,161 @@
+"""
+Bulk export - streams the readings table as NDJSON, CSV or Parquet
+"""
+
+import csv
+import io
+import json
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+from config.settings import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+EXPORT_COLUMNS = [
+    'id', 'device_id', 'temperature', 'ph', 'tds', 'turbidity',
+    'latitude', 'longitude', 'measured_at', 'created_at'
+]
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_formats():
+    """Formats that can be produced with the installed libraries"""
+    formats = ['ndjson', 'csv']
+    if pq is not None:
+        formats.append('parquet')
+    return formats
+
+
+def _batched(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """One JSON object per line, flushed a page at a time"""
+    for batch in _batched(rows, Config.EXPORT_PAGE_SIZE):
+        yield ''.join(json.dumps(row, default=str) + '\n' for row in batch).encode('utf-8')
+
+
+def stream_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """CSV with a fixed header, flushed a page at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for batch in _batched(rows, Config.EXPORT_PAGE_SIZE):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes out in chunks
+
+    Parquet footers store absolute offsets, so ``tell`` keeps counting the
+    total written even after buffered chunks have been drained.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('device_id', pa.string()),
+        ('temperature', pa.float64()),
+        ('ph', pa.float64()),
+        ('tds', pa.float64()),
+        ('turbidity', pa.float64()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('measured_at', pa.string()),
+        ('created_at', pa.string()),
+    ])
+
+
+def stream_parquet(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Parquet with one row group per page"""
+    if pq is None:
+        raise RuntimeError("pyarrow is required for Parquet export")
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for batch in _batched(rows, Config.EXPORT_PAGE_SIZE):
+            columns = {name: [row.get(name) for row in batch] for name in schema.names}
+            writer.write_table(pa.table(columns, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    'ndjson': stream_ndjson,
+    'csv': stream_csv,
+    'parquet': stream_parquet,
+}
+
+
+def export_readings(service, fmt: str, device_id: Optional[str] = None,
+                    start: Optional[str] = None, end: Optional[str] = None,
+                    cursor: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Stream the readings table in ``fmt``
+
+    Rows come out in ascending id order; pass the last exported ``id`` as
+    ``cursor`` to resume an interrupted export.
+    """
+    if fmt not in export_formats():
+        raise ValueError(f"Unsupported export format '{fmt}'. Available: {export_formats()}")
+
+    rows = service.iter_readings(
+        device_id=device_id,
+        start=start,
+        end=end,
+        after_id=cursor,
+        page_size=Config.EXPORT_PAGE_SIZE
+    )
+    return STREAMERS[fmt](rows)
@@ -0,0 +1,374 @@
+"""
+Fleet Snapshot - latest reading per device, shared by every worker
+
+One fixed-layout table lives in a memory-mapped file
+(``FLEET_SNAPSHOT_PATH``, in /dev/shm where available). All gunicorn
+workers map the same pages, so they give the same answers and the
+memory is paid once per host, not once per worker.
+
+Layout: a 2 KiB header (sequence number, device count, reading id
+cursor, total readings, devices per quality, last update and recount
+times), then
+``FLEET_SNAPSHOT_MAX_DEVICES`` slots. A slot is a ``recent_readings``
+record plus the device id and the measured values of imputed sensors
+(218 bytes, about 21 MiB for 100k devices).
+Slots are append-only: a device keeps its slot for the life of the file.
+
+There is one writer, ``refresh``, run by the scheduler's
+``fleet_snapshot`` job, which only one worker runs at a time. It folds
+readings stored since its watermark (by ascending id, so each refresh
+reads only new rows) into the slots. Readers take no lock; the writer
+bumps the sequence number to odd before a page of updates and to even
+after, and a reader that sees it change (or odd) retries (a seqlock).
+
+The watermark is an ``IdCursor``: ids that were missing when the writer
+moved past them are re-read on later refreshes until they commit or
+settle, so slow inserts are not skipped. ``total_readings`` adds up the
+readings folded in, and is replaced by an exact count every
+``FLEET_SNAPSHOT_RECOUNT_SECONDS`` because retention purges remove rows
+behind it.
+"""
+
+import logging
+import mmap
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config.settings import Config
+from services.id_cursor import IdCursor, MAX_OPEN_GAPS
+from services.metrics import register_stats_gauges
+from services.recent_readings import (
+    RECORD_DTYPE, SENSOR_FIELDS, QUALITY_CODES, QUALITY_NAMES, IMPUTABLE_FIELDS,
+    imputed_mask, imputed_fields
+)
+from services.timestamps import reading_time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WQFS'
+VERSION = 3
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('capacity', '<u8'),
+    ('sequence', '<u8'),
+    ('count', '<u8'),
+    ('last_reading_id', '<i8'),
+    ('total_readings', '<i8'),
+    ('updated_at', '<f8'),
+    ('quality_counts', '<i8', (len(QUALITY_CODES),)),
+    ('recounted_at', '<f8'),
+    ('gap_count', '<u8'),
+    ('gap_ids', '<i8', (MAX_OPEN_GAPS,)),
+    ('gap_seen', '<f8', (MAX_OPEN_GAPS,)),
+])
+HEADER_SIZE = 2048
+SLOT_DTYPE = np.dtype([('device_id', 'S64')] + RECORD_DTYPE.descr
+                      + [('raw_values', '<f8', (len(IMPUTABLE_FIELDS),))])
+
+READ_RETRIES = 100
+
+# Slot fields behind the nearby-devices index
+LOCATION_FIELDS = ['device_id', 'latitude', 'longitude', 'quality', 'measured_at']
+
+
+class FleetSnapshot:
+    """mmap-backed table of the latest reading per device"""
+
+    def __init__(self, path: str, capacity: int, max_age_seconds: float):
+        self.path = path
+        self.capacity = capacity
+        self.max_age_seconds = max_age_seconds
+        self.size = HEADER_SIZE + capacity * SLOT_DTYPE.itemsize
+        self._map: Optional[mmap.mmap] = None
+        self._writable = False
+        self._header = None
+        self._slots = None
+        # Per-process device id -> slot index, extended as slots are appended
+        self._index: Dict[str, int] = {}
+
+    # ------------------------------------------------------------------ mapping
+
+    def _attach(self, writable: bool) -> bool:
+        if self._map is not None and (self._writable or not writable):
+            return True
+        if writable:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != self.size:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                mapped = mmap.mmap(fd, self.size, access=mmap.ACCESS_WRITE)
+            finally:
+                os.close(fd)
+        else:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except OSError:
+                return False
+            try:
+                if os.fstat(fd).st_size != self.size:
+                    return False
+                mapped = mmap.mmap(fd, self.size, access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=mapped)
+        slots = np.ndarray((self.capacity,), dtype=SLOT_DTYPE, buffer=mapped, offset=HEADER_SIZE)
+        if writable and (header['magic'] != MAGIC or header['version'] != VERSION
+                         or header['capacity'] != self.capacity):
+            mapped[:] = b'\x00' * self.size
+            header['magic'] = MAGIC
+            header['version'] = VERSION
+            header['capacity'] = self.capacity
+        elif header['magic'] != MAGIC:
+            return False
+
+        self._map, self._writable = mapped, writable
+        self._header, self._slots = header, slots
+        self._index = {}
+        return True
+
+    def _sync_index(self, count: int):
+        known = len(self._index)
+        if count < known:
+            self._index = {}
+            known = 0
+        for slot, device_id in enumerate(self._slots['device_id'][known:count], start=known):
+            self._index[device_id.decode('utf-8')] = slot
+
+    # ------------------------------------------------------------------ reading
+
+    def _read(self, fn):
+        """Run ``fn(count)`` against a consistent view; None if unavailable"""
+        if not self._attach(writable=False):
+            return None
+        header = self._header
+        for _ in range(READ_RETRIES):
+            before = int(header['sequence'])
+            if before % 2:
+                time.sleep(0)
+                continue
+            count = int(header['count'])
+            result = fn(count)
+            if int(header['sequence']) == before:
+                return result
+        logger.warning("⚠️ Fleet snapshot kept changing during read")
+        return None
+
+    def is_fresh(self) -> bool:
+        if not self._attach(writable=False):
+            return False
+        updated_at = float(self._header['updated_at'])
+        return updated_at > 0 and time.time() - updated_at <= self.max_age_seconds
+
+    @staticmethod
+    def _to_dict(slot) -> Dict[str, Any]:
+        reading = {
+            'id': int(slot['id']),
+            'device_id': slot['device_id'].decode('utf-8'),
+            'measured_at': slot['measured_at'].decode('ascii'),
+            'created_at': slot['created_at'].decode('ascii'),
+            'quality': QUALITY_NAMES[int(slot['quality'])],
+        }
+        for field in SENSOR_FIELDS:
+            value = float(slot[field])
+            reading[field] = None if np.isnan(value) else value
+        if reading['tds'] is not None:
+            reading['tds'] = int(reading['tds'])
+        reading['imputed'] = imputed_fields(int(slot['imputed']))
+        reading['raw_values'] = None if reading['imputed'] is None else {
+            field: float(slot['raw_values'][IMPUTABLE_FIELDS.index(field)]) for field in reading['imputed']
+        }
+        if reading['raw_values'] and 'tds' in reading['raw_values']:
+            reading['raw_values']['tds'] = int(reading['raw_values']['tds'])
+        return reading
+
+    def latest(self) -> Optional[List[Dict[str, Any]]]:
+        """Latest reading of every device, or None if the snapshot is stale"""
+        if not self.is_fresh():
+            return None
+        slots = self._read(lambda count: self._slots[:count].copy())
+        return None if slots is None else [self._to_dict(slot) for slot in slots]
+
+    def latest_for(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Latest reading of one device, or None if unknown or stale"""
+        if not self.is_fresh():
+            return None
+
+        def lookup(count):
+            self._sync_index(count)
+            slot = self._index.get(device_id)
+            return None if slot is None else self._slots[slot].copy()
+
+        slot = self._read(lookup)
+        return None if slot is None else self._to_dict(slot)
+
+    def locations(self, fields: List[str] = LOCATION_FIELDS) -> Optional[np.ndarray]:
+        """``fields`` of every device's slot, in slot order, or None if stale"""
+        if not self.is_fresh():
+            return None
+        return self._read(lambda count: self._slots[:count][fields].copy())
+
+    @staticmethod
+    def _cursor_of(header) -> IdCursor:
+        gaps = int(header['gap_count'])
+        return IdCursor(int(header['last_reading_id']),
+                        dict(zip(header['gap_ids'][:gaps].tolist(), header['gap_seen'][:gaps].tolist())))
+
+    def counters(self) -> Optional[Dict[str, Any]]:
+        """Fleet-wide counters from the header"""
+        header = self._read(lambda count: self._header.copy())
+        if header is None:
+            return None
+        return {
+            'devices': int(header['count']),
+            'total_readings': int(header['total_readings']),
+            'last_reading_id': int(header['last_reading_id']),
+            'cursor': self._cursor_of(header).encode(),
+            'quality_summary': {
+                name: int(header['quality_counts'][code]) for name, code in QUALITY_CODES.items()
+            },
+            'updated_at': float(header['updated_at']),
+        }
+
+    # ------------------------------------------------------------------ writing
+
+    def _store(self, reading: Dict[str, Any], quality: str) -> bool:
+        """Put a reading in its device's slot if it is the newest; writer only"""
+        device_id = reading['device_id']
+        slot = self._index.get(device_id)
+        if slot is None:
+            count = int(self._header['count'])
+            if count >= self.capacity:
+                return False
+            slot = count
+            self._slots[slot]['device_id'] = device_id.encode('utf-8')[:64]
+            self._index[device_id] = slot
+            self._header['count'] = count + 1
+        else:
+            measured_at = str(reading_time(reading) or '').encode('ascii', 'ignore')[:32]
+            if measured_at < self._slots[slot]['measured_at']:
+                return True
+
+        record = self._slots[slot]
+        record['id'] = int(reading['id'])
+        record['measured_at'] = str(reading_time(reading) or '').encode('ascii', 'ignore')[:32]
+        record['created_at'] = str(reading.get('created_at') or '').encode('ascii', 'ignore')[:32]
+        for field in SENSOR_FIELDS:
+            value = reading.get(field)
+            record[field] = np.nan if value is None else float(value)
+        record['quality'] = QUALITY_CODES.get(quality, 0)
+        record['imputed'] = imputed_mask(reading)
+        raw_values = reading.get('raw_values') or {}
+        record['raw_values'] = [np.nan if raw_values.get(field) is None else float(raw_values[field])
+                                for field in IMPUTABLE_FIELDS]
+        return True
+
+    def _apply(self, readings: List[Dict[str, Any]], quality_fn, counted: int, cursor: IdCursor):
+        """Apply a page of readings and the advanced cursor inside one seqlock write section"""
+        header = self._header
+        header['sequence'] += 1
+        try:
+            dropped = 0
+            for reading in readings:
+                if not self._store(reading, quality_fn(reading)):
+                    dropped += 1
+            gaps = sorted(cursor.gaps.items())
+            header['last_reading_id'] = cursor.last
+            header['gap_count'] = len(gaps)
+            header['gap_ids'][:len(gaps)] = [gap for gap, _ in gaps]
+            header['gap_seen'][:len(gaps)] = [seen for _, seen in gaps]
+            header['total_readings'] += counted
+            count = int(header['count'])
+            header['quality_counts'] = np.bincount(self._slots['quality'][:count],
+                                                   minlength=len(QUALITY_CODES))
+        finally:
+            header['sequence'] += 1
+        if dropped:
+            logger.warning(f"⚠️ Fleet snapshot full ({self.capacity} devices), {dropped} readings dropped")
+
+    def _recount(self, service):
+        """Replace the running total with an exact count up to the cursor"""
+        total = service.count_readings(up_to_id=int(self._header['last_reading_id']))
+        header = self._header
+        header['sequence'] += 1
+        try:
+            header['total_readings'] = total
+        finally:
+            header['sequence'] += 1
+        header['recounted_at'] = time.time()
+
+    def refresh(self, service, page_size: int = 1000) -> Dict[str, Any]:
+        """
+        Fold readings stored since the last refresh into the snapshot
+
+        Must only run in one process at a time (the scheduler job lock).
+        The first refresh on an empty file loads every device's latest
+        reading and the exact reading count.
+        """
+        started = time.perf_counter()
+        self._attach(writable=True)
+        self._sync_index(int(self._header['count']))
+        header = self._header
+        quality_fn = service.determine_water_quality
+        report = {'bootstrap': False, 'readings': 0, 'recounted': False}
+
+        if int(header['last_reading_id']) == 0:
+            max_id = service.get_max_reading_id()
+            latest = [r for r in service.get_latest_readings() if r['id'] <= max_id]
+            self._apply(latest, quality_fn, counted=service.count_readings(up_to_id=max_id),
+                        cursor=IdCursor(max_id))
+            header['recounted_at'] = time.time()
+            report.update(bootstrap=True, readings=len(latest))
+        else:
+            cursor = self._cursor_of(header)
+            # Readings that were still uncommitted when the cursor passed their ids
+            late = service.get_readings_by_ids(cursor.open_gaps())
+            if late:
+                self._apply(late, quality_fn, counted=cursor.advance(late), cursor=cursor)
+                report['readings'] += len(late)
+
+            page = []
+            for reading in service.iter_readings(after_id=cursor.last, page_size=page_size):
+                page.append(reading)
+                if len(page) >= page_size:
+                    self._apply(page, quality_fn, counted=cursor.advance(page), cursor=cursor)
+                    report['readings'] += len(page)
+                    page = []
+            # An empty page still records gaps that have settled
+            self._apply(page, quality_fn, counted=cursor.advance(page), cursor=cursor)
+            report['readings'] += len(page)
+
+            if time.time() - float(header['recounted_at']) >= Config.FLEET_SNAPSHOT_RECOUNT_SECONDS:
+                self._recount(service)
+                report['recounted'] = True
+
+        header['updated_at'] = time.time()
+        report.update(devices=int(header['count']), last_reading_id=int(header['last_reading_id']),
+                      elapsed_seconds=round(time.perf_counter() - started, 3))
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self.counters() or {}
+        updated_at = counters.get('updated_at') or 0
+        return {
+            'devices': counters.get('devices', 0),
+            'total_readings': counters.get('total_readings', 0),
+            'age_seconds': round(time.time() - updated_at, 3) if updated_at else -1,
+            'bytes': self.size,
+        }
+
+
+# Singleton instance
+fleet_snapshot = FleetSnapshot(
+    Config.FLEET_SNAPSHOT_PATH,
+    capacity=Config.FLEET_SNAPSHOT_MAX_DEVICES,
+    max_age_seconds=Config.FLEET_SNAPSHOT_MAX_AGE_SECONDS
+)
+
+register_stats_gauges('fleet_snapshot', 'Shared fleet snapshot', fleet_snapshot.stats)
@@ -0,0 +1,92 @@
+"""
+Id Cursor - follow new readings by id without skipping late commits
+
+Reading ids come from a sequence when a row is inserted, but the row only
+becomes visible when its transaction commits. If a slow insert takes id
+41 and a quicker one takes 42 and commits first, a reader following
+``id > last`` sees 42, moves past 41 and never reads it.
+
+``IdCursor`` is the highest id seen plus the ids below it that were
+missing when it moved past them (open gaps). Each read fetches
+``id > last`` and the open gaps by id. A gap is kept for
+``ROLLUP_SETTLE_SECONDS`` (the settle window ``rollup_new`` uses), after
+which it is given up: rolled-back inserts leave gaps that never fill.
+At most ``MAX_OPEN_GAPS`` are kept (a sequence jump only keeps the ids
+just below the new maximum).
+
+Cursors travel as strings: ``"1234"``, or ``"1234~1230@1760860000,1231@1760860000"``
+with open gaps and when each was first seen (epoch seconds).
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.settings import Config
+
+MAX_OPEN_GAPS = 64
+
+
+class IdCursor:
+    """Highest reading id seen plus the open gaps below it"""
+
+    __slots__ = ('last', 'gaps')
+
+    def __init__(self, last: int = 0, gaps: Optional[Dict[int, float]] = None):
+        self.last = int(last)
+        self.gaps: Dict[int, float] = dict(gaps or {})  # id -> first seen (epoch seconds)
+
+    @classmethod
+    def decode(cls, value: str) -> 'IdCursor':
+        """Parse a cursor string; raises ValueError when malformed"""
+        last, _, gaps = value.partition('~')
+        cursor = cls(int(last))
+        for item in filter(None, gaps.split(',')):
+            gap, _, seen = item.partition('@')
+            cursor.gaps[int(gap)] = float(seen)
+        if cursor.last < 0 or any(gap >= cursor.last for gap in cursor.gaps):
+            raise ValueError(f"Invalid cursor '{value}'")
+        return cursor
+
+    def encode(self) -> str:
+        if not self.gaps:
+            return str(self.last)
+        return f"{self.last}~" + ','.join(f'{gap}@{int(seen)}' for gap, seen in sorted(self.gaps.items()))
+
+    def open_gaps(self) -> List[int]:
+        return sorted(self.gaps)
+
+    def advance(self, rows: Iterable[Dict[str, Any]], now: Optional[float] = None) -> int:
+        """
+        Account for rows read after ``last`` or from the open gaps
+
+        Returns how many of them were not seen before (new ids plus filled
+        gaps); repeats of ids at or below ``last`` that were not open gaps
+        are ignored.
+        """
+        now = time.time() if now is None else now
+        fresh = 0
+        newer = []
+        for row in rows:
+            reading_id = int(row['id'])
+            if reading_id > self.last:
+                newer.append(reading_id)
+            elif self.gaps.pop(reading_id, None) is not None:
+                fresh += 1
+
+        if newer:
+            newer = sorted(set(newer))
+            fresh += len(newer)
+            top = newer[-1]
+            low = max(self.last + 1, top - MAX_OPEN_GAPS)
+            seen = set(newer)
+            for missing in range(low, top):
+                if missing not in seen:
+                    self.gaps[missing] = now
+            self.last = top
+
+        # Settled gaps will not fill any more; the oldest go first past the cap
+        settle = Config.ROLLUP_SETTLE_SECONDS
+        self.gaps = {gap: seen for gap, seen in self.gaps.items() if now - seen <= settle}
+        if len(self.gaps) > MAX_OPEN_GAPS:
+            self.gaps = dict(sorted(self.gaps.items())[-MAX_OPEN_GAPS:])
+        return fresh
@@ -0,0 +1,149 @@
+"""
+Idempotency - duplicate suppression for retried ingest requests
+
+Each reading gets an idempotency key, either an explicit
+``Idempotency-Key`` header / ``idempotency_key`` field or one derived from
+the device id plus its ``seq`` counter and/or ``measured_at`` timestamp.
+Keys are always scoped to the device. Readings without any of these have no
+key and are never treated as duplicates.
+
+A bounded LRU of recently stored keys drops most retries before they reach
+the database; the unique index on ``idempotency_key`` (see
+``migrations/001_idempotency_key.sql``) catches the rest, e.g. retries that
+land on another worker.
+
+Devices that reset ``seq`` on reboot should also send ``measured_at`` so the
+derived key stays unique.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config.settings import Config
+from services.metrics import registry, register_stats_gauges
+
+INGEST_DUPLICATES = registry.counter(
+    'ingest_duplicates_total',
+    'Duplicate readings dropped per device',
+    ('device_id', 'stage')
+)
+
+UNIQUE_VIOLATION = '23505'
+
+
+def idempotency_key(reading: Dict[str, Any], explicit: Optional[str] = None) -> Optional[str]:
+    """Device-scoped idempotency key for a validated reading, or None"""
+    device_id = reading['device_id']
+    explicit = explicit or reading.get('idempotency_key')
+    if explicit:
+        return f"{device_id}:key:{explicit}"
+
+    parts = []
+    if reading.get('seq') is not None:
+        parts.append(f"seq:{reading['seq']}")
+    if reading.get('measured_at'):
+        parts.append(f"ts:{reading['measured_at']}")
+    if not parts:
+        return None
+    return f"{device_id}:" + ':'.join(parts)
+
+
+class DuplicateKey(Exception):
+    """A key found stored before the insert (partitioned tables); ``existing`` is that row"""
+
+    code = UNIQUE_VIOLATION
+
+    def __init__(self, existing: Dict[str, Any]):
+        super().__init__(f"Idempotency key already stored: {existing.get('idempotency_key')}")
+        self.existing = existing
+
+
+def is_unique_violation(error: Exception) -> bool:
+    """True if a Supabase/PostgREST error is a unique-constraint conflict"""
+    code = getattr(error, 'code', None)
+    if code is None and error.args and isinstance(error.args[0], dict):
+        code = error.args[0].get('code')
+    return code == UNIQUE_VIOLATION or UNIQUE_VIOLATION in str(error)
+
+
+class IdempotencyGuard:
+    """LRU of recently stored keys → reading id, plus per-device counts"""
+
+    def __init__(self, max_keys: int, ttl_seconds: float, max_devices: int = 10000):
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self.max_devices = max_devices
+        self._keys: "OrderedDict[str, tuple]" = OrderedDict()
+        self._devices: "OrderedDict[str, list]" = OrderedDict()  # device -> [received, duplicates]
+        self._lock = threading.Lock()
+
+    def _count(self, device_id: str, duplicate: bool):
+        counts = self._devices.get(device_id)
+        if counts is None:
+            counts = [0, 0]
+            self._devices[device_id] = counts
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_id)
+        counts[0] += 1
+        if duplicate:
+            counts[1] += 1
+
+    def seen(self, key: Optional[str], device_id: str) -> Optional[int]:
+        """Return the stored reading id if ``key`` was already ingested"""
+        with self._lock:
+            if key is None:
+                self._count(device_id, False)
+                return None
+            entry = self._keys.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self._keys.move_to_end(key)
+                self._count(device_id, True)
+                INGEST_DUPLICATES.labels(device_id, 'memory').inc()
+                return entry[0]
+            self._count(device_id, False)
+            return None
+
+    def remember(self, key: Optional[str], reading_id: int):
+        if key is None:
+            return
+        with self._lock:
+            self._keys[key] = (reading_id, time.monotonic())
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+
+    def record_duplicate(self, device_id: str, stage: str):
+        """A duplicate caught after ``seen`` (``batch`` repeat or ``database`` conflict)"""
+        with self._lock:
+            counts = self._devices.get(device_id)
+            if counts is not None:
+                counts[1] += 1
+        INGEST_DUPLICATES.labels(device_id, stage).inc()
+
+    def device_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                device_id: {
+                    'received': received,
+                    'duplicates': duplicates,
+                    'duplicate_rate': round(duplicates / received, 4) if received else 0.0,
+                }
+                for device_id, (received, duplicates) in self._devices.items()
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'keys': len(self._keys), 'max_keys': self.max_keys}
+
+
+# Singleton instance
+idempotency_guard = IdempotencyGuard(
+    max_keys=Config.IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=Config.IDEMPOTENCY_TTL_SECONDS
+)
+
+register_stats_gauges('idempotency_cache', 'Idempotency key LRU', idempotency_guard.stats)
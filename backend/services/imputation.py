@@ -0,0 +1,244 @@
+"""
+Imputation - online IMPUTE_AND_LOG stage for suspect sensor values
+
+``Config.QUALITY_ACTIONS`` maps SUSPECT readings to ``IMPUTE_AND_LOG``.
+At ingest every sensor value is checked against its device's running
+state. A value is suspect if it is outside the plausible range in
+``SENSOR_THRESHOLDS``, or, once ``IMPUTATION_WARMUP`` good values have
+been seen, more than ``IMPUTATION_Z_THRESHOLD`` spreads away from the EWMA.
+Suspect values are replaced by the EWMA (or the last good value). The
+original goes into ``raw_values`` and the field name into ``imputed``,
+so nothing is lost and downstream consumers can tell which values were
+measured.
+
+State is five floats per device and sensor (EWMA, EW variance, last good
+value, count, current run of rejections) plus the device's newest judged
+measurement time, and every update is O(1). Each worker process keeps its
+own state, bounded to ``IMPUTATION_MAX_DEVICES`` devices (least recently
+seen are evicted).
+
+Judging and learning are separate steps. ``apply`` judges a batch against
+a scratch copy of the state, so the readings of one device in a batch are
+still judged in sequence, but nothing is learned yet. ``observe`` then
+advances the real state with the measured values of each reading that was
+actually stored, so a retry the database rejects as a duplicate neither
+moves the EWMA nor counts as an imputation. Readings measured before the
+newest one already judged for their device (store-and-forward backfill)
+would be compared with the current level rather than their own; they are
+stored as measured and left out of the state.
+
+A genuine level shift (say a sensor moved to another tank) would otherwise
+be rejected forever. After ``IMPUTATION_MAX_CONSECUTIVE`` rejections in a
+row, an in-range value is accepted as the new baseline instead.
+"""
+
+import copy
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config.settings import Config
+from services.metrics import registry, register_stats_gauges
+from services.timestamps import reading_time
+
+logger = logging.getLogger(__name__)
+
+SENSOR_FIELDS = ('temperature', 'ph', 'tds', 'turbidity')
+
+# Smallest spread used for spike detection, so a very steady sensor does
+# not flag normal noise (sensor units)
+MIN_SPREAD = {'temperature': 0.5, 'ph': 0.15, 'tds': 25.0, 'turbidity': 1.0}
+
+INGEST_IMPUTED = registry.counter(
+    'ingest_imputed_values_total',
+    'Sensor values replaced by the imputation stage',
+    ('sensor', 'reason')
+)
+
+
+class _SensorState:
+    __slots__ = ('mean', 'var', 'last', 'count', 'rejected')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.last = 0.0
+        self.count = 0
+        self.rejected = 0
+
+
+class _DeviceState:
+    __slots__ = ('newest', 'sensors')
+
+    def __init__(self):
+        self.newest = ''  # measured_at of the newest judged reading
+        self.sensors = {field: _SensorState() for field in SENSOR_FIELDS}
+
+    def copy(self) -> '_DeviceState':
+        clone = _DeviceState()
+        clone.newest = self.newest
+        clone.sensors = {field: copy.copy(state) for field, state in self.sensors.items()}
+        return clone
+
+
+class OnlineImputer:
+    """Per-device EWMA state and the replace-suspect-values rule"""
+
+    def __init__(self, method: str = 'ewma', alpha: float = 0.1, z_threshold: float = 4.0,
+                 warmup: int = 10, max_consecutive: int = 5, max_devices: int = 100000):
+        if method not in ('ewma', 'last_good'):
+            raise ValueError(f"Unknown imputation method '{method}'")
+        self.method = method
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.max_consecutive = max_consecutive
+        self.max_devices = max_devices
+        self.limits = {
+            field: (Config.SENSOR_THRESHOLDS[field]['min'], Config.SENSOR_THRESHOLDS[field]['max'])
+            for field in SENSOR_FIELDS
+        }
+        self._devices: "OrderedDict[str, _DeviceState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._imputed = 0
+
+    def _device(self, device_id: str) -> _DeviceState:
+        device = self._devices.get(device_id)
+        if device is None:
+            device = _DeviceState()
+            self._devices[device_id] = device
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_id)
+        return device
+
+    def _accept(self, state: _SensorState, value: float):
+        if state.count == 0:
+            state.mean = value
+            state.var = 0.0
+        else:
+            delta = value - state.mean
+            state.mean += self.alpha * delta
+            state.var = (1 - self.alpha) * (state.var + self.alpha * delta * delta)
+        state.last = value
+        state.count += 1
+        state.rejected = 0
+
+    def _check(self, field: str, state: _SensorState, value: float):
+        """Return the reason a value is suspect, or None"""
+        low, high = self.limits[field]
+        if value < low or value > high:
+            return 'range'
+        if state.count >= self.warmup:
+            spread = max(math.sqrt(state.var), MIN_SPREAD[field])
+            if abs(value - state.mean) > self.z_threshold * spread:
+                return 'spike'
+        return None
+
+    def _step(self, device: _DeviceState, reading: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Judge one reading's values and advance ``device`` past it
+
+        Returns ``{field: (reason, replacement)}`` for the suspect values, or
+        None for a backfilled reading, which is not judged.
+        """
+        measured_at = str(reading_time(reading) or '')
+        if measured_at:
+            if measured_at < device.newest:
+                return None
+            device.newest = measured_at
+
+        suspect = {}
+        for field in SENSOR_FIELDS:
+            value = reading.get(field)
+            if value is None:
+                continue
+            state = device.sensors[field]
+            reason = self._check(field, state, value)
+
+            if reason == 'spike' and state.rejected >= self.max_consecutive:
+                # Sustained and in range: a real level shift, start over from here
+                state.count = 0
+                reason = None
+
+            if reason is None or state.count == 0:
+                # Nothing to impute from yet; keep the measured value
+                if reason is None:
+                    self._accept(state, value)
+                continue
+
+            suspect[field] = (reason, state.mean if self.method == 'ewma' else state.last)
+            state.rejected += 1
+        return suspect
+
+    def apply(self, readings: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Impute suspect values in place; returns ``{field: reason}`` per reading
+
+        Adds ``imputed`` (list of fields) and ``raw_values`` (their original
+        values) to a reading when anything was replaced. The state is not
+        changed; call ``observe`` for each reading once it is stored.
+        """
+        results = []
+        with self._lock:
+            scratch: Dict[str, _DeviceState] = {}
+            for reading in readings:
+                device = scratch.get(reading['device_id'])
+                if device is None:
+                    live = self._devices.get(reading['device_id'])
+                    device = live.copy() if live is not None else _DeviceState()
+                    scratch[reading['device_id']] = device
+                suspect = self._step(device, reading) or {}
+
+                raw_values = {}
+                for field, (_, replacement) in suspect.items():
+                    raw_values[field] = reading[field]
+                    reading[field] = int(round(replacement)) if field == 'tds' else round(replacement, 3)
+                if raw_values:
+                    reading['imputed'] = list(raw_values)
+                    reading['raw_values'] = raw_values
+                results.append({field: reason for field, (reason, _) in suspect.items()})
+        return results
+
+    def observe(self, reading: Dict[str, Any], imputed: Dict[str, str]):
+        """
+        Learn from a stored reading's measured values
+
+        ``imputed`` is what ``apply`` returned for it; those replacements
+        are counted and logged here, once the reading is known to be new.
+        """
+        raw_values = reading.get('raw_values') or {}
+        measured = dict(reading, **raw_values)
+        with self._lock:
+            self._step(self._device(reading['device_id']), measured)
+            if imputed:
+                self._imputed += 1
+
+        if imputed:
+            for field, reason in imputed.items():
+                INGEST_IMPUTED.labels(field, reason).inc()
+            logger.info(
+                f"⚠️ Imputed {', '.join(imputed)} for {reading['device_id']} "
+                f"({Config.QUALITY_ACTIONS['SUSPECT']})",
+                extra={'device_id': reading['device_id'], 'imputed': list(imputed), 'raw_values': raw_values}
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'devices': len(self._devices), 'imputed_readings': self._imputed}
+
+
+# Singleton instance
+imputer = OnlineImputer(
+    method=Config.IMPUTATION_METHOD,
+    alpha=Config.IMPUTATION_ALPHA,
+    z_threshold=Config.IMPUTATION_Z_THRESHOLD,
+    warmup=Config.IMPUTATION_WARMUP,
+    max_consecutive=Config.IMPUTATION_MAX_CONSECUTIVE,
+    max_devices=Config.IMPUTATION_MAX_DEVICES
+)
+
+register_stats_gauges('imputer', 'Online imputation state', imputer.stats)
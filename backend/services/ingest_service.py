@@ -0,0 +1,132 @@
+"""
+Ingest Service - shared persistence path for validated readings
+
+Every ingest entry point (single and batch HTTP, and later other
+transports) hands validated readings here so duplicate suppression,
+imputation of suspect values, storage, quality scoring, the
+recent-readings buffers, metrics and precomputed-view refreshes stay
+consistent.
+"""
+
+import logging
+from typing import List, Dict, Any, Optional
+
+from config.settings import Config
+from services.supabase_service import supabase_service
+from services.recent_readings import recent_readings
+from services.metrics import record_ingest
+from services.idempotency import idempotency_guard, idempotency_key, is_unique_violation
+from services.validation import STORED_FIELDS
+from services.imputation import imputer
+from services.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class IngestService:
+    """
+    Store validated readings and update the in-memory views
+
+    ``local_views`` is off in processes that serve no reads (the ingest
+    gateway): their recent-readings buffers would never be read, and the
+    API workers pick the readings up from the database instead.
+    """
+
+    def __init__(self, local_views: bool = True):
+        self.local_views = local_views
+
+    def _duplicate(self, row: Dict[str, Any], existing: Optional[Dict[str, Any]],
+                   reading_id: Optional[int]) -> Dict[str, Any]:
+        result = dict(existing) if existing else {**row, 'id': reading_id, 'created_at': None}
+        result['duplicate'] = True
+        result['quality'] = supabase_service.determine_water_quality(result)
+        return result
+
+    def _store_one(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return supabase_service.create_reading(row)
+        except Exception as e:
+            key = row.get('idempotency_key')
+            if not key or not is_unique_violation(e):
+                raise
+            idempotency_guard.record_duplicate(row['device_id'], 'database')
+            existing = getattr(e, 'existing', None) or supabase_service.get_reading_by_key(key, row.get('measured_at'))
+            return self._duplicate(row, existing, existing['id'] if existing else None)
+
+    def _store(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(rows) == 1:
+            return [self._store_one(rows[0])]
+        try:
+            return supabase_service.create_readings(rows)
+        except Exception as e:
+            if not is_unique_violation(e):
+                raise
+            # Some rows were already stored; retry one by one to find which
+            return [self._store_one(row) for row in rows]
+
+    def ingest(self, readings: List[Dict[str, Any]], payload_bytes: int = 0,
+               explicit_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Persist readings and return the stored rows with their quality
+
+        Rows for retried readings come back with ``duplicate: True`` and the
+        id of the original. ``explicit_key`` (an ``Idempotency-Key`` header)
+        only applies to single-reading requests. ``payload_bytes`` is split
+        evenly across the readings for the per-device metrics.
+        """
+        if not readings:
+            return []
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(readings)
+        pending = []  # (index, row)
+        batch_keys = {}
+
+        for index, reading in enumerate(readings):
+            key = idempotency_key(reading, explicit_key if len(readings) == 1 else None)
+            row = {field: reading[field] for field in STORED_FIELDS if field in reading}
+            if key:
+                row['idempotency_key'] = key
+
+            existing_id = idempotency_guard.seen(key, reading['device_id'])
+            if existing_id is not None:
+                results[index] = self._duplicate(row, None, existing_id)
+            elif key and key in batch_keys:
+                # Same reading twice in one batch; store it once
+                idempotency_guard.record_duplicate(reading['device_id'], 'batch')
+                results[index] = batch_keys[key]
+            else:
+                pending.append((index, row))
+                if key:
+                    batch_keys[key] = index
+
+        if pending:
+            share = payload_bytes // len(readings)
+            rows = [row for _, row in pending]
+            imputed = imputer.apply(rows) if Config.IMPUTATION_ENABLED else [{}] * len(rows)
+            stored = self._store(rows)
+            for (index, row), reading, replaced in zip(pending, stored, imputed):
+                results[index] = reading
+                if reading.get('duplicate'):
+                    continue
+                if Config.IMPUTATION_ENABLED:
+                    # Only readings that were really stored move the imputation state
+                    imputer.observe(row, replaced)
+                idempotency_guard.remember(row.get('idempotency_key'), reading['id'])
+                quality = supabase_service.determine_water_quality(reading)
+                if self.local_views:
+                    recent_readings.record(reading, quality)
+                record_ingest(reading['device_id'], share)
+                reading['quality'] = quality
+            # Precomputed views are stale now (signals the API workers from the gateway)
+            scheduler.notify_ingest()
+
+        # Resolve in-batch repeats to the row stored for their first occurrence
+        for index, result in enumerate(results):
+            if isinstance(result, int):
+                results[index] = self._duplicate(results[result], results[result], results[result].get('id'))
+
+        return results
+
+
+# Singleton instance
+ingest_service = IngestService()
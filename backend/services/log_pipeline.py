@@ -0,0 +1,157 @@
+"""
+Log Pipeline - non-blocking structured logging
+
+Request threads only put records on an in-memory queue; a background
+``QueueListener`` formats them as JSON lines and does the file and console
+I/O. Per-device success messages (records carrying a ``device_id`` below
+WARNING) are sampled and rate limited before they are queued; warnings and
+errors always get through.
+
+Usage from request code::
+
+    logger.info("Reading stored", extra={'device_id': device_id, 'quality': quality})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from config.settings import Config
+from services.metrics import registry
+
+LOG_RECORDS_DROPPED = registry.counter(
+    'log_records_dropped_total',
+    'Log records dropped before queueing',
+    ('reason',)
+)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DeviceSamplingFilter(logging.Filter):
+    """
+    Sample and rate limit per-device success records
+
+    Keeps one in ``sample_every`` records per device and at most
+    ``max_per_minute`` of those. Records at WARNING and above, and records
+    without a ``device_id``, are never dropped.
+    """
+
+    def __init__(self, sample_every: int = 1, max_per_minute: int = 0, max_devices: int = 10000):
+        super().__init__()
+        self.sample_every = max(1, sample_every)
+        self.max_per_minute = max_per_minute
+        self.max_devices = max_devices
+        self._state = OrderedDict()  # device_id -> [seen, tokens, last refill]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        device_id = getattr(record, 'device_id', None)
+        if device_id is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(device_id)
+            if state is None:
+                state = [0, float(self.max_per_minute), now]
+                self._state[device_id] = state
+                if len(self._state) > self.max_devices:
+                    self._state.popitem(last=False)
+            else:
+                self._state.move_to_end(device_id)
+
+            state[0] += 1
+            if (state[0] - 1) % self.sample_every:
+                LOG_RECORDS_DROPPED.labels('sampled').inc()
+                return False
+
+            if self.max_per_minute:
+                rate = self.max_per_minute / 60.0
+                state[1] = min(float(self.max_per_minute), state[1] + (now - state[2]) * rate)
+                state[2] = now
+                if state[1] < 1.0:
+                    LOG_RECORDS_DROPPED.labels('rate_limited').inc()
+                    return False
+                state[1] -= 1.0
+
+        return True
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that keeps the record's ``extra`` fields and traceback"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener = None
+log_queue = queue.SimpleQueue()
+
+
+def setup_logging(logs_dir: str, level: int = logging.INFO, filename: str = 'api.log'):
+    """Route all logging through the queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = JsonFormatter()
+
+    file_handler = logging.FileHandler(f"{logs_dir}/{filename}")
+    file_handler.setFormatter(formatter)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    queue_handler = _PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(DeviceSamplingFilter(
+        sample_every=Config.LOG_DEVICE_SAMPLE_EVERY,
+        max_per_minute=Config.LOG_DEVICE_MAX_PER_MINUTE
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    registry.gauge('log_queue_depth', 'Log records waiting to be written',
+                   callback=lambda: {(): log_queue.qsize()})
+    return _listener
@@ -0,0 +1,342 @@
+"""
+Metrics - lightweight Prometheus-compatible counters, gauges and histograms
+
+Only what the API needs: labelled counters, histograms with fixed buckets
+and gauges that are read from a callback at scrape time. Recording a value
+is a dict lookup, a bisect and a locked add, cheap enough to leave on in
+production. ``render()`` produces the Prometheus text exposition format.
+
+Each gunicorn worker keeps its own registry; scrape every worker or sum
+across them in Prometheus.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, child in list(self._children.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}')
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self.observe)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            inf = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {child.count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {child.count}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge whose samples come from a callback at scrape time
+
+    The callback returns ``{label values tuple: value}``.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Callable[[], Dict[Tuple[str, ...], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        try:
+            samples = self.callback() if self.callback else {}
+        except Exception:
+            samples = {}
+        for key, value in samples.items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('_observe', '_start')
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._start)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Singleton registry
+registry = Registry()
+
+
+# ============================================================================
+# API METRICS
+# ============================================================================
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds',
+    'Request latency by route',
+    ('route', 'method', 'status')
+)
+
+SUPABASE_QUERY_DURATION = registry.histogram(
+    'supabase_query_duration_seconds',
+    'SupabaseService call latency',
+    ('method',)
+)
+
+SUPABASE_QUERY_ERRORS = registry.counter(
+    'supabase_query_errors_total',
+    'SupabaseService calls that failed',
+    ('method',)
+)
+
+INGEST_READINGS = registry.counter(
+    'ingest_readings_total',
+    'Readings ingested per device',
+    ('device_id',)
+)
+
+INGEST_PAYLOAD_BYTES = registry.counter(
+    'ingest_payload_bytes_total',
+    'Ingest request body bytes per device',
+    ('device_id',)
+)
+
+INGEST_PAYLOAD_SIZE = registry.histogram(
+    'ingest_payload_size_bytes',
+    'Ingest request body size',
+    buckets=SIZE_BUCKETS
+)
+
+ML_SCORING_DURATION = registry.histogram(
+    'ml_scoring_duration_seconds',
+    'MLIntegrator scoring time by path',
+    ('path',)
+)
+
+
+def record_ingest(device_id: str, payload_bytes: int, readings: int = 1):
+    """Count one ingest request"""
+    INGEST_READINGS.labels(device_id).inc(readings)
+    INGEST_PAYLOAD_BYTES.labels(device_id).inc(payload_bytes)
+    INGEST_PAYLOAD_SIZE.observe(payload_bytes)
+
+
+_query_observers: List[Callable[[str, float], None]] = []
+
+
+def observe_queries(callback: Callable[[str, float], None]):
+    """Call ``callback(name, seconds)`` after every timed Supabase query"""
+    _query_observers.append(callback)
+
+
+def timed_query(func):
+    """Time a SupabaseService method and count the exceptions it raises"""
+    name = func.__name__
+    histogram = SUPABASE_QUERY_DURATION.labels(name)
+    errors = SUPABASE_QUERY_ERRORS.labels(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            histogram.observe(elapsed)
+            for observer in _query_observers:
+                observer(name, elapsed)
+
+    return wrapper
+
+
+def register_stats_gauges(prefix: str, documentation: str, stats: Callable[[], Dict[str, float]]):
+    """Expose every numeric field of a ``stats()`` dict as ``<prefix>_<field>``"""
+    def sample(field):
+        def callback():
+            return {(): stats()[field]}
+        return callback
+
+    for field, value in stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            registry.gauge(f'{prefix}_{field}', f'{documentation}: {field}', callback=sample(field))
+
+
+def init_app(app):
+    """Time every request by route and serve ``GET /metrics``"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_DURATION.labels(route, request.method, response.status_code)\
+                                 .observe(time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus scrape endpoint"""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,189 @@
+"""
+Partitioning - monthly routing of the readings table
+
+With ``READINGS_PARTITIONING=monthly`` readings live in one table per
+month of ``measured_at``, ``water_quality_readings_YYYY_MM``, created on
+demand by the ``ensure_readings_partition`` function and listed in
+``water_quality_partitions`` (migrations/006_monthly_partitions.sql).
+The partitions share the id sequence of ``water_quality_readings``, so
+ids stay unique and increasing across them.
+
+``PartitionRouter`` maps a timestamp to its partition and a time range to
+the partitions overlapping it, newest first; SupabaseService only queries
+those (pruning). The registry is re-read every
+``PARTITION_REGISTRY_REFRESH_SECONDS``, and each refresh also makes sure
+the current and next month exist, so every worker knows a month's
+partition before the first reading for it arrives.
+
+While ``PARTITION_INCLUDE_LEGACY`` is set, reads also cover the original
+table; ``PartitionMigration`` (``python partition_readings.py``) moves its
+rows into the partitions in bounded batches, copy first and delete
+second, so it can be interrupted and rerun.
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import Config
+from services.timestamps import parse_timestamp, reading_time, utc_now
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_TABLE = 'water_quality_partitions'
+
+
+def month_start(moment: datetime) -> date:
+    """First day of the UTC month containing ``moment``"""
+    moment = moment.astimezone(timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+def month_of(reading: Dict[str, Any]) -> date:
+    return month_start(parse_timestamp(reading_time(reading)) or utc_now())
+
+
+def next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class PartitionRouter:
+    """Partition names for timestamps and time ranges, from the registry"""
+
+    def __init__(self, client, base_table: str, refresh_seconds: float = 60,
+                 include_legacy: bool = True):
+        self.client = client
+        self.base_table = base_table
+        self.refresh_seconds = refresh_seconds
+        self.include_legacy = include_legacy
+        self._months: List[date] = []
+        self._refreshed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def name(self, month: date) -> str:
+        return f'{self.base_table}_{month.year:04d}_{month.month:02d}'
+
+    def _ensure(self, month: date):
+        """Create and register a month's partition; caller holds the lock"""
+        if month in self._months:
+            return
+        self.client.rpc('ensure_readings_partition', {'month_start': month.isoformat()}).execute()
+        self._months = sorted(set(self._months) | {month})
+        logger.info(f"✅ Readings partition {self.name(month)} ready")
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+                return
+            response = self.client.table(REGISTRY_TABLE).select("month_start").execute()
+            self._months = sorted(
+                date.fromisoformat(str(row['month_start'])[:10]) for row in response.data or []
+            )
+            current = month_start(utc_now())
+            self._ensure(current)
+            self._ensure(next_month(current))
+            self._refreshed_at = now
+
+    def for_reading(self, reading: Dict[str, Any]) -> str:
+        """Partition a reading is stored in (created if needed)"""
+        month = month_of(reading)
+        self.refresh()
+        with self._lock:
+            self._ensure(month)
+        return self.name(month)
+
+    def between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """
+        Tables that can hold readings measured in [start, end), newest first
+
+        The legacy table, when still included, comes last.
+        """
+        self.refresh()
+        start_month = month_start(parse_timestamp(start)) if start else None
+        end_moment = parse_timestamp(end) if end else None
+        with self._lock:
+            months = [
+                month for month in self._months
+                if (start_month is None or month >= start_month)
+                and (end_moment is None
+                     or datetime(month.year, month.month, 1, tzinfo=timezone.utc) < end_moment)
+            ]
+        tables = [self.name(month) for month in reversed(months)]
+        if self.include_legacy:
+            tables.append(self.base_table)
+        return tables
+
+    def all(self) -> List[str]:
+        return self.between()
+
+    def is_legacy(self, table: str) -> bool:
+        return table == self.base_table
+
+
+class PartitionMigration:
+    """Move rows from the single readings table into monthly partitions"""
+
+    def __init__(self, service, batch_size: int = None):
+        self.service = service
+        self.client = service.client
+        self.source = service.table_name
+        self.batch_size = batch_size or Config.COMPACTION_BATCH_SIZE
+        self.router = service.partitions or PartitionRouter(
+            self.client, self.source, include_legacy=True
+        )
+
+    def _batch(self, after_id: Optional[int]) -> List[Dict[str, Any]]:
+        query = self.client.table(self.source).select("*")
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return query.order("id").limit(self.batch_size).execute().data or []
+
+    def run(self, dry_run: bool = False, max_batches: Optional[int] = None,
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+            pause_seconds: float = 0.0) -> Dict[str, Any]:
+        """
+        Copy each batch into its partitions, then delete it from the source
+
+        The copy is an upsert on ``id``, so rerunning after a crash between
+        copy and delete does not duplicate rows. A dry run reads through
+        the whole table and only counts.
+        """
+        started = time.monotonic()
+        report = {'dry_run': dry_run, 'moved': 0, 'batches': 0, 'by_partition': {}, 'complete': False}
+        after_id = None
+
+        while True:
+            if max_batches is not None and report['batches'] >= max_batches:
+                break
+            rows = self._batch(after_id if dry_run else None)
+            if not rows:
+                report['complete'] = True
+                break
+
+            groups: Dict[str, List[Dict[str, Any]]] = {}
+            for row in rows:
+                table = self.router.name(month_of(row)) if dry_run else self.router.for_reading(row)
+                groups.setdefault(table, []).append(row)
+            for table, group in groups.items():
+                if not dry_run:
+                    self.client.table(table).upsert(group, on_conflict="id").execute()
+                report['by_partition'][table] = report['by_partition'].get(table, 0) + len(group)
+            if not dry_run:
+                # Copies first, source rows second: a crash in between is safe to rerun
+                self.client.table(self.source).delete().in_("id", [row['id'] for row in rows]).execute()
+
+            after_id = rows[-1]['id']
+            report['moved'] += len(rows)
+            report['batches'] += 1
+            if progress:
+                progress(dict(report, elapsed_seconds=round(time.monotonic() - started, 2)))
+            if pause_seconds:
+                time.sleep(pause_seconds)
+
+        report['elapsed_seconds'] = round(time.monotonic() - started, 2)
+        logger.info(f"✅ Partition migration {'dry run ' if dry_run else ''}finished: "
+                    f"{report['moved']} readings in {len(report['by_partition'])} partitions")
+        return report
@@ -0,0 +1,268 @@
+"""
+Precompute - the views the scheduler prepares ahead of requests
+
+Each ``build_*`` function computes one read view from Supabase rows; the
+routes call the same functions inline when no fresh precomputed result is
+available (scheduler disabled, first seconds after start, job failing).
+
+The latest reading per device is not published as a job result but kept
+in the shared ``fleet_snapshot``, which the ``fleet_snapshot`` job
+refreshes.
+
+``start_background_jobs`` registers the views and the maintenance jobs
+(incremental rollups, compaction, calibration drift) with the scheduler
+and starts it. Intervals come from ``Config``; an interval of 0 disables
+a job.
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from config.settings import Config
+from services.supabase_service import supabase_service
+from services.scheduler import scheduler
+from services.fleet_snapshot import fleet_snapshot
+from services.id_cursor import IdCursor, MAX_OPEN_GAPS
+from services.timestamps import reading_time, to_iso, utc_now
+
+logger = logging.getLogger(__name__)
+
+QUALITY_VALUES = {'good': 1.0, 'warning': 0.5}
+
+DASHBOARD_SECTIONS = ('readings', 'statistics', 'alerts', 'heatmap', 'devices')
+
+# Rows behind the statistics summary and the alerts, as in their own endpoints
+STATISTICS_WINDOW = 1000
+ALERTS_WINDOW = 100
+
+
+def _quality(reading: Dict[str, Any]) -> str:
+    return reading.get('quality') or supabase_service.determine_water_quality(reading)
+
+
+def build_statistics() -> Dict[str, Any]:
+    return supabase_service.get_statistics()
+
+
+def build_latest() -> List[Dict[str, Any]]:
+    """Latest reading per device, from the shared snapshot when it is current"""
+    latest = fleet_snapshot.latest()
+    if latest is None:
+        latest = supabase_service.get_latest_readings()
+    return latest
+
+
+def build_heatmap(latest_readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One map point per device with a known position"""
+    points = []
+    for reading in latest_readings:
+        if reading.get('latitude') and reading.get('longitude'):
+            quality = _quality(reading)
+            points.append({
+                'lat': reading['latitude'],
+                'lng': reading['longitude'],
+                'value': QUALITY_VALUES.get(quality, 0.1),
+                'quality': quality,
+                'device_id': reading['device_id'],
+                'temperature': reading.get('temperature'),
+                'ph': reading.get('ph'),
+                'tds': reading.get('tds'),
+                'turbidity': reading.get('turbidity'),
+                'timestamp': reading_time(reading)
+            })
+    return points
+
+
+def build_alerts(readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Alerts for readings whose quality is warning or danger"""
+    alerts = []
+    for reading in readings:
+        quality = _quality(reading)
+        if quality == 'danger':
+            alert_id = f"alert_{reading['id']}"
+            severity = 'critical'
+            message = f"Critical water quality issue at {reading['device_id']}"
+        elif quality == 'warning':
+            alert_id = f"alert_{reading['id']}_suspect"
+            severity = 'warning'
+            message = f"Suspect water quality at {reading['device_id']}"
+        else:
+            continue
+        alerts.append({
+            'id': alert_id,
+            'severity': severity,
+            'message': message,
+            'timestamp': reading_time(reading),
+            'resolved': False,
+            'reading_id': reading['id'],
+            'device_id': reading['device_id'],
+            'quality': quality
+        })
+    return alerts
+
+
+def build_devices(latest_readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Device list from each device's latest reading"""
+    return [{
+        'id': reading['device_id'],
+        'name': f"Device {reading['device_id']}",
+        'status': 'active',
+        'last_seen': reading.get('created_at'),
+        'measured_at': reading_time(reading),
+        'latitude': reading.get('latitude'),
+        'longitude': reading.get('longitude')
+    } for reading in latest_readings]
+
+
+def build_dashboard(sections: List[str], limit: int = 50) -> Dict[str, Any]:
+    """
+    Every dashboard view from one query, in one pass over the rows
+
+    The newest ``max(limit, 1000)`` readings are fetched once (with the
+    exact row count when the fleet snapshot cannot supply it) and each
+    row is scored once. Latest-per-device views come from the snapshot
+    when it is current, else from the fetched rows.
+    """
+    counters = fleet_snapshot.counters() if fleet_snapshot.is_fresh() else None
+    rows, total = supabase_service.get_readings_with_count(
+        limit=max(limit, STATISTICS_WINDOW), exact_count=counters is None
+    )
+    if counters is not None:
+        total = counters['total_readings']
+
+    quality_summary = {'good': 0, 'warning': 0, 'danger': 0}
+    latest_by_device: Dict[str, Dict[str, Any]] = {}
+    for index, reading in enumerate(rows):
+        reading['quality'] = quality = supabase_service.determine_water_quality(reading)
+        if index < STATISTICS_WINDOW:
+            quality_summary[quality] = quality_summary.get(quality, 0) + 1
+        latest_by_device.setdefault(reading['device_id'], reading)
+
+    latest = None
+    if 'heatmap' in sections or 'devices' in sections:
+        latest = fleet_snapshot.latest() or list(latest_by_device.values())
+
+    # Starting point for /readings/changes polling. The snapshot's cursor
+    # matches its total; otherwise the ids just below the newest are read
+    # so the ones not committed yet stay open.
+    if counters is not None:
+        cursor = counters['cursor']
+    else:
+        top = max((reading['id'] for reading in rows), default=0)
+        recent = IdCursor(max(top - MAX_OPEN_GAPS, 0))
+        recent.advance(supabase_service.get_readings_after(recent.last, limit=MAX_OPEN_GAPS))
+        cursor = recent.encode()
+    dashboard: Dict[str, Any] = {'generated_at': to_iso(utc_now()), 'sections': sections,
+                                 'cursor': cursor}
+    if 'readings' in sections:
+        dashboard['readings'] = {'count': min(limit, len(rows)), 'limit': limit, 'offset': 0,
+                                 'readings': rows[:limit]}
+    if 'statistics' in sections:
+        window_devices = list({r['device_id']: None for r in rows[:STATISTICS_WINDOW]})
+        dashboard['statistics'] = {
+            'total_readings': total or 0,
+            'unique_devices': len(window_devices),
+            'device_list': window_devices,
+            'quality_summary': quality_summary,
+            'latest_reading': rows[0] if rows else None,
+            'timestamp': to_iso(utc_now())
+        }
+    if 'alerts' in sections:
+        alerts = build_alerts(rows[:ALERTS_WINDOW])
+        dashboard['alerts'] = {'count': len(alerts), 'alerts': alerts}
+    if 'heatmap' in sections:
+        points = build_heatmap(latest)
+        dashboard['heatmap'] = {'count': len(points), 'heatmap': points}
+    if 'devices' in sections:
+        devices = build_devices(latest)
+        dashboard['devices'] = {'count': len(devices), 'devices': devices}
+    return dashboard
+
+
+def build_changes(since: IdCursor, max_readings: int) -> Dict[str, Any]:
+    """
+    Everything the client has not seen since cursor ``since``, for incremental polling
+
+    The cursor is the highest reading id the client has seen plus the ids
+    below it that had not committed yet (see ``IdCursor``); those are
+    re-read until they appear or settle. Alerts are derived from
+    readings, so the new alerts are those of the new readings, and the
+    devices that changed are those with new readings. More than
+    ``max_readings`` new readings sets ``resync_required``; the client
+    should reload with /dashboard instead.
+    """
+    newer = supabase_service.get_readings_after(since.last, limit=max_readings + 1)
+    if len(newer) > max_readings:
+        return {'cursor': since.encode(), 'resync_required': True, 'count': 0,
+                'readings': [], 'alerts': [], 'devices': []}
+    rows = supabase_service.get_readings_by_ids(since.open_gaps()) + newer
+    since.advance(rows)
+
+    latest_by_device: Dict[str, Dict[str, Any]] = {}
+    for reading in rows:
+        reading['quality'] = supabase_service.determine_water_quality(reading)
+        current = latest_by_device.get(reading['device_id'])
+        if current is None or str(reading_time(reading) or '') >= str(reading_time(current) or ''):
+            latest_by_device[reading['device_id']] = reading
+
+    # Newest measurement first, like /readings
+    readings = sorted(rows, key=lambda r: str(reading_time(r) or ''), reverse=True)
+    return {
+        'cursor': since.encode(),
+        'resync_required': False,
+        'count': len(readings),
+        'readings': readings,
+        'alerts': build_alerts(readings),
+        'devices': build_devices(list(latest_by_device.values())),
+    }
+
+
+def _heatmap_job():
+    return build_heatmap(build_latest())
+
+
+def _fleet_snapshot_job():
+    return fleet_snapshot.refresh(supabase_service)
+
+
+def _alerts_job():
+    return build_alerts(supabase_service.get_readings(limit=100))
+
+
+def _rollup_job():
+    from services.retention import CompactionJob
+    return CompactionJob(supabase_service).rollup_new()
+
+
+def _compaction_job():
+    from services.retention import CompactionJob
+    return CompactionJob(supabase_service).run()
+
+
+def _calibration_job():
+    from services.calibration import calibration_drift
+    return calibration_drift.run()
+
+
+def register_jobs():
+    """Register the precomputed views and maintenance jobs"""
+    views = Config.PRECOMPUTE_INTERVAL_SECONDS
+    if views > 0:
+        scheduler.register('statistics', build_statistics, views, on_ingest=True)
+        scheduler.register('fleet_snapshot', _fleet_snapshot_job, views,
+                           on_ingest=True, min_interval=1.0)
+        scheduler.register('heatmap', _heatmap_job, views, on_ingest=True)
+        scheduler.register('alerts', _alerts_job, views, on_ingest=True)
+
+    if Config.ROLLUP_INTERVAL_SECONDS > 0:
+        scheduler.register('rollup', _rollup_job, Config.ROLLUP_INTERVAL_SECONDS)
+    if Config.COMPACTION_INTERVAL_SECONDS > 0:
+        scheduler.register('compaction', _compaction_job, Config.COMPACTION_INTERVAL_SECONDS,
+                           timeout=Config.COMPACTION_INTERVAL_SECONDS / 2)
+    if Config.CALIBRATION_INTERVAL_SECONDS > 0:
+        scheduler.register('calibration', _calibration_job, Config.CALIBRATION_INTERVAL_SECONDS)
+
+
+def start_background_jobs():
+    register_jobs()
+    scheduler.start()
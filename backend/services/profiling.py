@@ -0,0 +1,425 @@
+"""
+Profiling - on-demand profiles of individual API requests
+
+A request is profiled when one of these holds:
+
+* it carries a valid ``X-Profile`` header, ``<expires>:<signature>`` where
+  the signature is ``sign('<METHOD> <path>', expires)`` with
+  ``PROFILING_SECRET``, e.g.::
+
+      python -c "from services.profiling import header; print(header('GET', '/api/statistics'))"
+
+* an admin toggle is active (``POST /api/admin/profiling``, signed the same
+  way for the subject ``admin``) and the request falls in its sample
+  (``sample_rate``, optional ``path_prefix``, until ``expires_at``). The
+  toggle is a file in ``SCHEDULER_STATE_DIR``, so it reaches every worker;
+* ``PROFILING_SAMPLE_RATE`` is above 0 and the request falls in it.
+
+The request runs under cProfile (``.prof``, open with ``pstats`` or
+snakeviz) or, with mode ``sample`` or while another request in the worker
+holds cProfile, under a stack sampler (``.folded`` collapsed stacks for
+flamegraph.pl or speedscope). Next to the profile a ``.json`` summary
+lists the SupabaseService calls the request made and their timings, plus
+the top functions. Files go to ``PROFILING_DIR`` (``logs/profiles``), the
+oldest beyond ``PROFILING_MAX_FILES`` profiles are removed, and the
+response carries the file stem in ``X-Profile-Id``.
+"""
+
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config.settings import Config
+from services.metrics import registry, observe_queries
+
+logger = logging.getLogger(__name__)
+
+PROFILED_REQUESTS = registry.counter(
+    'profiled_requests_total',
+    'Requests run under the profiler by trigger (signed, toggle, sampled)',
+    ('trigger',)
+)
+
+MODES = ('cprofile', 'sample')
+TOGGLE_MAX_SECONDS = 3600
+TOP_FUNCTIONS = 25
+MAX_QUERY_CALLS = 500
+
+# Queries made by the profiled request running on this thread
+_active = threading.local()
+# cProfile hooks the interpreter; one profiled request per worker at a time
+_cprofile_lock = threading.Lock()
+
+
+def sign(subject: str, expires: int, secret: Optional[str] = None) -> str:
+    secret = Config.PROFILING_SECRET if secret is None else secret
+    message = f'{expires}:{subject}'.encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def header(method: str, path: str, ttl_seconds: int = 300) -> str:
+    """``X-Profile`` value for one request to ``path``"""
+    expires = int(time.time()) + ttl_seconds
+    return f'{expires}:{sign(f"{method.upper()} {path}", expires)}'
+
+
+def verify(value: Optional[str], subject: str) -> bool:
+    """True if ``value`` is an unexpired signature of ``subject``"""
+    if not value or not Config.PROFILING_SECRET:
+        return False
+    expires, _, signature = value.partition(':')
+    try:
+        if int(expires) < time.time():
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(signature, sign(subject, int(expires)))
+
+
+def _record_query(name: str, seconds: float):
+    queries = getattr(_active, 'queries', None)
+    if queries is not None:
+        queries.append((name, seconds))
+
+
+observe_queries(_record_query)
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer into collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Tally = Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    @staticmethod
+    def _label(frame) -> str:
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def top_functions(self) -> List[Dict[str, Any]]:
+        """Frames by share of samples on the stack (inclusive) and at its top (self)"""
+        total = sum(self.stacks.values()) or 1
+        inclusive, leaf = Tally(), Tally()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            for frame in set(frames):
+                inclusive[frame] += count
+            leaf[frames[-1]] += count
+        return [{
+            'function': frame,
+            'inclusive_pct': round(100.0 * count / total, 1),
+            'self_pct': round(100.0 * leaf[frame] / total, 1),
+        } for frame, count in inclusive.most_common(TOP_FUNCTIONS)]
+
+
+class RequestProfiler:
+    """Decides which requests to profile and writes their profiles"""
+
+    def __init__(self, output_dir: str, state_dir: str, max_files: int):
+        self.output_dir = output_dir
+        self.state_path = os.path.join(state_dir, 'profiling.json')
+        self.max_files = max_files
+        self._toggle: Optional[Dict[str, Any]] = None
+        self._toggle_mtime: Optional[float] = None
+        self._toggle_checked = 0.0
+
+    # ------------------------------------------------------------------ toggle
+
+    def toggle(self) -> Optional[Dict[str, Any]]:
+        """The active admin toggle (re-read at most once a second), or None"""
+        now = time.monotonic()
+        if now - self._toggle_checked >= 1.0:
+            self._toggle_checked = now
+            try:
+                mtime = os.path.getmtime(self.state_path)
+            except OSError:
+                mtime = None
+            if mtime != self._toggle_mtime:
+                self._toggle_mtime = mtime
+                try:
+                    with open(self.state_path) as f:
+                        self._toggle = json.load(f)
+                except (OSError, ValueError):
+                    self._toggle = None
+        toggle = self._toggle
+        if toggle is None or toggle.get('expires_at', 0) < time.time():
+            return None
+        return toggle
+
+    def set_toggle(self, sample_rate: float, mode: str = 'cprofile', path_prefix: str = '',
+                   duration_seconds: float = 600) -> Dict[str, Any]:
+        toggle = {
+            'sample_rate': sample_rate,
+            'mode': mode,
+            'path_prefix': path_prefix,
+            'expires_at': time.time() + duration_seconds,
+        }
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f'{self.state_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(toggle, f)
+        os.replace(tmp, self.state_path)
+        self._toggle, self._toggle_mtime = toggle, os.path.getmtime(self.state_path)
+        logger.info(f"🔬 Profiling toggle set: {toggle}")
+        return toggle
+
+    def clear_toggle(self):
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        self._toggle, self._toggle_mtime = None, None
+
+    # ------------------------------------------------------------------ deciding
+
+    def trigger(self, request) -> Optional[tuple]:
+        """``(trigger, mode)`` if this request should be profiled"""
+        mode = request.headers.get('X-Profile-Mode', Config.PROFILING_MODE)
+        if verify(request.headers.get('X-Profile'), f'{request.method} {request.path}'):
+            return 'signed', mode
+        toggle = self.toggle()
+        if toggle is not None:
+            if request.path.startswith(toggle.get('path_prefix') or '') \
+                    and random.random() < toggle.get('sample_rate', 0):
+                return 'toggle', toggle.get('mode', mode)
+            return None
+        if Config.PROFILING_SAMPLE_RATE > 0 and random.random() < Config.PROFILING_SAMPLE_RATE:
+            return 'sampled', Config.PROFILING_MODE
+        return None
+
+    # ------------------------------------------------------------------ running
+
+    def start(self, trigger: str, mode: str) -> Dict[str, Any]:
+        state = {'trigger': trigger, 'mode': mode, 'profiler': None, 'sampler': None,
+                 'started': time.perf_counter()}
+        if mode != 'sample' and _cprofile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                state['profiler'] = profiler
+                state['mode'] = 'cprofile'
+            except ValueError:  # another profiling tool is active in this interpreter
+                _cprofile_lock.release()
+        if state['profiler'] is None:
+            state['mode'] = 'sample'
+            sampler = StackSampler(threading.get_ident(), Config.PROFILING_SAMPLE_INTERVAL_SECONDS)
+            sampler.start()
+            state['sampler'] = sampler
+        _active.queries = []
+        return state
+
+    def stop(self, state: Dict[str, Any]) -> List[tuple]:
+        """Stop collecting; idempotent"""
+        if state.get('stopped'):
+            return state['queries']
+        state['stopped'] = True
+        state['duration'] = time.perf_counter() - state['started']
+        if state['profiler'] is not None:
+            state['profiler'].disable()
+            _cprofile_lock.release()
+        if state['sampler'] is not None:
+            state['sampler'].stop()
+        state['queries'] = getattr(_active, 'queries', None) or []
+        _active.queries = None
+        return state['queries']
+
+    @staticmethod
+    def _query_summary(queries: List[tuple]) -> Dict[str, Any]:
+        by_method: Dict[str, Dict[str, Any]] = {}
+        for name, seconds in queries:
+            entry = by_method.setdefault(name, {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['calls'] += 1
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+        for entry in by_method.values():
+            entry['total_seconds'] = round(entry['total_seconds'], 6)
+            entry['max_seconds'] = round(entry['max_seconds'], 6)
+        return {
+            'count': len(queries),
+            'total_seconds': round(sum(seconds for _, seconds in queries), 6),
+            'by_method': dict(sorted(by_method.items(), key=lambda item: -item[1]['total_seconds'])),
+            'calls': [[name, round(seconds, 6)] for name, seconds in queries[:MAX_QUERY_CALLS]],
+        }
+
+    @staticmethod
+    def _cprofile_top(profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': f'{name} ({os.path.basename(filename)}:{line})',
+                'calls': calls,
+                'self_seconds': round(total, 6),
+                'cumulative_seconds': round(cumulative, 6),
+            })
+        rows.sort(key=lambda row: -row['cumulative_seconds'])
+        return rows[:TOP_FUNCTIONS]
+
+    def _stem(self, request) -> str:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        route = re.sub(r'[^A-Za-z0-9]+', '_', request.endpoint or request.path).strip('_')[:60]
+        return f'{stamp}_{request.method}_{route}_{os.getpid()}'
+
+    def write(self, state: Dict[str, Any], request, status: int) -> str:
+        """Write the profile and its summary; returns the file stem"""
+        queries = self.stop(state)
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = self._stem(request)
+        base = os.path.join(self.output_dir, stem)
+
+        if state['profiler'] is not None:
+            profile_file = f'{stem}.prof'
+            state['profiler'].dump_stats(f'{base}.prof')
+            top = self._cprofile_top(state['profiler'])
+        else:
+            profile_file = f'{stem}.folded'
+            state['sampler'].write(f'{base}.folded')
+            top = state['sampler'].top_functions()
+
+        summary = {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': status,
+            'trigger': state['trigger'],
+            'mode': state['mode'],
+            'duration_seconds': round(state['duration'], 6),
+            'pid': os.getpid(),
+            'profile_file': profile_file,
+            'supabase': self._query_summary(queries),
+            'top_functions': top,
+        }
+        with open(f'{base}.json', 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        PROFILED_REQUESTS.labels(state['trigger']).inc()
+        logger.info(f"🔬 Profiled {request.method} {request.path} in {summary['duration_seconds']}s "
+                    f"({summary['supabase']['count']} Supabase calls) -> {profile_file}")
+        self._prune()
+        return stem
+
+    def _prune(self):
+        try:
+            summaries = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.json'))
+        except OSError:
+            return
+        for name in summaries[:max(0, len(summaries) - self.max_files)]:
+            stem = name[:-len('.json')]
+            for suffix in ('.json', '.prof', '.folded'):
+                try:
+                    os.remove(os.path.join(self.output_dir, stem + suffix))
+                except OSError:
+                    pass
+
+    def recent(self, limit: int = 20) -> List[str]:
+        try:
+            summaries = sorted((name for name in os.listdir(self.output_dir) if name.endswith('.json')),
+                               reverse=True)
+        except OSError:
+            return []
+        return [name[:-len('.json')] for name in summaries[:limit]]
+
+
+# Singleton instance
+request_profiler = RequestProfiler(
+    Config.PROFILING_DIR,
+    state_dir=Config.SCHEDULER_STATE_DIR,
+    max_files=Config.PROFILING_MAX_FILES
+)
+
+
+def init_app(app):
+    """Profile selected requests and serve ``/api/admin/profiling``"""
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def _start_profile():
+        decision = request_profiler.trigger(request)
+        if decision is not None:
+            g._profile = request_profiler.start(*decision)
+
+    @app.after_request
+    def _write_profile(response):
+        state = g.pop('_profile', None)
+        if state is not None:
+            try:
+                response.headers['X-Profile-Id'] = request_profiler.write(state, request, response.status_code)
+            except Exception as e:
+                logger.error(f"❌ Error writing profile: {str(e)}")
+        return response
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        # Requests that ended in an unhandled exception never reach after_request
+        state = g.pop('_profile', None)
+        if state is not None:
+            request_profiler.stop(state)
+
+    @app.route('/api/admin/profiling', methods=['GET', 'POST', 'DELETE'])
+    def profiling_toggle():
+        """Show, set or clear the profiling toggle for every worker"""
+        if not verify(request.headers.get('X-Profile-Admin'), 'admin'):
+            return jsonify({'error': 'Valid X-Profile-Admin signature required'}), 403
+
+        if request.method == 'POST':
+            body = request.get_json(silent=True) or {}
+            try:
+                sample_rate = float(body.get('sample_rate', 1.0))
+                duration = float(body.get('duration_seconds', 600))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'sample_rate and duration_seconds must be numbers'}), 400
+            mode = body.get('mode', Config.PROFILING_MODE)
+            if not 0 < sample_rate <= 1 or not 0 < duration <= TOGGLE_MAX_SECONDS or mode not in MODES:
+                return jsonify({
+                    'error': f'sample_rate must be in (0, 1], duration_seconds in (0, {TOGGLE_MAX_SECONDS}], '
+                             f'mode one of {list(MODES)}'
+                }), 400
+            request_profiler.set_toggle(sample_rate, mode, str(body.get('path_prefix') or ''), duration)
+        elif request.method == 'DELETE':
+            request_profiler.clear_toggle()
+
+        return jsonify({
+            'toggle': request_profiler.toggle(),
+            'default_sample_rate': Config.PROFILING_SAMPLE_RATE,
+            'output_dir': request_profiler.output_dir,
+            'recent': request_profiler.recent(),
+        })
@@ -0,0 +1,243 @@
+"""
+Rate Limiting - token buckets for ingest and load shedding for reads
+
+Ingest is limited by one token bucket per device plus a global bucket, so
+a device posting in a tight loop is throttled long before it can exhaust
+the Supabase quota for everyone else. A device's bucket is charged one
+token per request, whatever its size, so a store-and-forward backfill of
+up to ``INGEST_MAX_BATCH`` readings goes through in one go; the global
+bucket is charged one token per reading and protects the quota.
+
+Reads are split into priority lanes. The load shedder follows an EWMA of
+Supabase query latency; above ``LOAD_SHED_LATENCY_BUDGET_SECONDS`` it
+rejects the ``low`` lane (history, export, heatmap), above twice the
+budget the ``high`` lane (the dashboard's own reads) too. ``critical``
+(ingest, health, writes) is never shed. Only queries made by ``high``
+lane requests feed the EWMA: scheduler jobs, exports and other slow
+background work in the same worker do not shed the dashboard. When the
+high lane is shed its queries stop, the EWMA goes stale and is ignored,
+so traffic resumes on its own.
+
+State is per worker process: with N gunicorn workers the effective global
+rate is N × ``GLOBAL_INGEST_RATE_PER_SECOND``.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from config.settings import Config
+from services.metrics import registry, register_stats_gauges, observe_queries
+
+logger = logging.getLogger(__name__)
+
+# No device label: throttled clients are the ones that rotate device ids
+THROTTLED_READINGS = registry.counter(
+    'ingest_throttled_total',
+    'Readings rejected by a rate limit',
+    ('scope',)
+)
+SHED_REQUESTS = registry.counter(
+    'http_requests_shed_total',
+    'Requests rejected by the load shedder',
+    ('lane',)
+)
+
+LANES = ('critical', 'high', 'low')
+
+# Lane of the request running on this thread (unset outside requests)
+_request_lane = threading.local()
+
+
+class TokenBucket:
+    """Classic token bucket; refilled lazily when tokens are taken"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they are)"""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float, now: float) -> float:
+        """Take ``amount`` tokens; returns 0 or the seconds until they'd be available"""
+        wait = self.wait(amount, now)
+        if not wait:
+            self.tokens -= amount
+        return wait
+
+    def give_back(self, amount: float):
+        self.tokens = min(self.burst, self.tokens + amount)
+
+
+class IngestLimiter:
+    """Per-device buckets (LRU bounded) behind one global bucket"""
+
+    def __init__(self, device_rate: float, device_burst: float,
+                 global_rate: float, global_burst: float,
+                 max_devices: int = 100000, enabled: bool = True):
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.max_devices = max_devices
+        self.enabled = enabled
+        self._global = TokenBucket(global_rate, global_burst, time.monotonic())
+        self._devices: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._allowed = 0
+        self._throttled = {'device': 0, 'global': 0}
+
+    def _bucket(self, device_id: str, now: float) -> TokenBucket:
+        bucket = self._devices.get(device_id)
+        if bucket is None:
+            bucket = TokenBucket(self.device_rate, self.device_burst, now)
+            self._devices[device_id] = bucket
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_id)
+        return bucket
+
+    def admit(self, readings: List[Dict[str, Any]]) -> Tuple[List[int], List[int], float]:
+        """
+        Decide which readings of one request may be stored
+
+        Each device in the request takes one token from its bucket, each
+        reading one from the global bucket. Returns ``(admitted indices,
+        throttled indices, retry_after)`` where ``retry_after`` is the wait
+        until every throttled reading would be admitted.
+        """
+        if not self.enabled:
+            return list(range(len(readings))), [], 0.0
+
+        by_device: Dict[str, List[int]] = {}
+        for index, reading in enumerate(readings):
+            by_device.setdefault(reading['device_id'], []).append(index)
+
+        admitted, throttled = [], []
+        retry_after = 0.0
+        short = 0  # readings the global bucket had no token for
+        with self._lock:
+            now = time.monotonic()
+            for device_id, indices in by_device.items():
+                bucket = self._bucket(device_id, now)
+                wait = bucket.take(1, now)
+                if wait:
+                    retry_after = max(retry_after, wait)
+                    self._throttle(device_id, 'device', indices, throttled)
+                    continue
+                # The global bucket runs dry partway: the denied readings are the tail
+                denied = [index for index in indices if self._global.take(1, now)]
+                if len(denied) == len(indices):
+                    bucket.give_back(1)
+                if denied:
+                    short += len(denied)
+                    self._throttle(device_id, 'global', denied, throttled)
+                admitted.extend(indices[:len(indices) - len(denied)])
+            if short:
+                retry_after = max(retry_after, self._global.wait(short, now))
+            self._allowed += len(admitted)
+        admitted.sort()
+        throttled.sort()
+        return admitted, throttled, retry_after
+
+    def _throttle(self, device_id: str, scope: str, indices: List[int], throttled: List[int]):
+        throttled.extend(indices)
+        self._throttled[scope] += len(indices)
+        THROTTLED_READINGS.labels(scope).inc(len(indices))
+        logger.info("Ingest throttled", extra={'device_id': device_id, 'scope': scope,
+                                               'readings': len(indices)})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'devices': len(self._devices),
+                'allowed': self._allowed,
+                'throttled_device': self._throttled['device'],
+                'throttled_global': self._throttled['global'],
+                'global_tokens': round(self._global.tokens, 1),
+            }
+
+
+class LoadShedder:
+    """EWMA of upstream latency → which read lanes to reject"""
+
+    def __init__(self, budget_seconds: float, alpha: float = 0.2, stale_after: float = 10.0):
+        self.budget = budget_seconds
+        self.alpha = alpha
+        self.stale_after = stale_after
+        self._ewma = 0.0
+        self._updated = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self, lane: str):
+        """Mark this thread as serving a request in ``lane``"""
+        _request_lane.lane = lane
+
+    def end(self):
+        _request_lane.lane = None
+
+    def observe(self, name: str, seconds: float):
+        if getattr(_request_lane, 'lane', None) != 'high':
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._updated > self.stale_after:
+                self._ewma = seconds
+            else:
+                self._ewma += self.alpha * (seconds - self._ewma)
+            self._updated = now
+
+    def latency(self) -> float:
+        """Smoothed upstream latency (0 once no query has run for a while)"""
+        if time.monotonic() - self._updated > self.stale_after:
+            return 0.0
+        return self._ewma
+
+    def should_shed(self, lane: str) -> bool:
+        if lane == 'critical' or self.budget <= 0:
+            return False
+        latency = self.latency()
+        limit = self.budget if lane == 'low' else 2 * self.budget
+        if latency > limit:
+            SHED_REQUESTS.labels(lane).inc()
+            return True
+        return False
+
+    def retry_after(self) -> int:
+        return int(math.ceil(self.stale_after))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'upstream_latency_seconds': round(self.latency(), 4), 'budget_seconds': self.budget}
+
+
+# Singleton instances
+ingest_limiter = IngestLimiter(
+    device_rate=Config.DEVICE_RATE_PER_SECOND,
+    device_burst=Config.DEVICE_BURST,
+    global_rate=Config.GLOBAL_INGEST_RATE_PER_SECOND,
+    global_burst=Config.GLOBAL_INGEST_BURST,
+    max_devices=Config.RATE_LIMIT_MAX_DEVICES,
+    enabled=Config.RATE_LIMIT_ENABLED
+)
+load_shedder = LoadShedder(budget_seconds=Config.LOAD_SHED_LATENCY_BUDGET_SECONDS)
+
+observe_queries(load_shedder.observe)
+register_stats_gauges('ingest_limiter', 'Ingest token buckets', ingest_limiter.stats)
+register_stats_gauges('load_shedder', 'Read load shedder', load_shedder.stats)
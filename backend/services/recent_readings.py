@@ -0,0 +1,245 @@
+"""
+Recent Readings - per-device ring buffers of the latest readings
+
+Each device gets a fixed-size NumPy structured array holding its newest
+readings by measurement time.
+One record is ``RECORD_DTYPE.itemsize`` bytes (122 bytes: id, measured_at
+and created_at as 32 ASCII bytes each, six float64 sensor/location values,
+a quality code and a bitmask of imputed sensors), so with the default
+capacity of 256 readings a device costs about 30.5 KiB. The measured
+values behind imputed sensors are rare and live in a small dict per
+buffer instead. At most ``RECENT_BUFFER_MAX_DEVICES`` buffers are kept
+(least recently used devices are evicted), which caps the total at
+roughly capacity × itemsize × max_devices (≈ 298 MiB for 10,000 devices).
+
+Buffers are filled at ingest and warmed from Supabase the first time a
+device is read. Readings ingested by other processes (other gunicorn
+workers, the ingest gateway) only reach this one's buffers when they are
+re-warmed, which happens on the first read more than
+``RECENT_BUFFER_REFRESH_SECONDS`` after the last warm.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+from config.settings import Config
+from services.imputation import SENSOR_FIELDS as IMPUTABLE_FIELDS
+from services.metrics import register_stats_gauges
+from services.timestamps import reading_time
+
+
+RECORD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('measured_at', 'S32'),
+    ('created_at', 'S32'),
+    ('temperature', '<f8'),
+    ('ph', '<f8'),
+    ('tds', '<f8'),
+    ('turbidity', '<f8'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('quality', 'u1'),
+    ('imputed', 'u1'),  # bit i set: IMPUTABLE_FIELDS[i] was imputed
+])
+
+SENSOR_FIELDS = ('temperature', 'ph', 'tds', 'turbidity', 'latitude', 'longitude')
+
+QUALITY_CODES = {'unknown': 0, 'good': 1, 'warning': 2, 'danger': 3}
+QUALITY_NAMES = {code: name for name, code in QUALITY_CODES.items()}
+
+
+def imputed_mask(reading: Dict[str, Any]) -> int:
+    imputed = reading.get('imputed') or ()
+    return sum(1 << bit for bit, field in enumerate(IMPUTABLE_FIELDS) if field in imputed)
+
+
+def imputed_fields(mask: int) -> Optional[List[str]]:
+    """``imputed`` as stored: the field names, or None when nothing was imputed"""
+    return [field for bit, field in enumerate(IMPUTABLE_FIELDS) if mask & (1 << bit)] or None
+
+
+class DeviceRingBuffer:
+    """
+    Fixed-capacity buffer of a device's newest readings by measurement time
+
+    Late uploads arrive out of order, so when the buffer is full a new
+    reading replaces the one measured earliest, and a reading measured
+    before everything kept is dropped. A backfill burst therefore cannot
+    push newer readings out.
+    """
+
+    __slots__ = ('device_id', 'capacity', '_records', '_size', '_raw_values', 'warmed_at')
+
+    def __init__(self, device_id: str, capacity: int):
+        self.device_id = device_id
+        self.capacity = capacity
+        self._records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self._size = 0
+        self._raw_values: Dict[int, Dict[str, Any]] = {}  # reading id -> measured values
+        self.warmed_at: Optional[float] = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._records.nbytes
+
+    def append(self, reading: Dict[str, Any], quality: str):
+        """Store a reading, replacing the earliest measured one when full"""
+        reading_id = int(reading['id'])
+        if np.any(self._records['id'][:self._size] == reading_id):
+            return
+
+        measured_at = str(reading_time(reading) or '').encode('ascii', 'ignore')[:32]
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._records['measured_at']))
+            if measured_at < self._records['measured_at'][slot]:
+                return  # older than everything kept
+            self._raw_values.pop(int(self._records['id'][slot]), None)
+
+        record = self._records[slot]
+        record['id'] = reading_id
+        record['measured_at'] = measured_at
+        record['created_at'] = str(reading.get('created_at') or '').encode('ascii', 'ignore')[:32]
+        for field in SENSOR_FIELDS:
+            value = reading.get(field)
+            record[field] = np.nan if value is None else float(value)
+        record['quality'] = QUALITY_CODES.get(quality, 0)
+        record['imputed'] = imputed_mask(reading)
+        if record['imputed']:
+            self._raw_values[reading_id] = reading.get('raw_values')
+
+    def clear(self):
+        self._size = 0
+        self._raw_values.clear()
+
+    def _to_dict(self, record) -> Dict[str, Any]:
+        reading = {
+            'id': int(record['id']),
+            'device_id': self.device_id,
+            'measured_at': record['measured_at'].decode('ascii'),
+            'created_at': record['created_at'].decode('ascii'),
+            'quality': QUALITY_NAMES[int(record['quality'])],
+        }
+        for field in SENSOR_FIELDS:
+            value = float(record[field])
+            reading[field] = None if np.isnan(value) else value
+        if reading['tds'] is not None:
+            reading['tds'] = int(reading['tds'])
+        reading['imputed'] = imputed_fields(int(record['imputed']))
+        reading['raw_values'] = self._raw_values.get(reading['id']) if reading['imputed'] else None
+        return reading
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Up to ``limit`` readings, newest measured first"""
+        records = self._records[:self._size]
+        # Newest measurement first; equal times by id, last stored first
+        order = np.lexsort((records['id'], records['measured_at']))[::-1][:limit]
+        return [self._to_dict(record) for record in records[order]]
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        readings = self.recent(1)
+        return readings[0] if readings else None
+
+
+class RecentReadingsCache:
+    """Bounded map of device id → ring buffer, shared by the request handlers"""
+
+    def __init__(self, capacity: int, max_devices: int, refresh_seconds: float = 0):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.refresh_seconds = refresh_seconds
+        self._buffers: "OrderedDict[str, DeviceRingBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _buffer(self, device_id: str) -> DeviceRingBuffer:
+        """Get or create a buffer; caller holds the lock"""
+        buffer = self._buffers.get(device_id)
+        if buffer is None:
+            buffer = DeviceRingBuffer(device_id, self.capacity)
+            self._buffers[device_id] = buffer
+            while len(self._buffers) > self.max_devices:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(device_id)
+        return buffer
+
+    def record(self, reading: Dict[str, Any], quality: str):
+        """Add a freshly ingested reading"""
+        with self._lock:
+            self._buffer(reading['device_id']).append(reading, quality)
+
+    def _is_warm(self, buffer: Optional[DeviceRingBuffer]) -> bool:
+        if buffer is None or buffer.warmed_at is None:
+            return False
+        if self.refresh_seconds and time.monotonic() - buffer.warmed_at > self.refresh_seconds:
+            return False
+        return True
+
+    def get_recent(self, device_id: str, limit: int,
+                   loader: Callable[[str, int], List[Dict[str, Any]]],
+                   quality_fn: Callable[[Dict[str, Any]], str]) -> List[Dict[str, Any]]:
+        """
+        Newest-first readings for a device, warming the buffer on a miss
+
+        ``loader(device_id, n)`` fetches the newest ``n`` stored readings and
+        ``quality_fn`` scores them while warming.
+        """
+        limit = min(limit, self.capacity)
+
+        with self._lock:
+            buffer = self._buffers.get(device_id)
+            if self._is_warm(buffer):
+                self._buffers.move_to_end(device_id)
+                self.hits += 1
+                return buffer.recent(limit)
+            self.misses += 1
+
+        # Fetch outside the lock so a slow query does not block ingest
+        stored = loader(device_id, self.capacity)
+
+        with self._lock:
+            buffer = self._buffer(device_id)
+            # Merge with anything ingested meanwhile, keeping the newest readings
+            merged = {reading['id']: reading for reading in buffer.recent(self.capacity)}
+            for reading in stored:
+                if reading['id'] not in merged:
+                    merged[reading['id']] = {**reading, 'quality': quality_fn(reading)}
+            newest = sorted(merged.values(), key=lambda r: str(reading_time(r) or ''))
+            buffer.clear()
+            for reading in newest[-self.capacity:]:
+                buffer.append(reading, reading['quality'])
+            buffer.warmed_at = time.monotonic()
+            return buffer.recent(limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            devices = len(self._buffers)
+            return {
+                'devices': devices,
+                'capacity_per_device': self.capacity,
+                'bytes_per_device': self.capacity * RECORD_DTYPE.itemsize,
+                'bytes_total': devices * self.capacity * RECORD_DTYPE.itemsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Singleton instance
+recent_readings = RecentReadingsCache(
+    capacity=Config.RECENT_BUFFER_CAPACITY,
+    max_devices=Config.RECENT_BUFFER_MAX_DEVICES,
+    refresh_seconds=Config.RECENT_BUFFER_REFRESH_SECONDS
+)
+
+register_stats_gauges('recent_readings', 'Recent readings ring buffers', recent_readings.stats)
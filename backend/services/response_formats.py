@@ -0,0 +1,193 @@
+"""
+Response encoding - content negotiation and compression for reading lists
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from flask import Response, jsonify
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+# Optional encoders - the API falls back to JSON when they are not installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MIMETYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'csv': 'text/csv',
+}
+
+# Accept header aliases → format name
+ACCEPT_ALIASES = {
+    'application/json': 'json',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/vnd.apache.arrow.file': 'arrow',
+    'text/csv': 'csv',
+}
+
+
+class UnsupportedFormat(ValueError):
+    """Raised when the client explicitly asks for a format we cannot produce"""
+
+
+def available_formats() -> List[str]:
+    """Formats that can be produced with the installed libraries"""
+    formats = ['json', 'csv']
+    if msgpack is not None:
+        formats.append('msgpack')
+    if pa is not None:
+        formats.append('arrow')
+    return formats
+
+
+def negotiate_format(req) -> str:
+    """Pick a response format from ?format= or the Accept header"""
+    explicit = req.args.get('format')
+    if explicit:
+        explicit = explicit.lower()
+        if explicit not in available_formats():
+            raise UnsupportedFormat(
+                f"Unsupported format '{explicit}'. Available: {available_formats()}"
+            )
+        return explicit
+
+    for mimetype, _quality in req.accept_mimetypes:
+        fmt = ACCEPT_ALIASES.get(mimetype)
+        if fmt and fmt in available_formats():
+            return fmt
+
+    return 'json'
+
+
+def to_columns(readings: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Pivot a list of reading rows into one array per column"""
+    columns: Dict[str, List[Any]] = {}
+    for index, reading in enumerate(readings):
+        for key in reading:
+            if key not in columns:
+                # Backfill a column first seen part-way through
+                columns[key] = [None] * index
+        for key, values in columns.items():
+            values.append(reading.get(key))
+    return columns
+
+
+def _encode_msgpack(meta: Dict[str, Any], columns: Dict[str, List[Any]]) -> bytes:
+    return msgpack.packb({**meta, 'columns': columns}, use_bin_type=True)
+
+
+def _encode_arrow(meta: Dict[str, Any], columns: Dict[str, List[Any]]) -> bytes:
+    table = pa.table(columns) if columns else pa.table({})
+    table = table.replace_schema_metadata(
+        {key: json.dumps(value) for key, value in meta.items()}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _encode_csv(columns: Dict[str, List[Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    names = list(columns)
+    writer.writerow(names)
+    writer.writerows(zip(*(columns[name] for name in names)))
+    return buffer.getvalue().encode('utf-8')
+
+
+def encode_body(fmt: str, meta: Dict[str, Any], readings: List[Dict[str, Any]]) -> bytes:
+    """Encode readings in one of the columnar formats"""
+    columns = to_columns(readings)
+    if fmt == 'msgpack':
+        return _encode_msgpack(meta, columns)
+    if fmt == 'arrow':
+        return _encode_arrow(meta, columns)
+    if fmt == 'csv':
+        return _encode_csv(columns)
+    raise UnsupportedFormat(f"Unsupported format '{fmt}'")
+
+
+def choose_encoding(req) -> Optional[str]:
+    """Pick a content-encoding from Accept-Encoding (brotli preferred)"""
+    accepted = req.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response: Response, req) -> Response:
+    """Compress a response body in place when it is above the size threshold"""
+    response.vary.add('Accept-Encoding')
+
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+
+    body = response.get_data()
+    if len(body) < Config.RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
+
+    encoding = choose_encoding(req)
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=Config.RESPONSE_BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        compressed = gzip.compress(body, compresslevel=Config.RESPONSE_GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def readings_response(req, meta: Dict[str, Any], readings: List[Dict[str, Any]],
+                      json_payload: Optional[Dict[str, Any]] = None,
+                      status: int = 200) -> Tuple[Response, int]:
+    """
+    Build a negotiated, optionally compressed response for a list of readings
+
+    JSON keeps the existing row-oriented shape (``json_payload`` when given,
+    otherwise ``meta`` plus ``readings``). MessagePack, Arrow IPC and CSV
+    carry one array per column instead.
+    """
+    try:
+        fmt = negotiate_format(req)
+    except UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 406
+
+    if fmt == 'json':
+        payload = json_payload if json_payload is not None else {**meta, 'readings': readings}
+        response = jsonify(payload)
+    else:
+        response = Response(encode_body(fmt, meta, readings), mimetype=MIMETYPES[fmt])
+        if fmt == 'csv':
+            response.headers['Content-Disposition'] = 'inline; filename="readings.csv"'
+
+    response.vary.add('Accept')
+    return compress_response(response, req), status
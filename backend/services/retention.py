@@ -0,0 +1,233 @@
+"""
+Retention - rollup-then-purge compaction of the readings table
+
+Policy: raw readings are kept for ``RETENTION_RAW_DAYS`` and hourly
+aggregates (``water_quality_hourly``, see migrations/003_hourly_rollups.sql)
+for ``RETENTION_HOURLY_DAYS``. The job walks raw readings older than the
+raw cutoff in ascending id order, ``COMPACTION_BATCH_SIZE`` rows at a time.
+For each batch it folds the rows into their (device, hour) aggregates,
+upserts those and only then deletes the raw rows, so a crash never loses
+data. Each aggregate remembers the highest raw id folded in, and a rerun
+skips rows at or below it instead of counting them twice. Expired
+aggregates are then deleted in batches of the same size.
+
+``rollup_new`` keeps the aggregates current between compactions: it folds
+raw readings stored since its last pass (tracked by a raw-id watermark in
+``water_quality_rollup_state``) without deleting anything, so analytics
+can read recent hours from ``water_quality_hourly`` too.
+
+Run it on a schedule (``python compact_readings.py``) and the hot table
+stays at roughly ``RETENTION_RAW_DAYS`` of data.
+"""
+
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import Config
+from services.timestamps import parse_timestamp, to_iso, utc_now, reading_time
+
+logger = logging.getLogger(__name__)
+
+SENSOR_FIELDS = ('temperature', 'ph', 'tds', 'turbidity')
+
+
+def hour_bucket(timestamp: str) -> Optional[str]:
+    """Start of the UTC hour containing ``timestamp``"""
+    moment = parse_timestamp(timestamp)
+    if moment is None:
+        return None
+    return to_iso(moment.replace(minute=0, second=0, microsecond=0))
+
+
+def fold(rollup: Optional[Dict[str, Any]], device_id: str, bucket: str,
+         readings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge raw readings (ascending id) into an hourly aggregate"""
+    if rollup is None:
+        rollup = {'device_id': device_id, 'bucket': bucket, 'reading_count': 0, 'max_reading_id': 0}
+    else:
+        rollup = {key: value for key, value in rollup.items() if key not in ('id', 'updated_at')}
+
+    count = rollup['reading_count']
+    for field in SENSOR_FIELDS:
+        values = [r[field] for r in readings if r.get(field) is not None]
+        if not values:
+            continue
+        average = rollup.get(f'{field}_avg')
+        if average is None or not count:
+            rollup[f'{field}_avg'] = sum(values) / len(values)
+            rollup[f'{field}_min'] = min(values)
+            rollup[f'{field}_max'] = max(values)
+        else:
+            rollup[f'{field}_avg'] = (average * count + sum(values)) / (count + len(values))
+            rollup[f'{field}_min'] = min(rollup[f'{field}_min'], min(values))
+            rollup[f'{field}_max'] = max(rollup[f'{field}_max'], max(values))
+
+    last = readings[-1]
+    rollup['latitude'] = last.get('latitude', rollup.get('latitude'))
+    rollup['longitude'] = last.get('longitude', rollup.get('longitude'))
+    rollup['reading_count'] = count + len(readings)
+    rollup['max_reading_id'] = max(rollup['max_reading_id'], last['id'])
+    rollup['updated_at'] = to_iso(utc_now())
+    return rollup
+
+
+def _batched(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CompactionJob:
+    """Roll raw readings up into hourly aggregates, then purge them"""
+
+    def __init__(self, service, raw_days: int = None, hourly_days: int = None, batch_size: int = None):
+        self.service = service
+        self.raw_days = raw_days if raw_days is not None else Config.RETENTION_RAW_DAYS
+        self.hourly_days = hourly_days if hourly_days is not None else Config.RETENTION_HOURLY_DAYS
+        self.batch_size = batch_size or Config.COMPACTION_BATCH_SIZE
+
+    def cutoffs(self, now=None) -> Tuple[str, str]:
+        """(raw cutoff, hourly cutoff); the raw one is aligned to an hour"""
+        now = now or utc_now()
+        raw = (now - timedelta(days=self.raw_days)).replace(minute=0, second=0, microsecond=0)
+        hourly = now - timedelta(days=self.hourly_days)
+        return to_iso(raw), to_iso(hourly)
+
+    def _fold_batch(self, rows: List[Dict[str, Any]], dry_run: bool) -> Tuple[int, int]:
+        """Fold rows into their hourly rollups; returns (rows, rollups written)"""
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for row in rows:
+            bucket = hour_bucket(reading_time(row))
+            if bucket is not None:
+                groups.setdefault((row['device_id'], bucket), []).append(row)
+        if not groups:
+            return 0, 0
+        if dry_run:
+            return len(rows), len(groups)
+
+        # Exact keys: a range query over every device and bucket in the batch
+        # can pass the PostgREST row cap, and a missing aggregate would be
+        # overwritten with this batch alone
+        existing = {
+            (rollup['device_id'], hour_bucket(rollup['bucket'])): rollup
+            for rollup in self.service.get_hourly_rollups_by_key(groups)
+        }
+
+        upserts = []
+        for (device_id, bucket), readings in groups.items():
+            rollup = existing.get((device_id, bucket))
+            done = rollup['max_reading_id'] if rollup else 0
+            fresh = [r for r in readings if r['id'] > done]
+            if fresh:
+                upserts.append(fold(rollup, device_id, bucket, fresh))
+
+        self.service.upsert_hourly_rollups(upserts)
+        return len(rows), len(upserts)
+
+    def rollup_new(self, max_batches: Optional[int] = None, now=None) -> Dict[str, Any]:
+        """
+        Fold raw readings stored since the last pass into hourly rollups
+
+        Nothing is deleted; this keeps ``water_quality_hourly`` current for
+        analytics over recent data. Progress is a raw-id watermark. Rows
+        younger than ``ROLLUP_SETTLE_SECONDS`` are left for the next pass,
+        because ids from concurrent inserts can become visible out of order.
+        """
+        started = time.monotonic()
+        settled = to_iso((now or utc_now()) - timedelta(seconds=Config.ROLLUP_SETTLE_SECONDS))
+        watermark = self.service.get_rollup_watermark()
+        report = {'from_id': watermark, 'raw_rolled_up': 0, 'rollups_written': 0,
+                  'batches': 0, 'complete': False}
+
+        rows = self.service.iter_readings(after_id=watermark, page_size=self.batch_size)
+        for batch in _batched(rows, self.batch_size):
+            if max_batches is not None and report['batches'] >= max_batches:
+                break
+            cut = next((i for i, row in enumerate(batch)
+                        if str(row.get('created_at') or '') >= settled), len(batch))
+            ready = batch[:cut]
+            if ready:
+                rolled, written = self._fold_batch(ready, dry_run=False)
+                self.service.set_rollup_watermark(ready[-1]['id'])
+                report['raw_rolled_up'] += rolled
+                report['rollups_written'] += written
+                report['batches'] += 1
+            if len(ready) < len(batch):
+                report['complete'] = True
+                break
+        else:
+            report['complete'] = True
+
+        report['to_id'] = self.service.get_rollup_watermark()
+        report['elapsed_seconds'] = round(time.monotonic() - started, 2)
+        return report
+
+    def run(self, dry_run: bool = False, max_batches: Optional[int] = None,
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+            pause_seconds: float = 0.0, now=None) -> Dict[str, Any]:
+        """
+        Compact and purge; returns a report
+
+        ``max_batches`` bounds one run (the next run carries on), ``progress``
+        is called with the running report after every batch and
+        ``pause_seconds`` throttles the load on the database.
+        """
+        started = time.monotonic()
+        raw_cutoff, hourly_cutoff = self.cutoffs(now)
+
+        # Catch the rollups up first so purged rows are normally already folded
+        if not dry_run:
+            self.rollup_new(now=now)
+
+        report = {
+            'dry_run': dry_run,
+            'raw_cutoff': raw_cutoff,
+            'hourly_cutoff': hourly_cutoff,
+            'raw_eligible': self.service.count_readings_before(raw_cutoff),
+            'raw_compacted': 0,
+            'rollups_written': 0,
+            'hourly_purged': 0,
+            'batches': 0,
+            'complete': False,
+        }
+
+        rows = self.service.iter_readings(end=raw_cutoff, page_size=self.batch_size)
+        for batch in _batched(rows, self.batch_size):
+            if max_batches is not None and report['batches'] >= max_batches:
+                break
+            compacted, written = self._fold_batch(batch, dry_run)
+            # Aggregates first, raw rows second: a crash in between is safe to rerun
+            if not dry_run:
+                self.service.delete_readings([row['id'] for row in batch], before=raw_cutoff)
+            report['raw_compacted'] += compacted
+            report['rollups_written'] += written
+            report['batches'] += 1
+            if progress:
+                progress(dict(report, elapsed_seconds=round(time.monotonic() - started, 2)))
+            if pause_seconds:
+                time.sleep(pause_seconds)
+        else:
+            if dry_run:
+                report['hourly_purged'] = self.service.count_hourly_before(hourly_cutoff)
+            else:
+                while True:
+                    purged = self.service.purge_hourly_before(hourly_cutoff, limit=self.batch_size)
+                    report['hourly_purged'] += purged
+                    if purged < self.batch_size:
+                        break
+            report['complete'] = True
+
+        report['elapsed_seconds'] = round(time.monotonic() - started, 2)
+        logger.info(
+            f"✅ Compaction {'dry run ' if dry_run else ''}finished: "
+            f"{report['raw_compacted']}/{report['raw_eligible']} raw readings, "
+            f"{report['rollups_written']} rollups, {report['hourly_purged']} expired rollups"
+        )
+        return report
@@ -0,0 +1,347 @@
+"""
+Scheduler - background jobs that precompute what requests would compute
+
+Jobs are registered with an interval and run on a daemon thread in every
+process that calls ``scheduler.start()`` (each gunicorn worker). Runs are
+spread with random jitter so workers do not wake up together, and a job
+registered with ``on_ingest=True`` is brought forward (but no sooner than
+``min_interval`` after its last run) when ``scheduler.notify_ingest()`` is
+called. A process without a running scheduler (the ingest gateway) cannot
+do that itself; its ``notify_ingest()`` touches ``<SCHEDULER_STATE_DIR>/
+ingest.signal`` instead, and every worker's scheduler treats a newer
+modification time as an ingest.
+
+Only one worker runs a given job: before running, a worker takes a
+non-blocking ``flock`` on ``<SCHEDULER_STATE_DIR>/<job>.lock`` and skips the
+run if another worker holds it or has just published a fresh result.
+Results are JSON-encoded and published atomically to ``<job>.json`` in the
+same directory, so every worker serves the result the lock holder
+computed, and the file's age tells the other workers the job has already
+run this interval. ``scheduler.result(name)`` returns it, or None when it is older
+than the job's ``max_age`` and the caller should compute inline.
+
+A run that exceeds its ``timeout`` is reported as timed out. Python cannot
+kill a thread, so the run carries on in the background, keeps the lock
+and is not started again until it returns.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, fine for a single dev server
+    fcntl = None
+
+from config.settings import Config
+from services.metrics import registry, register_stats_gauges
+from services.validation import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNS = registry.counter(
+    'scheduler_job_runs_total',
+    'Background job runs by outcome (ok, error, timeout, skipped)',
+    ('job', 'outcome')
+)
+JOB_DURATION = registry.histogram(
+    'scheduler_job_duration_seconds',
+    'Background job run time',
+    ('job',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+
+class Job:
+    """A registered job and its per-process run state"""
+
+    def __init__(self, name: str, func: Callable[[], Any], interval: float, jitter: float,
+                 timeout: float, on_ingest: bool, min_interval: float, max_age: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.on_ingest = on_ingest
+        self.min_interval = min_interval
+        self.max_age = max_age
+        self.next_run = 0.0
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.running = False
+        self.timed_out = False
+        self.triggered = False
+        self.outcomes: Dict[str, int] = {}
+
+    def schedule_next(self, now: float):
+        self.next_run = now + self.interval + random.uniform(0, self.jitter)
+
+
+class Scheduler:
+    """Periodic and ingest-triggered jobs, one runner per job across workers"""
+
+    def __init__(self, state_dir: str, tick_seconds: float = 1.0):
+        self.state_dir = state_dir
+        self.tick_seconds = tick_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cache: Dict[str, Any] = {}  # name -> (mtime, result)
+        self._signal_seen = 0.0      # mtime of ingest.signal already acted on
+        self._signalled_at = 0.0     # last touch of ingest.signal by this process
+
+    def register(self, name: str, func: Callable[[], Any], interval: float,
+                 jitter: Optional[float] = None, timeout: Optional[float] = None,
+                 on_ingest: bool = False, min_interval: Optional[float] = None,
+                 max_age: Optional[float] = None) -> Job:
+        """
+        Add a job; ``func()`` returns the result to publish
+
+        ``jitter`` defaults to 10% of the interval, ``timeout`` to the
+        interval, ``min_interval`` (for ingest triggers) to a tenth of it and
+        ``max_age`` to three intervals.
+        """
+        job = Job(
+            name, func, interval,
+            jitter=interval * 0.1 if jitter is None else jitter,
+            timeout=timeout or interval,
+            on_ingest=on_ingest,
+            min_interval=interval / 10 if min_interval is None else min_interval,
+            max_age=max_age or interval * 3
+        )
+        # First run soon after start, spread across workers
+        job.next_run = time.monotonic() + random.uniform(0, job.jitter)
+        with self._lock:
+            self._jobs[name] = job
+        return job
+
+    # ------------------------------------------------------------------ files
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.state_dir, f'{name}.{suffix}')
+
+    def _published_age(self, name: str) -> Optional[float]:
+        try:
+            return time.time() - os.path.getmtime(self._path(name, 'json'))
+        except OSError:
+            return None
+
+    def _publish(self, name: str, result: Any):
+        path = self._path(name, 'json')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(dumps(result))
+        os.replace(tmp, path)
+
+    def _signal_ingest(self):
+        """Touch the ingest signal file, at most once per tick"""
+        now = time.time()
+        if now - self._signalled_at < self.tick_seconds:
+            return
+        self._signalled_at = now
+        path = self._path('ingest', 'signal')
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            with open(path, 'a'):
+                os.utime(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not signal ingest to the workers: {str(e)}")
+
+    def _check_ingest_signal(self):
+        """Act on an ingest signalled by another process since the last check"""
+        try:
+            mtime = os.path.getmtime(self._path('ingest', 'signal'))
+        except OSError:
+            return
+        if mtime > self._signal_seen:
+            self._signal_seen = mtime
+            self._bring_forward()
+
+    def _try_lock(self, name: str):
+        """Open and flock the job's lock file; None if another worker has it"""
+        handle = open(self._path(name, 'lock'), 'a')
+        if fcntl is None:
+            return handle
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    # ------------------------------------------------------------------ running
+
+    def _record(self, job: Job, outcome: str):
+        job.outcomes[outcome] = job.outcomes.get(outcome, 0) + 1
+        JOB_RUNS.labels(job.name, outcome).inc()
+
+    def _execute(self, job: Job, handle, done: threading.Event):
+        started = time.perf_counter()
+        try:
+            result = job.func()
+            self._publish(job.name, result)
+            job.last_error = None
+            outcome = 'ok'
+        except Exception as e:
+            logger.error(f"❌ Job {job.name} failed: {str(e)}")
+            job.last_error = str(e)
+            outcome = 'error'
+        finally:
+            handle.close()  # releases the flock
+            job.last_duration = time.perf_counter() - started
+            JOB_DURATION.labels(job.name).observe(job.last_duration)
+            job.running = False
+            done.set()
+        if not job.timed_out:
+            self._record(job, outcome)
+
+    def run_job(self, name: str, wait: bool = True) -> str:
+        """Run one job now if this worker can take its lock; returns the outcome"""
+        job = self._jobs[name]
+        triggered, job.triggered = job.triggered, False
+        job.schedule_next(time.monotonic())
+        if job.running:
+            return 'running'
+
+        handle = self._try_lock(name)
+        if handle is None:
+            self._record(job, 'skipped')
+            return 'skipped'
+        age = self._published_age(name)
+        if age is not None and age < (job.min_interval if triggered else job.interval / 2):
+            # Another worker already ran it this interval
+            handle.close()
+            self._record(job, 'skipped')
+            return 'skipped'
+
+        job.running = True
+        job.timed_out = False
+        job.last_run = time.time()
+        done = threading.Event()
+        thread = threading.Thread(target=self._execute, args=(job, handle, done),
+                                  name=f'job-{name}', daemon=True)
+        thread.start()
+        if not wait:
+            return 'started'
+        if done.wait(job.timeout):
+            return 'error' if job.last_error else 'ok'
+        logger.warning(f"⚠️ Job {name} exceeded its {job.timeout}s timeout, still running")
+        job.timed_out = True
+        self._record(job, 'timeout')
+        return 'timeout'
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._check_ingest_signal()
+            now = time.monotonic()
+            with self._lock:
+                due = [job.name for job in self._jobs.values() if job.next_run <= now and not job.running]
+            for name in due:
+                # Runs one after another; a slow job only delays the others by its timeout
+                self.run_job(name)
+            self._wake.wait(self.tick_seconds)
+            self._wake.clear()
+
+    def start(self):
+        """Start the scheduler thread in this process (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        try:
+            # Only signals from after this start count
+            self._signal_seen = os.path.getmtime(self._path('ingest', 'signal'))
+        except OSError:
+            pass
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"🚀 Scheduler started with {len(self._jobs)} jobs ({self.state_dir})")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify_ingest(self):
+        """Bring ingest-triggered jobs forward after new readings are stored"""
+        if self._thread is None:
+            # No scheduler here (ingest gateway): let the workers' schedulers know
+            self._signal_ingest()
+            return
+        self._bring_forward()
+
+    def _bring_forward(self):
+        now = time.monotonic()
+        woke = False
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.on_ingest:
+                    continue
+                earliest = now if job.last_run is None else now + max(
+                    0.0, job.min_interval - (time.time() - job.last_run))
+                if earliest < job.next_run:
+                    job.next_run = earliest
+                    job.triggered = True
+                    woke = True
+        if woke:
+            self._wake.set()
+
+    # ------------------------------------------------------------------ results
+
+    def result(self, name: str) -> Optional[Any]:
+        """Latest published result of a job, or None if missing or stale"""
+        job = self._jobs.get(name)
+        if job is None or self._thread is None:
+            return None
+        path = self._path(name, 'json')
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if time.time() - mtime > job.max_age:
+            return None
+
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, 'rb') as f:
+                result = loads(f.read())
+        except (OSError, ValueError):
+            return None
+        self._cache[name] = (mtime, result)
+        return result
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """Per-job state for /health and debugging"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [{
+            'name': job.name,
+            'interval': job.interval,
+            'running': job.running,
+            'last_run': job.last_run,
+            'last_duration': None if job.last_duration is None else round(job.last_duration, 3),
+            'last_error': job.last_error,
+            'published_age': self._published_age(job.name),
+            'outcomes': dict(job.outcomes),
+        } for job in jobs]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'jobs': len(self._jobs),
+                'running': sum(1 for job in self._jobs.values() if job.running),
+            }
+
+
+# Singleton instance
+scheduler = Scheduler(Config.SCHEDULER_STATE_DIR, tick_seconds=Config.SCHEDULER_TICK_SECONDS)
+
+register_stats_gauges('scheduler', 'Background job scheduler', scheduler.stats)
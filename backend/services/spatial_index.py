@@ -0,0 +1,243 @@
+"""
+Spatial Index - devices nearest to a point
+
+``DeviceLocationIndex`` answers "which devices are within ``radius_km`` of
+this point" and "which are the ``k`` nearest" from each device's last
+known position, using a scikit-learn ``BallTree`` on the haversine metric
+instead of scanning every device.
+
+Positions come from the shared fleet snapshot (one row per slot, in slot
+order), or from ``get_latest_readings`` when the snapshot is stale. They
+are re-read at most every ``NEARBY_INDEX_REFRESH_SECONDS`` and the index
+is updated incrementally: a BallTree cannot be modified, so devices added
+or moved since the last build form a delta that is searched by brute
+force (vectorized haversine), and their outdated tree entries are masked.
+The tree is rebuilt once the delta passes ``NEARBY_REBUILD_FRACTION`` of
+the devices. Without scikit-learn every query is brute force.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:
+    BallTree = None
+
+from config.settings import Config
+from services.fleet_snapshot import fleet_snapshot
+from services.metrics import register_stats_gauges
+from services.recent_readings import QUALITY_CODES, QUALITY_NAMES
+from services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+# Deltas below this size never trigger a rebuild
+MIN_REBUILD_DELTA = 1024
+
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to many (all in radians)"""
+    a = (np.sin((lats - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _State:
+    """One consistent version of the index; replaced, never modified, by updates"""
+
+    __slots__ = ('ids', 'degrees', 'radians', 'quality', 'measured_at',
+                 'tree', 'tree_rows', 'current', 'stale', 'delta', 'delta_lat', 'delta_lng')
+
+    def __init__(self, ids, degrees, radians, quality, measured_at,
+                 tree, tree_rows, current, delta):
+        self.ids = ids                  # S64 device ids, one row per device
+        self.degrees = degrees          # (n, 2) lat/lng as stored
+        self.radians = radians          # (n, 2) lat/lng in radians, NaN when unknown
+        self.quality = quality
+        self.measured_at = measured_at
+        self.tree = tree                # BallTree over tree_rows (None without sklearn)
+        self.tree_rows = tree_rows      # device row of each tree point
+        self.current = current          # per row: its tree entry is up to date
+        self.stale = 0 if tree is None else int(len(tree_rows) - current[tree_rows].sum())
+        self.delta = delta              # rows to search by brute force
+        self.delta_lat = radians[delta, 0]
+        self.delta_lng = radians[delta, 1]
+
+
+class DeviceLocationIndex:
+    """Nearest-device queries over the fleet's last known positions"""
+
+    def __init__(self, refresh_seconds: float, rebuild_fraction: float):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_fraction = rebuild_fraction
+        empty = np.empty((0, 2))
+        self._state = _State(np.empty(0, dtype='S64'), empty, empty, np.empty(0, dtype=np.uint8),
+                             np.empty(0, dtype='S32'), None, np.empty(0, dtype=np.int64),
+                             np.empty(0, dtype=bool), np.empty(0, dtype=np.int64))
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at: Optional[float] = None
+        self.builds = 0
+        self.last_build_seconds = 0.0
+
+    # ------------------------------------------------------------------ updates
+
+    def _build(self, radians: np.ndarray, known: np.ndarray):
+        rows = np.flatnonzero(known)
+        started = time.perf_counter()
+        tree = BallTree(radians[rows], metric='haversine') if len(rows) else None
+        self.last_build_seconds = time.perf_counter() - started
+        self.builds += 1
+        return tree, rows
+
+    def update(self, ids: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+               quality: np.ndarray, measured_at: np.ndarray):
+        """
+        Replace the device positions
+
+        When the previous ids are a prefix of ``ids`` (the fleet snapshot
+        only appends slots), the tree is kept and only new and moved
+        devices go to the delta; otherwise the tree is rebuilt.
+        """
+        degrees = np.column_stack([lat, lng]).astype(np.float64)
+        radians = np.radians(degrees)
+        # Same rule as the heatmap: no position, or 0/0, is unknown
+        known = np.isfinite(radians).all(axis=1) & ~((degrees[:, 0] == 0) & (degrees[:, 1] == 0))
+        radians[~known] = np.nan
+
+        old = self._state
+        kept = len(old.ids)
+        incremental = (BallTree is not None and old.tree is not None
+                       and len(ids) >= kept and np.array_equal(ids[:kept], old.ids))
+        if incremental:
+            unchanged = (radians[:kept] == old.radians).all(axis=1)
+            current = np.concatenate([old.current & unchanged, np.zeros(len(ids) - kept, dtype=bool)])
+            delta = np.flatnonzero(known & ~current)
+            tree, tree_rows = old.tree, old.tree_rows
+            if len(delta) > max(MIN_REBUILD_DELTA, self.rebuild_fraction * len(ids)):
+                incremental = False
+
+        if not incremental:
+            if BallTree is not None:
+                tree, tree_rows = self._build(radians, known)
+                current = known.copy()
+                delta = np.empty(0, dtype=np.int64)
+            else:
+                tree, tree_rows = None, np.empty(0, dtype=np.int64)
+                current = np.zeros(len(ids), dtype=bool)
+                delta = np.flatnonzero(known)
+
+        self._state = _State(ids, degrees, radians, quality, measured_at,
+                             tree, tree_rows, current, delta)
+
+    def refresh(self, force: bool = False):
+        """Re-read positions if the last read is older than the refresh interval"""
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_seconds:
+            return
+        # One thread refreshes; the others keep answering from the current state
+        if not self._refresh_lock.acquire(blocking=self._refreshed_at is None):
+            return
+        try:
+            if not force and self._refreshed_at is not None \
+                    and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+                return  # another thread refreshed while this one waited
+            slots = fleet_snapshot.locations()
+            if slots is not None:
+                self.update(slots['device_id'], slots['latitude'], slots['longitude'],
+                            slots['quality'], slots['measured_at'])
+            else:
+                latest = supabase_service.get_latest_readings()
+                self.update(
+                    np.array([r['device_id'].encode('utf-8')[:64] for r in latest], dtype='S64'),
+                    np.array([r.get('latitude') or np.nan for r in latest], dtype=np.float64),
+                    np.array([r.get('longitude') or np.nan for r in latest], dtype=np.float64),
+                    np.array([QUALITY_CODES.get(supabase_service.determine_water_quality(r), 0)
+                              for r in latest], dtype=np.uint8),
+                    np.array([str(r.get('measured_at') or '').encode('ascii', 'ignore')[:32]
+                              for r in latest], dtype='S32'),
+                )
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    # ------------------------------------------------------------------ queries
+
+    @staticmethod
+    def _from_tree(state: _State, point: np.ndarray, radius: Optional[float], k: Optional[int]):
+        """(rows, distances in radians) of current tree entries"""
+        size = len(state.tree_rows)
+        if state.tree is None or size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if radius is not None:
+            indices, distances = state.tree.query_radius(point, r=radius, return_distance=True)
+            rows, distances = state.tree_rows[indices[0]], distances[0]
+            keep = state.current[rows]
+            return rows[keep], distances[keep]
+
+        # Over-fetch past masked entries, doubling until k current ones are found
+        fetch = min(size, k + min(state.stale, k))
+        while True:
+            distances, indices = state.tree.query(point, k=fetch)
+            rows, distances = state.tree_rows[indices[0]], distances[0]
+            keep = state.current[rows]
+            if keep.sum() >= k or fetch == size:
+                return rows[keep], distances[keep]
+            fetch = min(size, fetch * 2)
+
+    def nearby(self, lat: float, lng: float, radius_km: Optional[float] = None,
+               k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Devices within ``radius_km`` and/or the ``k`` nearest, closest first"""
+        self.refresh()
+        state = self._state
+        point = np.radians([[lat, lng]])
+        radius = None if radius_km is None else radius_km / EARTH_RADIUS_KM
+
+        rows, distances = self._from_tree(state, point, radius, k)
+        if len(state.delta):
+            delta_distances = haversine_km(point[0, 0], point[0, 1],
+                                           state.delta_lat, state.delta_lng) / EARTH_RADIUS_KM
+            rows = np.concatenate([rows, state.delta])
+            distances = np.concatenate([distances, delta_distances])
+            if radius is not None:
+                within = distances <= radius
+                rows, distances = rows[within], distances[within]
+
+        if k is not None and len(distances) > k:
+            order = np.argpartition(distances, k - 1)[:k]
+            order = order[np.argsort(distances[order], kind='stable')]
+        else:
+            order = np.argsort(distances, kind='stable')
+        return [{
+            'device_id': state.ids[row].decode('utf-8'),
+            'latitude': float(state.degrees[row, 0]),
+            'longitude': float(state.degrees[row, 1]),
+            'distance_km': round(float(distances[i]) * EARTH_RADIUS_KM, 4),
+            'quality': QUALITY_NAMES.get(int(state.quality[row]), 'unknown'),
+            'measured_at': state.measured_at[row].decode('ascii') or None,
+        } for i, row in ((i, rows[i]) for i in order)]
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state
+        return {
+            'devices': len(state.ids),
+            'tree_size': len(state.tree_rows),
+            'delta': len(state.delta),
+            'stale': state.stale,
+            'builds': self.builds,
+            'last_build_seconds': round(self.last_build_seconds, 4),
+        }
+
+
+# Singleton instance
+device_locations = DeviceLocationIndex(
+    refresh_seconds=Config.NEARBY_INDEX_REFRESH_SECONDS,
+    rebuild_fraction=Config.NEARBY_REBUILD_FRACTION
+)
+
+register_stats_gauges('nearby_index', 'Nearby-devices spatial index', device_locations.stats)
@@ -0,0 +1,389 @@
+"""
+SQLite Client - local stand-in for the Supabase client
+
+``SUPABASE_URL=sqlite:///path/to/file.db`` makes ``SupabaseService`` use
+this instead of Supabase, for development and for testing storage changes
+(such as monthly partitions) against a real database without a project.
+
+It implements the subset of the supabase-py query builder the service
+uses: ``table``, ``select`` with ``count="exact"``, ``insert``, ``upsert``,
+``delete``, ``eq``/``gt``/``gte``/``lt``/``lte``/``in_``, ``order``,
+``range``, ``limit``, ``execute``, and ``rpc('ensure_readings_partition')``.
+Tables and columns are created on first write; dict and list values are
+stored as JSON and booleans come back as booleans. The unique keys of the
+migrations are mirrored in ``UNIQUE_KEYS`` and a conflict raises an error
+with Postgres' code 23505, so idempotent ingest behaves as it does
+against Supabase.
+
+Partitions of ``water_quality_readings`` draw ids from its sequence, as
+``LIKE ... INCLUDING DEFAULTS`` does in Postgres. The database runs in
+WAL mode, so several workers can share one file.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+READINGS_TABLE = 'water_quality_readings'
+PARTITION_REGISTRY = 'water_quality_partitions'
+
+# Unique keys from migrations/*.sql (primary keys other than ``id`` included)
+UNIQUE_KEYS = {
+    READINGS_TABLE: [('idempotency_key',)],
+    'water_quality_hourly': [('device_id', 'bucket')],
+    'water_quality_rollup_state': [('name',)],
+    PARTITION_REGISTRY: [('month_start',)],
+}
+
+_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_OPS = {'eq': '=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+class SQLiteError(Exception):
+    """Database error carrying a Postgres SQLSTATE, like postgrest's APIError"""
+
+    def __init__(self, message: str, code: str):
+        super().__init__({'message': message, 'code': code})
+        self.message = message
+        self.code = code
+
+
+class SQLiteResponse:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _ident(name: str) -> str:
+    if not _NAME.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+
+class SQLiteQuery:
+    def __init__(self, client: 'SQLiteClient', table: str):
+        self._client = client
+        self._table = table
+        self._columns: Optional[List[str]] = None
+        self._count = None
+        self._rows = None
+        self._conflict: Optional[List[str]] = None
+        self._delete = False
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._offset = 0
+        self._limit: Optional[int] = None
+
+    # ---- builder -----------------------------------------------------------
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(',')]
+        self._count = count
+        return self
+
+    def insert(self, data):
+        self._rows = data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict: str = 'id'):
+        self._rows = data if isinstance(data, list) else [data]
+        self._conflict = [c.strip() for c in on_conflict.split(',')]
+        return self
+
+    def delete(self):
+        self._delete = True
+        return self
+
+    def _filter(self, op: str, column: str, value):
+        self._filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter('eq', column, value)
+
+    def gt(self, column, value):
+        return self._filter('gt', column, value)
+
+    def gte(self, column, value):
+        return self._filter('gte', column, value)
+
+    def lt(self, column, value):
+        return self._filter('lt', column, value)
+
+    def lte(self, column, value):
+        return self._filter('lte', column, value)
+
+    def in_(self, column, values):
+        return self._filter('in', column, list(values))
+
+    def order(self, column: str, desc: bool = False):
+        self._order.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset = start
+        self._limit = max(0, end - start + 1)
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    # ---- execution ---------------------------------------------------------
+
+    def _where(self, columns) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, op, value in self._filters:
+            if column not in columns:
+                # PostgREST would reject it; an unknown column matches nothing here
+                return ' WHERE 0', []
+            if op == 'in':
+                if not value:
+                    return ' WHERE 0', []
+                clauses.append(f'{_ident(column)} IN ({",".join("?" * len(value))})')
+                params.extend(self._client.encode(v) for v in value)
+            else:
+                clauses.append(f'{_ident(column)} {_OPS[op]} ?')
+                params.append(self._client.encode(value))
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def execute(self) -> SQLiteResponse:
+        client = self._client
+        with client.lock:
+            if self._rows is not None:
+                return SQLiteResponse(client.write(self._table, self._rows, self._conflict))
+
+            columns = client.columns(self._table)
+            if not columns:
+                return SQLiteResponse([], count=0 if self._count == 'exact' else None)
+            table = _ident(self._table)
+            where, params = self._where(columns)
+
+            if self._delete:
+                cursor = client.conn.execute(f'DELETE FROM {table}{where}', params)
+                return SQLiteResponse([], count=cursor.rowcount)
+
+            selected = [c for c in (self._columns or columns) if c in columns]
+            sql = f'SELECT {",".join(_ident(c) for c in selected) or "NULL"} FROM {table}{where}'
+            order = [(c, desc) for c, desc in self._order if c in columns]
+            if order:
+                # Postgres puts NULLs last ascending and first descending
+                sql += ' ORDER BY ' + ', '.join(
+                    f'{_ident(c)} IS NULL {"DESC" if desc else "ASC"}, {_ident(c)} {"DESC" if desc else "ASC"}'
+                    for c, desc in order
+                )
+            if self._limit is not None or self._offset:
+                sql += f' LIMIT {-1 if self._limit is None else int(self._limit)} OFFSET {int(self._offset)}'
+            rows = client.conn.execute(sql, params).fetchall()
+            kinds = client.kinds(self._table)
+            data = [client.decode(kinds, zip(selected, row)) for row in rows]
+            for row in data:
+                for column in self._columns or ():
+                    row.setdefault(column, None)
+
+            count = None
+            if self._count == 'exact':
+                count = client.conn.execute(f'SELECT COUNT(*) FROM {table}{where}', params).fetchone()[0]
+            return SQLiteResponse(data, count=count)
+
+
+class SQLiteRPC:
+    def __init__(self, client: 'SQLiteClient', name: str, params: Dict[str, Any]):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self) -> SQLiteResponse:
+        if self._name != 'ensure_readings_partition':
+            raise SQLiteError(f"Function {self._name} not found", 'PGRST202')
+        month = str(self._params['month_start'])[:7]
+        with self._client.lock:
+            return SQLiteResponse(self._client.ensure_partition(month))
+
+
+class SQLiteClient:
+    """Drop-in for ``supabase.Client`` backed by one SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS _tables '
+            '(name TEXT PRIMARY KEY, sequence TEXT NOT NULL, kinds TEXT NOT NULL DEFAULT \'{}\')'
+        )
+        self.conn.execute('CREATE TABLE IF NOT EXISTS _sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    @classmethod
+    def from_url(cls, url: str) -> 'SQLiteClient':
+        return cls(url[len('sqlite:///'):] or ':memory:')
+
+    def table(self, name: str) -> SQLiteQuery:
+        _ident(name)
+        return SQLiteQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> SQLiteRPC:
+        return SQLiteRPC(self, name, params or {})
+
+    # ---- schema ------------------------------------------------------------
+
+    def columns(self, table: str) -> List[str]:
+        return [row[1] for row in self.conn.execute(f'PRAGMA table_info({_ident(table)})')]
+
+    def _meta(self, table: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """(id sequence, {column: 'json' or 'bool'}) of a table, None if it does not exist"""
+        row = self.conn.execute('SELECT sequence, kinds FROM _tables WHERE name = ?', (table,)).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def kinds(self, table: str) -> Dict[str, str]:
+        meta = self._meta(table)
+        return meta[1] if meta else {}
+
+    def _create(self, table: str, sequence: str, unique_keys):
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {_ident(table)} (id INTEGER PRIMARY KEY)')
+        self.conn.execute('INSERT OR IGNORE INTO _tables (name, sequence) VALUES (?, ?)', (table, sequence))
+        for key in unique_keys:
+            self._add_columns(table, key, {})
+            self.conn.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS {_ident(table + "_" + "_".join(key) + "_key")} '
+                f'ON {_ident(table)} ({",".join(_ident(c) for c in key)})'
+            )
+
+    def _add_columns(self, table: str, names, kinds: Dict[str, str]):
+        existing = set(self.columns(table))
+        for name in names:
+            if name not in existing:
+                self.conn.execute(f'ALTER TABLE {_ident(table)} ADD COLUMN {_ident(name)}')
+                existing.add(name)
+        known = self.kinds(table)
+        if any(name not in known for name in kinds):
+            self.conn.execute('UPDATE _tables SET kinds = ? WHERE name = ?',
+                              (json.dumps(dict(kinds, **known)), table))
+
+    def ensure_partition(self, month: str) -> List[Dict[str, Any]]:
+        """SQLite version of ensure_readings_partition(month_start)"""
+        name = f'{READINGS_TABLE}_{month.replace("-", "_")}'
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self._meta(READINGS_TABLE) is None:
+                self._create(READINGS_TABLE, READINGS_TABLE, UNIQUE_KEYS[READINGS_TABLE])
+            if self._meta(name) is None:
+                self._create(name, READINGS_TABLE, UNIQUE_KEYS[READINGS_TABLE])
+                base_columns = [c for c in self.columns(READINGS_TABLE) if c != 'id']
+                self._add_columns(name, base_columns, self.kinds(READINGS_TABLE))
+            self._upsert_rows(PARTITION_REGISTRY, [{'month_start': f'{month}-01', 'name': name}],
+                              ['month_start'], replace=False)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return [{'ensure_readings_partition': name}]
+
+    # ---- values ------------------------------------------------------------
+
+    @staticmethod
+    def encode(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
+
+    @staticmethod
+    def kind(value) -> Optional[str]:
+        if isinstance(value, bool):
+            return 'bool'
+        if isinstance(value, (dict, list)):
+            return 'json'
+        return None
+
+    @staticmethod
+    def decode(kinds: Dict[str, str], pairs) -> Dict[str, Any]:
+        row = {}
+        for column, value in pairs:
+            kind = kinds.get(column)
+            if value is not None and kind == 'json':
+                value = json.loads(value)
+            elif value is not None and kind == 'bool':
+                value = bool(value)
+            row[column] = value
+        return row
+
+    # ---- writes ------------------------------------------------------------
+
+    def _next_ids(self, sequence: str, count: int) -> List[int]:
+        current = self.conn.execute('SELECT value FROM _sequences WHERE name = ?', (sequence,)).fetchone()
+        start = (current[0] if current else 0) + 1
+        self.conn.execute('INSERT OR REPLACE INTO _sequences (name, value) VALUES (?, ?)',
+                          (sequence, start + count - 1))
+        return list(range(start, start + count))
+
+    def _bump_sequence(self, sequence: str, value: int):
+        self.conn.execute(
+            'INSERT INTO _sequences (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)',
+            (sequence, value)
+        )
+
+    def _upsert_rows(self, table: str, rows: List[Dict[str, Any]], conflict: Optional[List[str]],
+                     replace: bool = True) -> List[Dict[str, Any]]:
+        if self._meta(table) is None:
+            self._create(table, table, UNIQUE_KEYS.get(table, []))
+        sequence = self._meta(table)[0]
+        names = list(dict.fromkeys(name for row in rows for name in row))
+        kinds = {name: self.kind(value) for row in rows for name, value in row.items()
+                 if self.kind(value) is not None}
+        self._add_columns(table, [n for n in names if n != 'id'], kinds)
+        if conflict and conflict != ['id']:
+            self.conn.execute(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS {_ident(table + "_" + "_".join(conflict) + "_key")} '
+                f'ON {_ident(table)} ({",".join(_ident(c) for c in conflict)})'
+            )
+
+        missing = [row for row in rows if row.get('id') is None]
+        ids = iter(self._next_ids(sequence, len(missing)))
+        kinds = self.kinds(table)
+        stored = []
+        for row in rows:
+            row = dict(row)
+            if row.get('id') is None:
+                row['id'] = next(ids)
+            else:
+                self._bump_sequence(sequence, int(row['id']))
+            columns = list(row)
+            sql = (f'INSERT INTO {_ident(table)} ({",".join(_ident(c) for c in columns)}) '
+                   f'VALUES ({",".join("?" * len(columns))})')
+            if conflict:
+                updates = [c for c in columns if c not in conflict and c != 'id']
+                if replace and updates:
+                    sql += (f' ON CONFLICT ({",".join(_ident(c) for c in conflict)}) DO UPDATE SET '
+                            + ', '.join(f'{_ident(c)} = excluded.{_ident(c)}' for c in updates))
+                else:
+                    sql += f' ON CONFLICT ({",".join(_ident(c) for c in conflict)}) DO NOTHING'
+            sql += ' RETURNING *'
+            cursor = self.conn.execute(sql, [self.encode(row[c]) for c in columns])
+            result = cursor.fetchone()
+            if result is not None:
+                stored.append(self.decode(kinds, zip([d[0] for d in cursor.description], result)))
+        return stored
+
+    def write(self, table: str, rows: List[Dict[str, Any]],
+              conflict: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Insert (or upsert on ``conflict``) rows in one transaction"""
+        if not rows:
+            return []
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            stored = self._upsert_rows(table, rows, conflict)
+            self.conn.execute('COMMIT')
+            return stored
+        except sqlite3.IntegrityError as e:
+            self.conn.execute('ROLLBACK')
+            if 'UNIQUE' in str(e):
+                raise SQLiteError(f"duplicate key value violates unique constraint: {e}", '23505') from e
+            raise SQLiteError(str(e), '23000') from e
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
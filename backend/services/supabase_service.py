@@ -1,7 +1,55 @@
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable
+import heapq
 import os
+import logging
 from supabase import create_client
+from config.settings import Config
+from services.metrics import timed_query, SUPABASE_QUERY_DURATION, SUPABASE_QUERY_ERRORS
+from services.idempotency import DuplicateKey, is_unique_violation
+from services.partitioning import PartitionRouter, month_of
+from services.timestamps import utc_now, to_iso, reading_time
+
+logger = logging.getLogger(__name__)
+
+# Columns a client may ask for with ``fields=``; ``quality`` is computed
+# from the sensor columns, which are fetched for it when requested
+READING_COLUMNS = (
+    'id', 'device_id', 'measured_at', 'created_at',
+    'temperature', 'ph', 'tds', 'turbidity', 'latitude', 'longitude',
+    'imputed', 'raw_values',
+)
+DERIVED_FIELDS = {'quality': ('temperature', 'ph', 'tds', 'turbidity')}
+
+
+class InvalidFields(ValueError):
+    """Raised when ``fields=`` names a column outside the whitelist"""
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """Requested fields from a comma-separated list; None means all columns"""
+    if not value:
+        return None
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in READING_COLUMNS and name not in DERIVED_FIELDS]
+    if unknown or not fields:
+        raise InvalidFields(
+            f"Unknown fields {unknown}. Allowed: {list(READING_COLUMNS) + list(DERIVED_FIELDS)}"
+        )
+    return fields
+
+
+def select_list(fields: Optional[List[str]], required: tuple = ()) -> str:
+    """PostgREST select list for ``fields`` plus the columns the caller needs"""
+    if fields is None:
+        return "*"
+    columns = []
+    for name in list(fields) + list(required):
+        for column in DERIVED_FIELDS.get(name, (name,)):
+            if column not in columns:
+                columns.append(column)
+    return ",".join(columns)
+
 
 class SupabaseService:
     def __init__(self):
@@ -12,75 +60,570 @@ class SupabaseService:
         if not self.url or not self.key:
             raise ValueError("Missing Supabase credentials")
         
-        self.client = create_client(self.url, self.key)
+        if self.url.startswith("sqlite:///"):
+            from services.sqlite_client import SQLiteClient
+            self.client = SQLiteClient.from_url(self.url)
+        else:
+            self.client = create_client(self.url, self.key)
         self.table_name = "water_quality_readings"
+        self.hourly_table_name = "water_quality_hourly"
+        self.rollup_state_table_name = "water_quality_rollup_state"
+
+        # Monthly tables routed by measured_at (services/partitioning.py)
+        self.partitions = None
+        if Config.READINGS_PARTITIONING == 'monthly':
+            self.partitions = PartitionRouter(
+                self.client, self.table_name,
+                refresh_seconds=Config.PARTITION_REGISTRY_REFRESH_SECONDS,
+                include_legacy=Config.PARTITION_INCLUDE_LEGACY
+            )
         print(f"✅ Connected to Supabase: {self.url}")
+
+    # ------------------------------------------------------------------ routing
+
+    def _tables(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Reading tables that can hold measurements in [start, end), newest first"""
+        if self.partitions is None:
+            return [self.table_name]
+        return self.partitions.between(start, end)
+
+    def _table_for(self, reading: Dict[str, Any]) -> str:
+        if self.partitions is None:
+            return self.table_name
+        return self.partitions.for_reading(reading)
+
+    def _stored_keys(self, readings: List[Dict[str, Any]],
+                     received: List[bool]) -> Dict[str, Dict[str, Any]]:
+        """
+        Stored readings for keys the partitions' unique indexes cannot see
+
+        Each partition, and the legacy table, has its own unique index on
+        ``idempotency_key``. A reading without ``measured_at`` is routed by
+        receive time (``received``), so its retry can land in another
+        month; any reading can match a row still in the legacy table. Those
+        keys are looked up before the insert: receive-time ones in every
+        table that can hold readings received in the last
+        ``IDEMPOTENCY_TTL_SECONDS``, the others in the legacy table.
+        """
+        if self.partitions is None:
+            return {}
+        anywhere = {r['idempotency_key'] for r, by_receipt in zip(readings, received)
+                    if r.get('idempotency_key') and by_receipt}
+        legacy_only = {r['idempotency_key'] for r, by_receipt in zip(readings, received)
+                       if r.get('idempotency_key') and not by_receipt}
+        since = to_iso(utc_now() - timedelta(seconds=Config.IDEMPOTENCY_TTL_SECONDS))
+
+        stored: Dict[str, Dict[str, Any]] = {}
+        for table in self._tables(start=since if anywhere else None):
+            legacy = self.partitions.is_legacy(table)
+            keys = anywhere | legacy_only if legacy else anywhere
+            if not keys:
+                continue
+            response = self.client.table(table).select("*").in_("idempotency_key", sorted(keys)).execute()
+            for row in response.data or []:
+                stored.setdefault(row['idempotency_key'], row)
+        return stored
+
+    def _newest_first(self, query: Callable[[str, str], Any], limit: int, offset: int = 0,
+                      columns: str = "*", start: Optional[str] = None,
+                      end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        ``limit`` rows after ``offset``, newest measurement first, across tables
+
+        ``query(table, columns)`` returns the filtered select for one table.
+        Monthly partitions do not overlap, so they are read newest first
+        until enough rows are found; the legacy table can hold any month
+        and is merged in by ``measured_at``.
+        """
+        tables = self._tables(start, end)
+        if len(tables) == 1:
+            response = query(tables[0], columns)\
+                .order("measured_at", desc=True)\
+                .range(offset, offset + limit - 1)\
+                .execute()
+            return response.data or []
+
+        wanted = offset + limit
+        merge = any(self.partitions.is_legacy(table) for table in tables)
+        select = columns
+        if merge and columns != "*" and "measured_at" not in columns.split(","):
+            select = f"{columns},measured_at"
+
+        rows: List[Dict[str, Any]] = []
+        for table in tables:
+            legacy = self.partitions.is_legacy(table)
+            if len(rows) >= wanted and not legacy:
+                continue
+            size = wanted if legacy else wanted - len(rows)
+            response = query(table, select).order("measured_at", desc=True).limit(size).execute()
+            rows.extend(response.data or [])
+
+        if merge:
+            rows.sort(key=lambda row: str(row.get('measured_at') or ''), reverse=True)
+        rows = rows[offset:wanted]
+        if select != columns:
+            for row in rows:
+                row.pop('measured_at', None)
+        return rows
     
+    @timed_query
     def create_reading(self, reading_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new water quality reading"""
+        received = not reading_data.get('measured_at')
         try:
-            # Add timestamp
-            reading_data['created_at'] = datetime.utcnow().isoformat()
+            # Receive time; measurement time defaults to it when the device sent none
+            reading_data['created_at'] = to_iso(utc_now())
+            reading_data.setdefault('measured_at', reading_data['created_at'])
+            stored = self._stored_keys([reading_data], [received])
+            if stored:
+                raise DuplicateKey(next(iter(stored.values())))
             
             # Insert into Supabase
-            response = self.client.table(self.table_name).insert(reading_data).execute()
+            response = self.client.table(self._table_for(reading_data)).insert(reading_data).execute()
             
             if response.data and len(response.data) > 0:
-                print(f"✅ Reading created: {response.data[0]['id']}")
+                logger.debug("Reading created", extra={'device_id': reading_data.get('device_id'), 'reading_id': response.data[0]['id']})
                 return response.data[0]
             else:
                 raise Exception("No data returned from Supabase")
                 
         except Exception as e:
-            print(f"❌ Error creating reading: {str(e)}")
+            if received:
+                # Not stored: a duplicate lookup must not narrow to the receive month
+                reading_data.pop('measured_at', None)
+            if not is_unique_violation(e):
+                logger.error(f"❌ Error creating reading: {str(e)}", extra={'device_id': reading_data.get('device_id')})
             raise
     
-    def get_readings(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        """Get recent readings"""
+    @timed_query
+    def create_readings(self, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several readings with a single insert"""
+        received = [not reading_data.get('measured_at') for reading_data in readings]
         try:
-            response = self.client.table(self.table_name)\
-                                 .select("*")\
-                                 .order("created_at", desc=True)\
-                                 .range(offset, offset + limit - 1)\
-                                 .execute()
-            
-            return response.data if response.data else []
+            created_at = to_iso(utc_now())
+            for reading_data in readings:
+                reading_data['created_at'] = created_at
+                reading_data.setdefault('measured_at', created_at)
+            stored = self._stored_keys(readings, received)
+            if stored:
+                raise DuplicateKey(next(iter(stored.values())))
+
+            # One insert per destination table; rows come back in input order
+            groups: Dict[str, List[int]] = {}
+            for index, reading_data in enumerate(readings):
+                groups.setdefault(self._table_for(reading_data), []).append(index)
+
+            created: List[Optional[Dict[str, Any]]] = [None] * len(readings)
+            for table, indexes in groups.items():
+                response = self.client.table(table).insert([readings[i] for i in indexes]).execute()
+                if not response.data or len(response.data) != len(indexes):
+                    raise Exception("Supabase did not return every inserted row")
+                for index, row in zip(indexes, response.data):
+                    created[index] = row
+
+            logger.debug(f"Readings created: {len(created)}")
+            return created
+
+        except Exception as e:
+            # Callers retry one by one; rows sent without a time must still read that way
+            for reading_data, by_receipt in zip(readings, received):
+                if by_receipt:
+                    reading_data.pop('measured_at', None)
+            if not is_unique_violation(e):
+                logger.error(f"❌ Error creating readings: {str(e)}")
+            raise
+
+    @timed_query
+    def get_reading_by_key(self, idempotency_key: str,
+                           measured_at: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up a stored reading by its idempotency key
+
+        With partitions, ``measured_at`` narrows the search to the month
+        the reading would have been stored in (and the legacy table).
+        """
+        try:
+            tables = self._tables()
+            if self.partitions is not None and measured_at:
+                partition = self.partitions.name(month_of({'measured_at': measured_at}))
+                tables = [table for table in tables if table == partition or self.partitions.is_legacy(table)]
+
+            for table in tables:
+                response = self.client.table(table)\
+                                     .select("*")\
+                                     .eq("idempotency_key", idempotency_key)\
+                                     .limit(1)\
+                                     .execute()
+                if response.data:
+                    return response.data[0]
+            return None
+
+        except Exception as e:
+            logger.error(f"❌ Error looking up reading by key: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_reading_by_key').inc()
+            return None
+
+    @timed_query
+    def get_readings(self, limit: int = 100, offset: int = 0, columns: str = "*") -> List[Dict[str, Any]]:
+        """Get recent readings, newest measurement first"""
+        try:
+            return self._newest_first(
+                lambda table, select: self.client.table(table).select(select),
+                limit, offset=offset, columns=columns
+            )
             
         except Exception as e:
-            print(f"❌ Error getting readings: {str(e)}")
+            logger.error(f"❌ Error getting readings: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_readings').inc()
             return []
     
+    @timed_query
+    def get_readings_with_count(self, limit: int = 1000,
+                                exact_count: bool = True) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Newest readings and, in the same query, the total row count"""
+        try:
+            if self.partitions is not None:
+                rows = self._newest_first(lambda table, select: self.client.table(table).select(select), limit)
+                return rows, self.count_readings() if exact_count else None
+
+            query = self.client.table(self.table_name)
+            query = query.select("*", count="exact") if exact_count else query.select("*")
+            response = query.order("measured_at", desc=True)\
+                            .limit(limit)\
+                            .execute()
+
+            return response.data or [], response.count if exact_count else None
+
+        except Exception as e:
+            logger.error(f"❌ Error getting readings with count: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_readings_with_count').inc()
+            return [], None
+
+    @timed_query
+    def get_readings_after(self, after_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Readings stored after ``after_id``, oldest id first"""
+        try:
+            # Late readings land in older months too, so every table is asked
+            pages = []
+            for table in self._tables():
+                response = self.client.table(table)\
+                                     .select("*")\
+                                     .gt("id", after_id)\
+                                     .order("id")\
+                                     .limit(limit)\
+                                     .execute()
+                pages.append(response.data or [])
+
+            if len(pages) == 1:
+                return pages[0]
+            return list(heapq.merge(*pages, key=lambda row: row['id']))[:limit]
+
+        except Exception as e:
+            logger.error(f"❌ Error getting readings after id {after_id}: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_readings_after').inc()
+            raise
+
+    @timed_query
+    def get_readings_by_ids(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """Readings with the given ids that exist, oldest id first"""
+        if not ids:
+            return []
+        try:
+            rows = []
+            for table in self._tables():
+                response = self.client.table(table).select("*").in_("id", ids).execute()
+                rows.extend(response.data or [])
+            return sorted(rows, key=lambda row: row['id'])
+
+        except Exception as e:
+            logger.error(f"❌ Error getting readings by id: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_readings_by_ids').inc()
+            raise
+
+    @timed_query
+    def get_readings_between(self, start: str, end: str, limit: int = 1000,
+                             columns: str = "*") -> List[Dict[str, Any]]:
+        """Get readings measured in [start, end), newest first"""
+        try:
+            return self._newest_first(
+                lambda table, select: self.client.table(table)
+                                          .select(select)
+                                          .gte("measured_at", start)
+                                          .lt("measured_at", end),
+                limit, columns=columns, start=start, end=end
+            )
+
+        except Exception as e:
+            logger.error(f"❌ Error getting readings between {start} and {end}: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_readings_between').inc()
+            return []
+
+    @timed_query
+    def get_device_readings(self, device_id: str, limit: int = 100,
+                            columns: str = "*") -> List[Dict[str, Any]]:
+        """Get the most recent readings for one device"""
+        try:
+            return self._newest_first(
+                lambda table, select: self.client.table(table).select(select).eq("device_id", device_id),
+                limit, columns=columns
+            )
+
+        except Exception as e:
+            logger.error(f"❌ Error getting readings for {device_id}: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_device_readings').inc()
+            return []
+
+    def iter_readings(self, device_id: Optional[str] = None,
+                      start: Optional[str] = None, end: Optional[str] = None,
+                      after_id: Optional[int] = None,
+                      page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream readings in ascending id order using keyset pagination
+
+        ``start``/``end`` bound the measurement time (``measured_at``).
+
+        Each page asks for ``id > last seen id`` instead of an offset, so the
+        cost per page stays constant and only one page is held in memory.
+        ``after_id`` resumes an interrupted stream. With partitions, the
+        tables overlapping [start, end) are streamed side by side and merged
+        by id.
+        """
+        streams = [
+            self._iter_table(table, device_id, start, end, after_id, page_size)
+            for table in self._tables(start, end)
+        ]
+        if len(streams) == 1:
+            return streams[0]
+        return heapq.merge(*streams, key=lambda row: row['id'])
+
+    def _iter_table(self, table: str, device_id: Optional[str], start: Optional[str],
+                    end: Optional[str], after_id: Optional[int],
+                    page_size: int) -> Iterator[Dict[str, Any]]:
+        last_id = after_id
+        while True:
+            query = self.client.table(table).select("*")
+            if device_id:
+                query = query.eq("device_id", device_id)
+            if start:
+                query = query.gte("measured_at", start)
+            if end:
+                query = query.lt("measured_at", end)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+
+            with SUPABASE_QUERY_DURATION.labels('iter_readings').time():
+                response = query.order("id").limit(page_size).execute()
+            page = response.data or []
+
+            for reading in page:
+                yield reading
+
+            if len(page) < page_size:
+                return
+            last_id = page[-1]['id']
+
+    @timed_query
+    def get_max_reading_id(self) -> int:
+        """Highest stored reading id (0 when the table is empty)"""
+        highest = 0
+        for table in self._tables():
+            response = self.client.table(table)\
+                                 .select("id")\
+                                 .order("id", desc=True)\
+                                 .limit(1)\
+                                 .execute()
+            if response.data:
+                highest = max(highest, response.data[0]['id'])
+        return highest
+
+    @timed_query
+    def count_readings(self, up_to_id: Optional[int] = None) -> int:
+        """Number of stored readings, optionally only those with ``id <= up_to_id``"""
+        total = 0
+        for table in self._tables():
+            query = self.client.table(table).select("id", count="exact")
+            if up_to_id is not None:
+                query = query.lte("id", up_to_id)
+            total += query.limit(1).execute().count or 0
+        return total
+
+    @timed_query
+    def count_readings_before(self, cutoff: str) -> int:
+        """Number of raw readings measured before ``cutoff``"""
+        total = 0
+        for table in self._tables(end=cutoff):
+            response = self.client.table(table)\
+                                 .select("id", count="exact")\
+                                 .lt("measured_at", cutoff)\
+                                 .limit(1)\
+                                 .execute()
+            total += response.count or 0
+        return total
+
+    @timed_query
+    def delete_readings(self, ids: List[int], before: Optional[str] = None) -> int:
+        """Delete raw readings by id; ``before`` (their measured_at bound) prunes partitions"""
+        if not ids:
+            return 0
+        try:
+            for table in self._tables(end=before):
+                self.client.table(table).delete().in_("id", ids).execute()
+            return len(ids)
+        except Exception as e:
+            logger.error(f"❌ Error deleting {len(ids)} readings: {str(e)}")
+            raise
+
+    @timed_query
+    def get_hourly_rollups(self, start: Optional[str] = None, end: Optional[str] = None,
+                           device_ids: Optional[List[str]] = None,
+                           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Hourly aggregates with ``start <= bucket < end``"""
+        query = self.client.table(self.hourly_table_name).select("*")
+        if device_ids is not None:
+            query = query.in_("device_id", device_ids)
+        if start:
+            query = query.gte("bucket", start)
+        if end:
+            query = query.lt("bucket", end)
+        if limit:
+            query = query.limit(limit)
+        response = query.order("bucket").execute()
+        return response.data or []
+
+    @timed_query
+    def get_hourly_rollups_by_key(self, keys: Iterable[Tuple[str, str]],
+                                  chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        Hourly aggregates for exact ``(device_id, bucket)`` keys
+
+        One query per bucket and ``chunk_size`` devices, so no response can
+        reach the PostgREST row cap and silently drop aggregates.
+        """
+        devices_by_bucket: Dict[str, set] = {}
+        for device_id, bucket in keys:
+            devices_by_bucket.setdefault(bucket, set()).add(device_id)
+
+        rollups = []
+        for bucket, devices in sorted(devices_by_bucket.items()):
+            devices = sorted(devices)
+            for start in range(0, len(devices), chunk_size):
+                response = self.client.table(self.hourly_table_name)\
+                                      .select("*")\
+                                      .eq("bucket", bucket)\
+                                      .in_("device_id", devices[start:start + chunk_size])\
+                                      .execute()
+                rollups.extend(response.data or [])
+        return rollups
+
+    @timed_query
+    def upsert_hourly_rollups(self, rows: List[Dict[str, Any]]):
+        """Insert or replace hourly aggregates keyed on (device_id, bucket)"""
+        if not rows:
+            return
+        try:
+            self.client.table(self.hourly_table_name)\
+                       .upsert(rows, on_conflict="device_id,bucket")\
+                       .execute()
+        except Exception as e:
+            logger.error(f"❌ Error writing {len(rows)} hourly rollups: {str(e)}")
+            raise
+
+    @timed_query
+    def get_rollup_watermark(self) -> Optional[int]:
+        """Highest raw reading id already folded by the incremental rollup"""
+        response = self.client.table(self.rollup_state_table_name)\
+                             .select("last_reading_id")\
+                             .eq("name", "hourly")\
+                             .limit(1)\
+                             .execute()
+        return response.data[0]['last_reading_id'] if response.data else None
+
+    @timed_query
+    def set_rollup_watermark(self, reading_id: int):
+        self.client.table(self.rollup_state_table_name)\
+                   .upsert({'name': 'hourly', 'last_reading_id': reading_id}, on_conflict="name")\
+                   .execute()
+
+    def iter_hourly_rollups(self, start: Optional[str] = None, columns: str = "*",
+                            page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of hourly aggregates with ``bucket >= start`` (keyset on id)"""
+        if columns != "*" and "id" not in [c.strip() for c in columns.split(',')]:
+            columns = f"id,{columns}"
+        last_id = None
+        while True:
+            query = self.client.table(self.hourly_table_name).select(columns)
+            if start:
+                query = query.gte("bucket", start)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            with SUPABASE_QUERY_DURATION.labels('iter_hourly_rollups').time():
+                response = query.order("id").limit(page_size).execute()
+            page = response.data or []
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]['id']
+
+    @timed_query
+    def count_hourly_before(self, cutoff: str) -> int:
+        """Number of hourly aggregates for buckets before ``cutoff``"""
+        response = self.client.table(self.hourly_table_name)\
+                             .select("id", count="exact")\
+                             .lt("bucket", cutoff)\
+                             .limit(1)\
+                             .execute()
+        return response.count or 0
+
+    @timed_query
+    def purge_hourly_before(self, cutoff: str, limit: int = 1000) -> int:
+        """Delete up to ``limit`` hourly aggregates older than ``cutoff``"""
+        try:
+            response = self.client.table(self.hourly_table_name)\
+                                 .select("id")\
+                                 .lt("bucket", cutoff)\
+                                 .limit(limit)\
+                                 .execute()
+            ids = [row['id'] for row in response.data or []]
+            if ids:
+                self.client.table(self.hourly_table_name).delete().in_("id", ids).execute()
+            return len(ids)
+        except Exception as e:
+            logger.error(f"❌ Error purging hourly rollups before {cutoff}: {str(e)}")
+            raise
+
+    @timed_query
     def get_latest_readings(self) -> List[Dict[str, Any]]:
         """Get latest reading for each device"""
         try:
-            # Get all readings ordered by date
-            response = self.client.table(self.table_name)\
-                                 .select("*")\
-                                 .order("created_at", desc=True)\
-                                 .execute()
-            
-            # Group by device and take latest
             latest_by_device = {}
-            for reading in response.data:
-                device_id = reading['device_id']
-                if device_id not in latest_by_device:
-                    latest_by_device[device_id] = reading
+            for table in self._tables():
+                # Get all readings ordered by measurement time
+                response = self.client.table(table)\
+                                     .select("*")\
+                                     .order("measured_at", desc=True)\
+                                     .execute()
+
+                # Group by device and take latest
+                for reading in response.data:
+                    device_id = reading['device_id']
+                    current = latest_by_device.get(device_id)
+                    if current is None or str(reading_time(reading) or '') > str(reading_time(current) or ''):
+                        latest_by_device[device_id] = reading
             
             return list(latest_by_device.values())
             
         except Exception as e:
-            print(f"❌ Error getting latest readings: {str(e)}")
+            logger.error(f"❌ Error getting latest readings: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_latest_readings').inc()
             return []
     
+    @timed_query
     def get_statistics(self) -> Dict[str, Any]:
         """Get statistics about readings"""
         try:
             # Get total count
-            count_response = self.client.table(self.table_name)\
-                                       .select("id", count="exact")\
-                                       .execute()
-            
-            total_count = count_response.count or 0
+            total_count = self.count_readings()
             
             # Get all readings for analysis
             all_readings = self.get_readings(limit=1000)
@@ -107,7 +650,8 @@ class SupabaseService:
             }
             
         except Exception as e:
-            print(f"❌ Error getting statistics: {str(e)}")
+            logger.error(f"❌ Error getting statistics: {str(e)}")
+            SUPABASE_QUERY_ERRORS.labels('get_statistics').inc()
             return {
                 "total_readings": 0,
                 "unique_devices": 0,
@@ -0,0 +1,342 @@
+"""
+Surface - interpolated water-quality grids for the map
+
+``/api/surface`` returns a regular latitude/longitude grid over a bounding
+box, with one layer per field: the quality score (good 1.0, warning 0.5,
+else 0.1, as on the heatmap) and each sensor. A cell's value is the
+inverse-distance weighted mean of the ``SURFACE_NEIGHBOURS`` nearest
+devices (weight 1 / d^``SURFACE_POWER``). Cells farther than
+``SURFACE_MAX_DISTANCE_KM`` from every device are left empty.
+
+The cell size follows the map zoom (``SURFACE_CELL_PIXELS`` screen pixels
+per cell, coarsened to stay under ``SURFACE_MAX_CELLS``) and the bbox is
+snapped outward to whole cells, so nearby pans share grids. Only devices
+within reach of the bbox are used. Neighbours come from a KD-tree over
+them in a local equirectangular projection (brute force without
+scikit-learn), and the weighting is vectorized over all cells at once,
+so the cost grows with cells × neighbours rather than with the fleet.
+
+Grids are cached per (bbox, zoom, fields, time bucket) in each worker,
+as the encoded body only (2 bytes per cell and field); ``format=json``
+decodes it. Positions and values come from the fleet snapshot (else the
+latest readings) once per ``SURFACE_BUCKET_SECONDS``, so workers can
+hold different grids for the same key: the ETag is a hash of the body.
+
+Binary format (``application/x-wq-surface``, little-endian)::
+
+    magic        4s   b'WQSG'
+    version      u8   1
+    field_count  u8
+    width        u16  cells west to east
+    height       u16  cells north to south
+    bbox         4f8  min_lng, min_lat, max_lng, max_lat (outer cell edges)
+    generated_at u32  epoch seconds
+    devices      u32  devices that contributed
+    per field:   u8 name length, name (UTF-8), f8 offset, f8 scale
+    per field:   width × height u16, row-major from the north-west cell;
+                 value = offset + q × scale, 0xFFFF = no data
+
+A 256 × 256 grid is 128 KiB per field before compression.
+"""
+
+import hashlib
+import logging
+import math
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from sklearn.neighbors import KDTree
+except ImportError:
+    KDTree = None
+
+from config.settings import Config
+from services.fleet_snapshot import fleet_snapshot
+from services.metrics import register_stats_gauges
+from services.precompute import QUALITY_VALUES
+from services.recent_readings import QUALITY_NAMES
+from services.supabase_service import supabase_service
+
+logger = logging.getLogger(__name__)
+
+MIMETYPE = 'application/x-wq-surface'
+MAGIC = b'WQSG'
+VERSION = 1
+NO_DATA = 0xFFFF
+
+_HEADER = struct.Struct('<4sBBHH4dII')
+_FIELD = struct.Struct('<dd')
+# Width and height are u16 in the header
+MAX_GRID_SIDE = 0xFFFF
+
+SENSOR_FIELDS = ('temperature', 'ph', 'tds', 'turbidity')
+FIELDS = ('quality',) + SENSOR_FIELDS
+# Quality score per fleet snapshot quality code
+QUALITY_SCORE_BY_CODE = np.array([QUALITY_VALUES.get(QUALITY_NAMES[code], 0.1)
+                                  for code in range(len(QUALITY_NAMES))])
+
+KM_PER_DEGREE = 111.195
+MAX_ZOOM = 18
+# Bounded memory for the brute-force fallback (cells × devices per chunk)
+BRUTE_FORCE_CHUNK = 20_000_000
+
+
+class InvalidSurfaceRequest(ValueError):
+    """Raised when bbox, zoom or fields cannot be used"""
+
+
+def parse_bbox(value: Optional[str]) -> Tuple[float, float, float, float]:
+    """``min_lng,min_lat,max_lng,max_lat`` in degrees"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in (value or '').split(','))
+    except ValueError:
+        raise InvalidSurfaceRequest("bbox must be min_lng,min_lat,max_lng,max_lat")
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise InvalidSurfaceRequest("bbox must have min < max, longitudes in [-180, 180] "
+                                    "and latitudes in [-90, 90]")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_surface_fields(value: Optional[str]) -> Tuple[str, ...]:
+    if not value:
+        return FIELDS
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise InvalidSurfaceRequest(f"Unknown fields {unknown}. Allowed: {list(FIELDS)}")
+    return fields
+
+
+def grid_for(bbox: Tuple[float, float, float, float], zoom: int,
+             cell_pixels: int, max_cells: int) -> Dict[str, Any]:
+    """
+    Cell size for ``zoom`` and the bbox snapped outward to whole cells
+
+    The cell is coarsened until the grid has at most ``max_cells`` cells
+    and neither side exceeds ``MAX_GRID_SIDE`` (a long, thin bbox).
+    """
+    cell = 360.0 / (256 * 2 ** zoom) * cell_pixels
+    min_lng, min_lat, max_lng, max_lat = bbox
+    while True:
+        west, east = math.floor(min_lng / cell) * cell, math.ceil(max_lng / cell) * cell
+        south, north = math.floor(min_lat / cell) * cell, math.ceil(max_lat / cell) * cell
+        width, height = round((east - west) / cell), round((north - south) / cell)
+        if width * height <= max_cells and max(width, height) <= MAX_GRID_SIDE:
+            break
+        cell *= max(math.ceil(math.sqrt(width * height / max_cells)),
+                    math.ceil(max(width, height) / MAX_GRID_SIDE))
+    return {'cell': cell, 'width': width, 'height': height,
+            'bbox': (round(west, 9), round(south, 9), round(east, 9), round(north, 9))}
+
+
+def idw(device_lat: np.ndarray, device_lng: np.ndarray, values: np.ndarray,
+        cell_lat: np.ndarray, cell_lng: np.ndarray, neighbours: int, power: float,
+        max_distance_km: float) -> np.ndarray:
+    """
+    Inverse-distance weighted values at the cells, shape (cells, fields)
+
+    Distances use an equirectangular projection around the cells' mean
+    latitude. A device missing a field (NaN) gets no weight for it; a cell
+    with no device within ``max_distance_km`` is NaN.
+    """
+    cells = len(cell_lat)
+    result = np.full((cells, values.shape[1]), np.nan)
+    if len(device_lat) == 0 or cells == 0:
+        return result
+
+    scale = math.cos(math.radians(float(np.mean(cell_lat))))
+    devices_xy = np.column_stack([device_lng * scale, device_lat]) * KM_PER_DEGREE
+    cells_xy = np.column_stack([cell_lng * scale, cell_lat]) * KM_PER_DEGREE
+    k = min(neighbours, len(device_lat))
+
+    if KDTree is not None:
+        distances, indices = KDTree(devices_xy).query(cells_xy, k=k)
+    else:
+        distances = np.empty((cells, k))
+        indices = np.empty((cells, k), dtype=np.int64)
+        chunk = max(1, BRUTE_FORCE_CHUNK // len(device_lat))
+        for start in range(0, cells, chunk):
+            block = cells_xy[start:start + chunk]
+            squared = ((block[:, None, :] - devices_xy[None, :, :]) ** 2).sum(axis=2)
+            nearest = np.argpartition(squared, k - 1, axis=1)[:, :k] if k < len(device_lat) \
+                else np.broadcast_to(np.arange(k), (len(block), k))
+            indices[start:start + chunk] = nearest
+            distances[start:start + chunk] = np.sqrt(np.take_along_axis(squared, nearest, axis=1))
+
+    # A device sitting on a cell centre dominates instead of dividing by zero
+    weights = 1.0 / np.maximum(distances, 1e-6) ** power
+    weights[distances > max_distance_km] = 0.0
+
+    neighbour_values = values[indices]                       # (cells, k, fields)
+    present = ~np.isnan(neighbour_values)
+    field_weights = weights[:, :, None] * present
+    total = field_weights.sum(axis=1)
+    weighted = np.einsum('ckf,ckf->cf', field_weights, np.where(present, neighbour_values, 0.0))
+    np.divide(weighted, total, out=result, where=total > 0)
+    return result
+
+
+def encode_grid(grid: Dict[str, Any], fields: Tuple[str, ...], layers: np.ndarray,
+                generated_at: float, devices: int) -> bytes:
+    """Binary grid described in the module docstring"""
+    parts = [_HEADER.pack(MAGIC, VERSION, len(fields), grid['width'], grid['height'],
+                          *grid['bbox'], int(generated_at), devices)]
+    quantized = []
+    for index, name in enumerate(fields):
+        layer = layers[:, index]
+        known = ~np.isnan(layer)
+        offset = float(layer[known].min()) if known.any() else 0.0
+        top = float(layer[known].max()) if known.any() else 0.0
+        scale = (top - offset) / (NO_DATA - 1) if top > offset else 1.0
+        q = np.full(layer.shape, NO_DATA, dtype='<u2')
+        q[known] = np.rint((layer[known] - offset) / scale).astype('<u2')
+        encoded = name.encode('utf-8')
+        parts.append(struct.pack('<B', len(encoded)) + encoded + _FIELD.pack(offset, scale))
+        quantized.append(q.tobytes())
+    return b''.join(parts + quantized)
+
+
+def decode_layers(body: bytes) -> Dict[str, np.ndarray]:
+    """Each field of an encoded grid as a height × width array, NaN = no data"""
+    magic, version, field_count, width, height = _HEADER.unpack_from(body)[:5]
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a surface grid")
+    position = _HEADER.size
+    scales = []
+    for _ in range(field_count):
+        length = body[position]
+        name = body[position + 1:position + 1 + length].decode('utf-8')
+        position += 1 + length
+        scales.append((name,) + _FIELD.unpack_from(body, position))
+        position += _FIELD.size
+
+    layers = {}
+    for index, (name, offset, scale) in enumerate(scales):
+        q = np.frombuffer(body, dtype='<u2', count=width * height,
+                          offset=position + index * width * height * 2).reshape(height, width)
+        layer = offset + q * scale
+        layer[q == NO_DATA] = np.nan
+        layers[name] = layer
+    return layers
+
+
+def layer_rows(result: Dict[str, Any]) -> Dict[str, List[List[Optional[float]]]]:
+    """Each field of a ``surface()`` result as rows north to south, None = no data"""
+    rows = {}
+    for name, layer in decode_layers(result['body']).items():
+        cells = np.round(layer, 4).astype(object)
+        cells[np.isnan(layer)] = None
+        rows[name] = cells.tolist()
+    return rows
+
+
+class SurfaceService:
+    """Builds and caches interpolated grids from the latest reading per device"""
+
+    def __init__(self, bucket_seconds: int, cache_size: int):
+        self.bucket_seconds = bucket_seconds
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._points: Optional[Tuple[int, Dict[str, np.ndarray]]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bucket(self, now: Optional[float] = None) -> int:
+        return int((time.time() if now is None else now) // self.bucket_seconds)
+
+    def _load_points(self) -> Dict[str, np.ndarray]:
+        """Position and field values of every device with a position"""
+        slots = fleet_snapshot.locations(['latitude', 'longitude', 'quality'] + list(SENSOR_FIELDS))
+        if slots is not None:
+            columns = {name: slots[name].astype(np.float64) for name in ('latitude', 'longitude') + SENSOR_FIELDS}
+            columns['quality'] = QUALITY_SCORE_BY_CODE[slots['quality']]
+        else:
+            latest = supabase_service.get_latest_readings()
+            columns = {name: np.array([np.nan if r.get(name) is None else float(r[name]) for r in latest],
+                                      dtype=np.float64)
+                       for name in ('latitude', 'longitude') + SENSOR_FIELDS}
+            columns['quality'] = np.array([
+                QUALITY_VALUES.get(r.get('quality') or supabase_service.determine_water_quality(r), 0.1)
+                for r in latest
+            ])
+        # Same rule as the heatmap: no position, or 0/0, is unknown
+        lat, lng = columns['latitude'], columns['longitude']
+        known = np.isfinite(lat) & np.isfinite(lng) & ~((lat == 0) & (lng == 0))
+        return {name: column[known] for name, column in columns.items()}
+
+    def points(self, bucket: int) -> Dict[str, np.ndarray]:
+        """Device points for a time bucket, loaded once per bucket"""
+        cached = self._points
+        if cached is not None and cached[0] == bucket:
+            return cached[1]
+        points = self._load_points()
+        self._points = (bucket, points)
+        return points
+
+    def surface(self, bbox: Tuple[float, float, float, float], zoom: int,
+                fields: Tuple[str, ...] = FIELDS) -> Dict[str, Any]:
+        """
+        Grid for a bbox and zoom, from the cache when this time bucket has one
+
+        Returns the grid geometry, the encoded ``body``, its ``etag`` and a
+        cache ``key``.
+        """
+        zoom = max(0, min(MAX_ZOOM, int(zoom)))
+        grid = grid_for(bbox, zoom, Config.SURFACE_CELL_PIXELS, Config.SURFACE_MAX_CELLS)
+        bucket = self.bucket()
+        key = (grid['bbox'], zoom, fields, bucket)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        started = time.perf_counter()
+        points = self.points(bucket)
+        west, south, east, north = grid['bbox']
+        cell = grid['cell']
+
+        # Devices within reach of the bbox
+        reach = Config.SURFACE_MAX_DISTANCE_KM / KM_PER_DEGREE
+        reach_lng = reach / max(math.cos(math.radians(max(abs(south), abs(north)))), 0.01)
+        lat, lng = points['latitude'], points['longitude']
+        near = ((lat >= south - reach) & (lat <= north + reach)
+                & (lng >= west - reach_lng) & (lng <= east + reach_lng))
+
+        cell_lng = west + (np.arange(grid['width']) + 0.5) * cell
+        cell_lat = north - (np.arange(grid['height']) + 0.5) * cell
+        grid_lng, grid_lat = np.meshgrid(cell_lng, cell_lat)
+        values = np.column_stack([points[name][near] for name in fields])
+        layers = idw(lat[near], lng[near], values, grid_lat.ravel(), grid_lng.ravel(),
+                     Config.SURFACE_NEIGHBOURS, Config.SURFACE_POWER, Config.SURFACE_MAX_DISTANCE_KM)
+
+        generated_at = time.time()
+        result = dict(grid, zoom=zoom, fields=fields, bucket=bucket, key=key,
+                      devices=int(near.sum()), generated_at=generated_at,
+                      compute_seconds=round(time.perf_counter() - started, 4),
+                      expires_at=(bucket + 1) * self.bucket_seconds)
+        result['body'] = encode_grid(grid, fields, layers, generated_at, result['devices'])
+        result['etag'] = hashlib.sha1(result['body']).hexdigest()[:20]
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {'cached_grids': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+# Singleton instance
+surface_service = SurfaceService(Config.SURFACE_BUCKET_SECONDS, Config.SURFACE_CACHE_SIZE)
+
+register_stats_gauges('surface', 'Interpolated map surface', surface_service.stats)
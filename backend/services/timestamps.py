@@ -0,0 +1,74 @@
+"""
+Timestamps - device measurement times vs server receive times
+
+``measured_at`` is when the device took the reading; ``created_at`` is when
+the API received it. Store-and-forward devices upload readings late and out
+of order, so every time-based view orders and filters on ``measured_at``.
+"""
+
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import Config
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def to_iso(moment: datetime) -> str:
+    """Normalized UTC ISO 8601 string, as Postgres returns timestamptz"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse ISO 8601 (``Z`` suffix allowed; naive means UTC) or epoch seconds"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        try:
+            moment = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment
+    return None
+
+
+def check_measured_at(value: Any, now: Optional[datetime] = None) -> Tuple[Optional[str], Optional[str], str]:
+    """
+    Validate a device timestamp against the configured clock-skew bounds
+
+    Returns ``(iso, None, '')`` or ``(None, error_code, message)``. Readings
+    may be up to ``MEASURED_AT_MAX_FUTURE_SECONDS`` ahead of server time
+    (device clock drift) and ``MEASURED_AT_MAX_AGE_SECONDS`` behind it
+    (store-and-forward backlog).
+    """
+    moment = parse_timestamp(value)
+    if moment is None:
+        return None, 'format', 'measured_at must be ISO 8601 or epoch seconds'
+
+    now = now or utc_now()
+    if moment - now > timedelta(seconds=Config.MEASURED_AT_MAX_FUTURE_SECONDS):
+        return None, 'future', (f'measured_at is more than {Config.MEASURED_AT_MAX_FUTURE_SECONDS}s '
+                                f'ahead of server time')
+    if now - moment > timedelta(seconds=Config.MEASURED_AT_MAX_AGE_SECONDS):
+        return None, 'too_old', (f'measured_at is more than {Config.MEASURED_AT_MAX_AGE_SECONDS}s '
+                                 f'behind server time')
+    return to_iso(moment), None, ''
+
+
+def reading_time(reading: Dict[str, Any]) -> Optional[str]:
+    """Measurement time of a stored reading (receive time for legacy rows)"""
+    return reading.get('measured_at') or reading.get('created_at')
@@ -0,0 +1,170 @@
+"""
+Payload Validation - precompiled schema checks for sensor payloads
+
+The schema is turned into a flat tuple of field specs once at import, so
+validating a payload is one pass with no per-request setup. Errors are
+returned as structured dicts instead of being raised, so batch ingest can
+report every bad reading at once.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import Config
+from services.timestamps import check_measured_at
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+
+def loads(data: bytes) -> Any:
+    """Parse a JSON request body (orjson when available)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS, default=str)
+    return json.dumps(obj, default=str).encode('utf-8')
+
+
+# Field → (kind, min, max); kind is 'id', 'float' or 'int'
+SENSOR_SCHEMA = {
+    'device_id': ('id', None, None),
+    'temperature': ('float',) + Config.PAYLOAD_LIMITS['temperature'],
+    'ph': ('float',) + Config.PAYLOAD_LIMITS['ph'],
+    'tds': ('int',) + Config.PAYLOAD_LIMITS['tds'],
+    'turbidity': ('float',) + Config.PAYLOAD_LIMITS['turbidity'],
+    'latitude': ('float', -90.0, 90.0),
+    'longitude': ('float', -180.0, 180.0),
+}
+
+REQUIRED_FIELDS = tuple(SENSOR_SCHEMA)
+
+# Columns written to water_quality_readings (the rest only drive ingest logic)
+STORED_FIELDS = REQUIRED_FIELDS + ('measured_at', 'idempotency_key', 'imputed', 'raw_values')
+
+_COMPILED = tuple(
+    (field, kind, low, high) for field, (kind, low, high) in SENSOR_SCHEMA.items()
+)
+
+_isfinite = math.isfinite
+
+
+def _error(field: str, code: str, message: str, value: Any = None) -> Dict[str, Any]:
+    error = {'field': field, 'error': code, 'message': message}
+    if value is not None:
+        error['value'] = value
+    return error
+
+
+def validate_reading(data: Any) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Validate and normalize one sensor payload
+
+    Returns ``(reading, [])`` on success or ``(None, errors)``. Numbers may
+    arrive as JSON numbers or numeric strings; booleans, NaN and ±inf are
+    rejected. ``measured_at`` is normalized to UTC ISO 8601.
+    """
+    if not isinstance(data, dict):
+        return None, [_error('', 'type', 'payload must be a JSON object')]
+
+    reading = {}
+    errors = []
+
+    for field, kind, low, high in _COMPILED:
+        value = data.get(field)
+        if value is None:
+            errors.append(_error(field, 'missing', f'{field} is required'))
+            continue
+
+        if kind == 'id':
+            if isinstance(value, bool) or not isinstance(value, (str, int)):
+                errors.append(_error(field, 'type', f'{field} must be a string', value))
+                continue
+            value = str(value).strip()
+            if not value or len(value) > Config.DEVICE_ID_MAX_LENGTH:
+                errors.append(_error(field, 'length',
+                                     f'{field} must be 1-{Config.DEVICE_ID_MAX_LENGTH} characters'))
+                continue
+            reading[field] = value
+            continue
+
+        if isinstance(value, bool):
+            errors.append(_error(field, 'type', f'{field} must be a number', value))
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            errors.append(_error(field, 'type', f'{field} must be a number', value))
+            continue
+
+        if not _isfinite(number):
+            errors.append(_error(field, 'not_finite', f'{field} must be finite', str(value)))
+            continue
+        if number < low or number > high:
+            errors.append(_error(field, 'range', f'{field} must be between {low} and {high}', number))
+            continue
+
+        reading[field] = int(number) if kind == 'int' else number
+
+    # Optional fields used to recognise retried uploads
+    seq = data.get('seq')
+    if seq is not None:
+        if isinstance(seq, bool) or not isinstance(seq, int) or seq < 0:
+            errors.append(_error('seq', 'type', 'seq must be a non-negative integer', seq))
+        else:
+            reading['seq'] = seq
+
+    # Device measurement time; defaults to the receive time when absent
+    measured_at = data.get('measured_at')
+    if measured_at is not None:
+        iso, code, message = check_measured_at(measured_at)
+        if code:
+            errors.append(_error('measured_at', code, message, measured_at))
+        else:
+            reading['measured_at'] = iso
+
+    key = data.get('idempotency_key')
+    if key is not None:
+        if not isinstance(key, str) or not key or len(key) > Config.IDEMPOTENCY_KEY_MAX_LENGTH:
+            errors.append(_error('idempotency_key', 'type',
+                                 f'idempotency_key must be a string of 1-{Config.IDEMPOTENCY_KEY_MAX_LENGTH} characters'))
+        else:
+            reading['idempotency_key'] = key
+
+    if errors:
+        return None, errors
+    return reading, []
+
+
+def validate_batch(items: Any) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Validate a list of payloads
+
+    Returns the valid readings and a list of ``{'index': i, 'errors': [...]}``
+    entries for the rejected ones.
+    """
+    if isinstance(items, dict):
+        items = items.get('readings')
+    if not isinstance(items, list):
+        return [], [{'index': None, 'errors': [_error('readings', 'type', 'expected a list of readings')]}]
+    if len(items) > Config.INGEST_MAX_BATCH:
+        return [], [{'index': None, 'errors': [_error(
+            'readings', 'length', f'at most {Config.INGEST_MAX_BATCH} readings per batch')]}]
+
+    valid = []
+    rejected = []
+    for index, item in enumerate(items):
+        reading, errors = validate_reading(item)
+        if errors:
+            rejected.append({'index': index, 'errors': errors})
+        else:
+            valid.append(reading)
+    return valid, rejected
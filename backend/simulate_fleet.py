@@ -0,0 +1,281 @@
+"""
+Fleet Simulator - Standalone Script
+
+Generates a deterministic fleet of water quality sensors and replays their
+traffic against ``/api/sensor/data``. Every device has its own position,
+reporting phase, diurnal temperature cycle, slowly drifting pH probe,
+occasional turbidity spikes and connectivity drop-outs after which it
+uploads its backlog in a burst. The same ``--seed`` always produces the same
+traffic.
+
+Usage:
+
+    python simulate_fleet.py --devices 2000 --duration 3600 --rate 200
+    python simulate_fleet.py --devices 50 --duration 600 --dry-run 5
+    python simulate_fleet.py --url http://staging:5000 --connections 32 --output run.json
+"""
+
+import argparse
+import heapq
+import http.client
+import json
+import logging
+import math
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fleet is centred on Oran, matching the dashboard's default map view
+CENTER_LAT = 35.1892
+CENTER_LNG = -0.6417
+
+
+class SimulatedDevice:
+    """One sensor's physical state, advanced one reading at a time"""
+
+    def __init__(self, index: int, seed: int, interval: float, spread_km: float):
+        self.rng = random.Random(seed * 1_000_003 + index)
+        self.device_id = f"sim-{index:05d}"
+        self.interval = interval
+        self.phase = self.rng.uniform(0, interval)
+
+        # ~111 km per degree of latitude
+        self.latitude = CENTER_LAT + self.rng.gauss(0, spread_km / 111.0)
+        self.longitude = CENTER_LNG + self.rng.gauss(0, spread_km / (111.0 * math.cos(math.radians(CENTER_LAT))))
+
+        self.base_temp = self.rng.uniform(16, 24)
+        self.temp_amplitude = self.rng.uniform(1.5, 5.0)
+        self.ph = self.rng.uniform(6.8, 7.8)
+        self.ph_drift_per_day = self.rng.gauss(0, 0.05)
+        self.base_tds = self.rng.uniform(120, 420)
+        self.base_turbidity = self.rng.uniform(0.5, 3.0)
+        self.spike_remaining = 0
+        self.seq = 0
+
+        # Drop-outs: (start, end) in simulated seconds
+        self.outage_rate_per_hour = self.rng.uniform(0.0, 0.3)
+        self.offline_until = -1.0
+
+    def reading(self, t: float):
+        """Sensor values at simulated time ``t`` seconds"""
+        day_fraction = (t / 86400.0) % 1.0
+        temperature = (self.base_temp
+                       + self.temp_amplitude * math.sin(2 * math.pi * (day_fraction - 0.375))
+                       + self.rng.gauss(0, 0.2))
+
+        self.ph += self.ph_drift_per_day * self.interval / 86400.0 + self.rng.gauss(0, 0.01)
+
+        if self.spike_remaining == 0 and self.rng.random() < 0.002:
+            self.spike_remaining = self.rng.randint(3, 15)
+        if self.spike_remaining:
+            self.spike_remaining -= 1
+            turbidity = self.base_turbidity * self.rng.uniform(5, 15)
+            tds = self.base_tds * self.rng.uniform(1.2, 1.8)
+        else:
+            turbidity = max(0.0, self.base_turbidity + self.rng.gauss(0, 0.3))
+            tds = max(0.0, self.base_tds + self.rng.gauss(0, 10))
+
+        self.seq += 1
+        return {
+            'device_id': self.device_id,
+            'seq': self.seq,
+            'temperature': round(temperature, 2),
+            'ph': round(self.ph, 3),
+            'tds': int(tds),
+            'turbidity': round(turbidity, 2),
+            'latitude': round(self.latitude, 6),
+            'longitude': round(self.longitude, 6),
+        }
+
+    def send_time(self, t: float) -> float:
+        """When a reading taken at ``t`` actually goes out (later if offline)"""
+        if t < self.offline_until:
+            return self.offline_until
+        hourly_chance = self.outage_rate_per_hour * self.interval / 3600.0
+        if self.rng.random() < hourly_chance:
+            self.offline_until = t + self.rng.uniform(60, 1800)
+            return self.offline_until
+        return t
+
+
+def generate_traffic(devices: int, duration: float, interval: float, seed: int,
+                     spread_km: float = 15.0, start: datetime = None):
+    """
+    Yield ``(send_time, payload)`` in send order
+
+    Readings taken while a device is offline are all released when it
+    reconnects, producing a back-to-back burst.
+    """
+    # Measurement times end at "now" so replayed readings pass the clock-skew check
+    start = start or datetime.utcnow() - timedelta(seconds=duration)
+    fleet = [SimulatedDevice(i, seed, interval, spread_km) for i in range(devices)]
+
+    # Heap of (send_time, sequence, device index, measured time, payload)
+    pending = []
+    sequence = 0
+    for index, device in enumerate(fleet):
+        heapq.heappush(pending, (device.phase, sequence, index, device.phase, None))
+        sequence += 1
+
+    while pending:
+        send_time, _, index, measured, payload = heapq.heappop(pending)
+        device = fleet[index]
+
+        if payload is not None:
+            yield send_time, payload
+            continue
+
+        # Schedule this device's reading and its next measurement
+        payload = device.reading(measured)
+        payload['measured_at'] = (start + timedelta(seconds=measured)).isoformat()
+        heapq.heappush(pending, (device.send_time(measured), sequence, index, measured, payload))
+        sequence += 1
+
+        next_measured = measured + interval
+        if next_measured < duration:
+            heapq.heappush(pending, (next_measured, sequence, index, next_measured, None))
+            sequence += 1
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Replayer:
+    """Paces traffic in real time and sends it over keep-alive connections"""
+
+    def __init__(self, url: str, connections: int, timeout: float):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.path = (parsed.path.rstrip('/') or '') + '/api/sensor/data'
+        self.connections = connections
+        self.timeout = timeout
+        self.work = queue.Queue(maxsize=connections * 4)
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.lag = []
+        self.status_counts = {}
+        self.errors = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _worker(self):
+        conn = self._connect()
+        while True:
+            item = self.work.get()
+            if item is None:
+                break
+            due, body = item
+            started = time.perf_counter()
+            try:
+                conn.request('POST', self.path, body=body,
+                             headers={'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except Exception:
+                conn.close()
+                conn = self._connect()
+                status = 'connection_error'
+            elapsed = time.perf_counter() - started
+
+            with self.lock:
+                self.latencies.append(elapsed)
+                self.lag.append(max(0.0, started - due))
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+                if status == 'connection_error' or status >= 400:
+                    self.errors += 1
+        conn.close()
+
+    def run(self, traffic, speedup: float):
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.connections)]
+        for worker in workers:
+            worker.start()
+
+        origin = time.perf_counter()
+        sent = 0
+        for send_time, payload in traffic:
+            due = origin + send_time / speedup
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.work.put((due, json.dumps(payload)))
+            sent += 1
+
+        for _ in workers:
+            self.work.put(None)
+        for worker in workers:
+            worker.join()
+        wall = time.perf_counter() - origin
+
+        ordered = sorted(self.latencies)
+        lag = sorted(self.lag)
+        return {
+            'requests': sent,
+            'wall_seconds': round(wall, 3),
+            'achieved_rate_per_s': round(sent / wall, 1) if wall else None,
+            'error_rate': round(self.errors / sent, 5) if sent else 0.0,
+            'status_counts': {str(k): v for k, v in self.status_counts.items()},
+            'latency_ms': {
+                name: round(percentile(ordered, fraction) * 1000, 3) if ordered else None
+                for name, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('max', 1.0))
+            },
+            'schedule_lag_ms_p99': round(percentile(lag, 0.99) * 1000, 3) if lag else None,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a simulated sensor fleet against the API")
+    parser.add_argument('--url', default='http://localhost:5000', help="API base URL")
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=3600, help="Simulated seconds of traffic")
+    parser.add_argument('--interval', type=float, default=60, help="Seconds between readings per device")
+    parser.add_argument('--rate', type=float, default=100, help="Average requests per second to send")
+    parser.add_argument('--connections', type=int, default=16, help="Concurrent keep-alive connections")
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dry-run', type=int, metavar='N', help="Print the first N payloads and exit")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    traffic = generate_traffic(args.devices, args.duration, args.interval, args.seed)
+
+    if args.dry_run:
+        for _, (send_time, payload) in zip(range(args.dry_run), traffic):
+            print(f"{send_time:10.2f}s {json.dumps(payload)}")
+        return 0
+
+    # Map simulated time onto wall time so the average rate matches --rate
+    speedup = args.rate * args.interval / args.devices
+    logger.info(f"🚀 Replaying {args.devices} devices × {args.duration:.0f}s "
+                f"at ~{args.rate:.0f} req/s ({speedup:.1f}× real time)")
+
+    report = Replayer(args.url, args.connections, args.timeout).run(traffic, speedup)
+    report['params'] = vars(args)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"✅ Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Ingest token buckets: per-request device charge, per-reading global charge"""
+
+from config.settings import Config
+from services.rate_limit import IngestLimiter
+
+
+def limiter(**overrides):
+    settings = dict(device_rate=Config.DEVICE_RATE_PER_SECOND, device_burst=Config.DEVICE_BURST,
+                    global_rate=Config.GLOBAL_INGEST_RATE_PER_SECOND,
+                    global_burst=Config.GLOBAL_INGEST_BURST)
+    settings.update(overrides)
+    return IngestLimiter(**settings)
+
+
+def batch(size: int, device: str = 'dev-0001'):
+    return [{'device_id': device, 'measured_at': f'2026-10-19T00:{i // 60:02d}:{i % 60:02d}+00:00'}
+            for i in range(size)]
+
+
+def test_full_batch_from_a_quiet_device_is_admitted():
+    admitted, throttled, retry_after = limiter().admit(batch(Config.INGEST_MAX_BATCH))
+    assert len(admitted) == Config.INGEST_MAX_BATCH
+    assert throttled == [] and retry_after == 0.0
+
+
+def test_device_is_charged_per_request():
+    limits = limiter(device_burst=2)
+    assert len(limits.admit(batch(10))[0]) == 10
+    assert len(limits.admit(batch(10))[0]) == 10
+    admitted, throttled, retry_after = limits.admit(batch(10))
+    assert admitted == [] and len(throttled) == 10
+    assert 0 < retry_after <= 1 / Config.DEVICE_RATE_PER_SECOND
+
+
+def test_retry_after_covers_every_reading_over_the_global_limit():
+    admitted, throttled, retry_after = limiter(global_rate=10, global_burst=60).admit(batch(200))
+    assert admitted == list(range(60))
+    assert throttled == list(range(60, 200))
+    assert abs(retry_after - 140 / 10) < 0.1
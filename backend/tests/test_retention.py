@@ -0,0 +1,59 @@
+"""Retention compaction against the PostgREST fake, which caps reads at 1000 rows"""
+
+from datetime import timedelta
+
+import pytest
+
+from benchmarks.fake_postgrest import FakeSupabaseClient
+from services.retention import CompactionJob
+from services.supabase_service import supabase_service
+from services.timestamps import to_iso, utc_now
+
+ROW_CAP = 1000
+DEVICES = 1000
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(supabase_service, 'client', FakeSupabaseClient(max_rows=ROW_CAP))
+    monkeypatch.setattr(supabase_service, 'partitions', None)
+    return supabase_service
+
+
+def reading(device: int, moment, temperature: float):
+    return {
+        'device_id': f'dev-{device:04d}',
+        'temperature': temperature,
+        'ph': 7.0,
+        'tds': 300,
+        'turbidity': 1.0,
+        'measured_at': to_iso(moment),
+    }
+
+
+def test_batch_across_an_hour_folds_into_every_existing_rollup(service):
+    hour = (utc_now() - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    next_hour = hour + timedelta(hours=1)
+    job = CompactionJob(service, batch_size=ROW_CAP)
+    # Past the settle window of readings stored just now
+    later = utc_now() + timedelta(minutes=10)
+
+    # Two hours of rollups for every device: twice the row cap
+    service.create_readings([reading(d, hour + timedelta(minutes=50), 20.0) for d in range(DEVICES)])
+    service.create_readings([reading(d, next_hour + timedelta(minutes=10), 20.0) for d in range(DEVICES)])
+    assert job.rollup_new(now=later)['rollups_written'] == 2 * DEVICES
+
+    # One batch with a reading per device, half in each hour
+    service.create_readings([
+        reading(d, (hour if d % 2 else next_hour) + timedelta(minutes=30), 30.0)
+        for d in range(DEVICES)
+    ])
+    assert job.rollup_new(now=later)['rollups_written'] == DEVICES
+
+    rollups = {(r['device_id'], r['bucket']): r
+               for r in service.client._tables[service.hourly_table_name].rows}
+    assert len(rollups) == 2 * DEVICES
+    for d in range(DEVICES):
+        updated = rollups[(f'dev-{d:04d}', to_iso(hour if d % 2 else next_hour))]
+        assert updated['reading_count'] == 2
+        assert updated['temperature_avg'] == 25.0
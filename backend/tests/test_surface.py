@@ -0,0 +1,18 @@
+"""Surface grid geometry and encoding"""
+
+import numpy as np
+
+from config.settings import Config
+from services.surface import FIELDS, MAX_GRID_SIDE, SurfaceService, decode_layers
+
+
+def test_long_thin_bbox_at_high_zoom_fits_the_header():
+    service = SurfaceService(bucket_seconds=3600, cache_size=1)
+    points = {name: np.ones(2) for name in FIELDS}
+    points.update(latitude=np.array([0.00005, 0.00005]), longitude=np.array([0.00005, 3.05]))
+    # Pin the points to the current bucket instead of reading the database
+    service._points = (service.bucket(), points)
+    result = service.surface((-180.0, 0.0, 180.0, 0.0001), 18, ('quality',))
+    assert max(result['width'], result['height']) <= MAX_GRID_SIDE
+    assert result['width'] * result['height'] <= Config.SURFACE_MAX_CELLS
+    assert decode_layers(result['body'])['quality'].shape == (result['height'], result['width'])
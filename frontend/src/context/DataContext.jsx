@@ -1,19 +1,31 @@
-import React, { createContext, useContext, useState, useEffect, useCallback, useMemo } from 'react';
+import React, { createContext, useContext, useState, useEffect, useCallback, useMemo, useRef } from 'react';
 import { toast } from 'react-hot-toast';
 import { 
-  fetchSensorData, 
+  getDashboard,
+  getChanges,
   sendTestData as apiSendTestData,
   getHistoricalData,
-  getHeatmapData,
-  getStatistics,
-  getAlerts,
   updateAlertStatus,
-  getDevices,
   updateDevice as apiUpdateDevice
 } from '../utils/api';
 
 const DataContext = createContext();
 
+// Incremental poll, and a full reload that corrects what polling can't (purges, resolved alerts)
+const POLL_INTERVAL_MS = 10000;
+const FULL_REFRESH_MS = 60000;
+
+const measuredAt = (item) => Date.parse(item.measured_at || item.timestamp || item.created_at || item.last_seen || '') || 0;
+
+// Merge by id (newer copy wins) and order by measurement time, newest first,
+// so late uploads of old measurements land where they belong
+const mergeById = (incoming, existing, limit) => {
+  const byId = new Map(existing.map(item => [item.id, item]));
+  incoming.forEach(item => byId.set(item.id, item));
+  const merged = [...byId.values()].sort((a, b) => measuredAt(b) - measuredAt(a));
+  return limit ? merged.slice(0, limit) : merged;
+};
+
 export const DataProvider = ({ children }) => {
   const [readings, setReadings] = useState([]);
   const [devices, setDevices] = useState([]);
@@ -33,43 +45,46 @@ export const DataProvider = ({ children }) => {
   const [selectedDevice, setSelectedDevice] = useState(null);
   const [lastUpdate, setLastUpdate] = useState(new Date());
   const [error, setError] = useState(null);
+  // Opaque cursor from /dashboard or /readings/changes, for incremental polling
+  const cursorRef = useRef(null);
 
-  // Load all data from REAL API
-  const loadData = useCallback(async () => {
-    setIsLoading(true);
+  // Load all data from REAL API (quietly for the periodic full refresh)
+  const loadData = useCallback(async ({ quiet = false } = {}) => {
+    if (!quiet) {
+      setIsLoading(true);
+    }
     setError(null);
     
     try {
-      // Load readings from backend
-      const readingsData = await fetchSensorData();
+      // Readings, statistics, heatmap, alerts and devices in one request
+      const dashboard = await getDashboard(50);
+      cursorRef.current = dashboard.cursor;
+
+      const readingsData = dashboard.readings;
       if (readingsData && readingsData.readings) {
         console.log('✅ Loaded readings:', readingsData.readings);
         setReadings(readingsData.readings);
       }
 
-      // Load statistics
-      const statsData = await getStatistics();
+      const statsData = dashboard.statistics;
       if (statsData) {
         console.log('✅ Loaded statistics:', statsData);
         setStatistics(statsData);
       }
 
-      // Load heatmap data
-      const heatmapRawData = await getHeatmapData();
+      const heatmapRawData = dashboard.heatmap;
       if (heatmapRawData && heatmapRawData.heatmap) {
         console.log('✅ Loaded heatmap:', heatmapRawData.heatmap);
         setHeatmapData(heatmapRawData.heatmap);
       }
 
-      // Load alerts
-      const alertsData = await getAlerts();
+      const alertsData = dashboard.alerts;
       if (alertsData && alertsData.alerts) {
         console.log('✅ Loaded alerts:', alertsData.alerts);
         setAlerts(alertsData.alerts);
       }
 
-      // Load devices
-      const devicesData = await getDevices();
+      const devicesData = dashboard.devices;
       if (devicesData && devicesData.devices) {
         console.log('✅ Loaded devices:', devicesData.devices);
         setDevices(devicesData.devices);
@@ -80,12 +95,52 @@ export const DataProvider = ({ children }) => {
     } catch (error) {
       console.error('❌ Error loading data:', error);
       setError(error.message);
-      toast.error('Failed to load sensor data');
+      if (!quiet) {
+        toast.error('Failed to load sensor data');
+      }
     } finally {
-      setIsLoading(false);
+      if (!quiet) {
+        setIsLoading(false);
+      }
     }
   }, []);
 
+  // Fetch only what changed since the last load; full reload when too far behind
+  const pollChanges = useCallback(async () => {
+    if (cursorRef.current === null) {
+      return loadData();
+    }
+    try {
+      const changes = await getChanges(cursorRef.current);
+      if (changes.resync_required) {
+        return loadData();
+      }
+      cursorRef.current = changes.cursor;
+      if (changes.count === 0) {
+        return;
+      }
+
+      setReadings(prev => mergeById(changes.readings, prev, 50));
+      if (changes.alerts.length) {
+        setAlerts(prev => mergeById(changes.alerts, prev));
+      }
+      setDevices(prev => {
+        const updated = new Map(changes.devices.map(device => [device.id, device]));
+        // A late upload of an older measurement must not replace a newer one
+        const merged = prev.map(device => {
+          const update = updated.get(device.id);
+          return update && measuredAt(update) >= measuredAt(device) ? { ...device, ...update } : device;
+        });
+        const known = new Set(prev.map(device => device.id));
+        return [...merged, ...changes.devices.filter(device => !known.has(device.id))];
+      });
+      setStatistics(prev => ({ ...prev, total_readings: (prev.total_readings || 0) + changes.count }));
+      setLastUpdate(new Date());
+    } catch (error) {
+      console.error('❌ Error polling changes:', error);
+    }
+  }, [loadData]);
+
   // Send test data to API
   const sendTestData = useCallback(async (deviceId) => {
     setIsLoading(true);
@@ -158,15 +213,22 @@ export const DataProvider = ({ children }) => {
   }, [loadData]);
 
   // ✅ FIXED: Include [loadData] in dependency array
-  // Periodic updates every 10 seconds
+  // Periodic updates every 10 seconds (only new data), full reload every minute
   useEffect(() => {
     const interval = setInterval(() => {
       console.log('🔄 Periodic update...');
-      loadData();
-    }, 10000); // Update every 10 seconds
+      pollChanges();
+    }, POLL_INTERVAL_MS);
+    const fullRefresh = setInterval(() => {
+      console.log('🔄 Full refresh...');
+      loadData({ quiet: true });
+    }, FULL_REFRESH_MS);
     
-    return () => clearInterval(interval);
-  }, [loadData]);
+    return () => {
+      clearInterval(interval);
+      clearInterval(fullRefresh);
+    };
+  }, [pollChanges, loadData]);
 
   // ✅ Memoize context value
   const contextValue = useMemo(() => ({
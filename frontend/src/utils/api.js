@@ -11,6 +11,28 @@ export const fetchSensorData = async () => {
   }
 };
 
+export const getDashboard = async (limit = 50) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/dashboard?limit=${limit}`);
+    if (!response.ok) throw new Error('Failed to fetch dashboard');
+    return await response.json();
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};
+
+export const getChanges = async (cursor) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/readings/changes?since=${encodeURIComponent(cursor)}`);
+    if (!response.ok) throw new Error('Failed to fetch changes');
+    return await response.json();
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};
+
 export const sendTestData = async (data) => {
   try {
     const response = await fetch(`${API_BASE_URL}/sensor/data`, {
@@ -96,6 +118,20 @@ export const getDevices = async () => {
   }
 };
 
+export const getNearbyDevices = async (lat, lng, { radiusKm, k } = {}) => {
+  try {
+    const params = new URLSearchParams({ lat, lng });
+    if (radiusKm !== undefined) params.set('radius_km', radiusKm);
+    if (k !== undefined) params.set('k', k);
+    const response = await fetch(`${API_BASE_URL}/devices/nearby?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch nearby devices');
+    return await response.json();
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};
+
 export const updateDevice = async (deviceId, updates) => {
   try {
     const response = await fetch(`${API_BASE_URL}/devices/${deviceId}`, {
@@ -109,4 +145,53 @@ export const updateDevice = async (deviceId, updates) => {
     console.error('API Error:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+// Decodes the binary grid from /api/surface (layout in backend/services/surface.py)
+const decodeSurface = (buffer) => {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'WQSG') throw new Error('Not a surface grid');
+  const fieldCount = view.getUint8(5);
+  const width = view.getUint16(6, true);
+  const height = view.getUint16(8, true);
+  const bbox = [0, 1, 2, 3].map((i) => view.getFloat64(10 + i * 8, true));
+  const generatedAt = new Date(view.getUint32(42, true) * 1000);
+  const devices = view.getUint32(46, true);
+
+  let offset = 50;
+  const decoder = new TextDecoder();
+  const headers = [];
+  for (let f = 0; f < fieldCount; f += 1) {
+    const length = view.getUint8(offset);
+    const name = decoder.decode(new Uint8Array(buffer, offset + 1, length));
+    offset += 1 + length;
+    headers.push({ name, base: view.getFloat64(offset, true), scale: view.getFloat64(offset + 8, true) });
+    offset += 16;
+  }
+
+  const cells = width * height;
+  const layers = {};
+  headers.forEach(({ name, base, scale }) => {
+    const values = new Float32Array(cells);
+    for (let i = 0; i < cells; i += 1) {
+      const q = view.getUint16(offset + i * 2, true);
+      values[i] = q === 0xffff ? NaN : base + q * scale;
+    }
+    layers[name] = values;
+    offset += cells * 2;
+  });
+  return { width, height, bbox, generatedAt, devices, layers };
+};
+
+export const getSurface = async (bbox, zoom, fields) => {
+  try {
+    const params = new URLSearchParams({ bbox: bbox.join(','), zoom });
+    if (fields) params.set('fields', fields.join(','));
+    const response = await fetch(`${API_BASE_URL}/surface?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch surface');
+    return decodeSurface(await response.arrayBuffer());
+  } catch (error) {
+    console.error('API Error:', error);
+    throw error;
+  }
+};